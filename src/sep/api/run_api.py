@@ -1,37 +1,91 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import asyncio
+import json
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from sep.runner.manager import RunManager
-from sep.runner.models import Run
+from sep.runner.models import Run, RunStatus
+from sep.runner import events
+from sep.core.services.metrics import get_registry
+
+# Seconds without events after which a keep-alive comment is sent to the SSE clients
+SSE_KEEP_ALIVE = 15
 
 app = FastAPI(title="Study Evaluation Runner API")
 manager = RunManager()
 
+# Model and temperature of one run of a fan-out
+class ModelConfig(BaseModel):
+    model: str
+    temperature: float = 1.0
+
 # Eingabe-Model für /runs/
 class RunRequest(BaseModel):
     prompt: str
-    model: str
+    model: str | None = None
     files: list[str]
-    delay: int = 15
+    delay: int = 0
     temp: float = 1.0
     single_process: bool = False
     pdf_reader: bool = False
+    max_concurrency: int = 1
+    resume_run_id: str | None = None
+    priority: int = 0
+    use_async: bool = False
+    use_batch: bool = False
+    use_queue: bool = False
+    use_cache: bool = True
+    # Number of outputs per paper, more than one saves their majority vote (self-consistency)
+    samples: int = Field(1, ge=1)
+    # With a list of model configurations, one run per configuration is started on the same papers (model and temp are ignored)
+    fanout: list[ModelConfig] | None = None
 
-@app.post("/runs/", response_model=Run)
+@app.post("/runs/", response_model=Run | list[Run])
 def start_run(request: RunRequest):
-    run = manager.start_run(
-        prompt=request.prompt,
-        model=request.model,
-        files=request.files,
+    options = dict(
         delay=request.delay,
-        temp=request.temp,
         single_process=request.single_process,
         pdf_reader=request.pdf_reader,
+        max_concurrency=request.max_concurrency,
+        resume_run_id=request.resume_run_id,
+        priority=request.priority,
+        use_async=request.use_async,
+        use_batch=request.use_batch,
+        use_queue=request.use_queue,
+        use_cache=request.use_cache,
+        samples=request.samples,
     )
+    try:
+        if request.fanout is not None:
+            return manager.start_fanout(
+                prompt=request.prompt,
+                configs=[(config.model, config.temperature) for config in request.fanout],
+                files=request.files,
+                **options,
+            )
+        if request.model is None:
+            raise ValueError("Either a model or a fan-out of model configurations is required.")
+        run = manager.start_run(
+            prompt=request.prompt,
+            model=request.model,
+            files=request.files,
+            temp=request.temp,
+            **options,
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     return run
 
 @app.get("/runs/", response_model=list[Run])
-def list_runs():
-    return manager.list_runs()
+def list_runs(status: RunStatus | None = None, model: str | None = None, limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    return manager.list_runs(status=status, model=model, limit=limit, offset=offset)
+
+@app.get("/runs/summaries")
+def list_run_summaries():
+    return [summary.to_dict() for summary in manager.list_summaries()]
 
 @app.get("/runs/{run_id}", response_model=Run | None)
 def get_run(run_id: str):
@@ -41,3 +95,50 @@ def get_run(run_id: str):
 def stop_run(run_id: str):
     manager.stop_run(run_id)
     return {"status": "stopping"}
+
+
+@app.get("/runs/{run_id}/events")
+async def stream_run_events(run_id: str):
+    """Streams the live events of a run as server-sent events until the run is finished."""
+    event_bus = events.get_event_bus()
+    subscription = event_bus.subscribe(run_id)
+
+    # the run manager takes locks and may read the run store, so it is not called on the event loop
+    try:
+        run = await run_in_threadpool(manager.get_run, run_id)
+    except BaseException:
+        event_bus.unsubscribe(subscription)
+        raise
+    if run is None:
+        event_bus.unsubscribe(subscription)
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found.")
+
+    async def _stream():
+        try:
+            yield _format_sse({"type": events.PROGRESS, "run_id": run_id, "status": run.status.value, "progress": run.progress})
+            if run.status not in (RunStatus.PENDING, RunStatus.RUNNING):
+                yield _format_sse({"type": events.RUN_FINISHED, "run_id": run_id, "status": run.status.value, "progress": run.progress, "message": run.message})
+                return
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=SSE_KEEP_ALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                yield _format_sse(event)
+                if event["type"] == events.RUN_FINISHED:
+                    return
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Exposes the request, stage and paper metrics of the process in the Prometheus text format."""
+    return PlainTextResponse(get_registry().render(), media_type="text/plain; version=0.0.4")
+
+def _format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
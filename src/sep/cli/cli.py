@@ -1,3 +1,4 @@
+import json
 import typer
 import requests
 from sep.core.file_manager.file_manager import get_papers_from_schema
@@ -12,9 +13,17 @@ app = typer.Typer(help="CLI client for the persistent RunManager API.")
 def start(
     model: str = typer.Option(..., "-m"),
     files: list[str] = typer.Option(None, "-f"),
-    delay: int = 15,
+    delay: int = typer.Option(0, help="Optional extra pause in seconds after each paper. Throttling is handled by the rate limiter."),
     temp: float = 1.0,
     prompt_path: str = None,
+    max_concurrency: int = typer.Option(1, "-c", help="Number of papers processed in parallel."),
+    resume: str = typer.Option(None, help="ID of a failed or cancelled run to continue (skips papers with existing output)."),
+    priority: int = typer.Option(0, help="Runs with a higher priority are dispatched first."),
+    use_async: bool = typer.Option(False, "--async", help="Process the run on the shared event loop with the async provider clients."),
+    use_batch: bool = typer.Option(False, "--batch", help="Submit all papers as one batch job of the provider (cheaper, results within 24h)."),
+    use_queue: bool = typer.Option(False, "--queue", help="Add the papers to the job queue of the worker processes (start them with: sep-worker)."),
+    use_cache: bool = typer.Option(True, "--cache/--no-cache", help="Answer identical deterministic requests (up to the max_temperature of the config.yaml) from the response cache."),
+    samples: int = typer.Option(1, help="Outputs per paper, more than one saves their majority vote (self-consistency)."),
 ):
     """Start a new run via the API."""
     pdf_paths = files or get_papers_from_schema("main")
@@ -26,6 +35,14 @@ def start(
         "files": pdf_paths,
         "delay": delay,
         "temp": temp,
+        "max_concurrency": max_concurrency,
+        "resume_run_id": resume,
+        "priority": priority,
+        "use_async": use_async,
+        "use_batch": use_batch,
+        "use_queue": use_queue,
+        "use_cache": use_cache,
+        "samples": samples,
     }
 
     r = requests.post(f"{API_URL}/runs/", json=data)
@@ -35,10 +52,54 @@ def start(
     else:
         typer.echo(f"❌ Error: {r.text}")
 
+@app.command("fanout")
+def fanout(
+    configs: list[str] = typer.Option(..., "-m", help="Model configuration as model[:temperature] (default temperature 1.0), repeat for every model."),
+    files: list[str] = typer.Option(None, "-f"),
+    prompt_path: str = None,
+    max_concurrency: int = typer.Option(1, "-c", help="Number of papers processed in parallel per model."),
+    priority: int = typer.Option(0, help="Runs with a higher priority are dispatched first."),
+    use_async: bool = typer.Option(False, "--async", help="Process the runs on the shared event loop with the async provider clients."),
+    use_cache: bool = typer.Option(True, "--cache/--no-cache", help="Answer identical deterministic requests (up to the max_temperature of the config.yaml) from the response cache."),
+    samples: int = typer.Option(1, help="Outputs per paper, more than one saves their majority vote (self-consistency)."),
+):
+    """Start one run per model configuration on the same papers, preparing every paper only once."""
+    pdf_paths = files or get_papers_from_schema("main")
+    prompt = getPrompt(prompt_path or PROMPT_PATH)
+
+    fanout = []
+    for config in configs:
+        model, _, temperature = config.partition(":")
+        fanout.append({"model": model, "temperature": float(temperature) if temperature else 1.0})
+
+    data = {
+        "prompt": prompt,
+        "files": pdf_paths,
+        "fanout": fanout,
+        "max_concurrency": max_concurrency,
+        "priority": priority,
+        "use_async": use_async,
+        "use_cache": use_cache,
+        "samples": samples,
+    }
+
+    r = requests.post(f"{API_URL}/runs/", json=data)
+    if r.status_code == 200:
+        for run in r.json():
+            typer.echo(f"✅ Started run {run['id']} with {run['model']} ({len(pdf_paths)} files).")
+    else:
+        typer.echo(f"❌ Error: {r.text}")
+
 @app.command("list")
-def list_runs():
-    """List all runs."""
-    r = requests.get(f"{API_URL}/runs/")
+def list_runs(
+    status: str = typer.Option(None, help="Only show runs with this status (e.g. running, finished, failed)."),
+    model: str = typer.Option(None, "-m", help="Only show runs of this model."),
+    limit: int = 50,
+    offset: int = 0,
+):
+    """List runs, newest first."""
+    params = {"status": status, "model": model, "limit": limit, "offset": offset}
+    r = requests.get(f"{API_URL}/runs/", params={k: v for k, v in params.items() if v is not None})
     runs = r.json()
     if not runs:
         typer.echo("No runs found.")
@@ -55,6 +116,45 @@ def status(run_id: str):
         return
     run = r.json()
     typer.echo(f"{run['id']}: {run['status']} ({run['progress']*100:.1f}%)")
+    usage = run.get("usage") or {}
+    if usage.get("prompt_tokens") or usage.get("completion_tokens"):
+        typer.echo(f"  Tokens: {usage['prompt_tokens']} prompt ({usage['cached_tokens']} cached), {usage['completion_tokens']} completion | Cost: ${usage['cost']:.4f}")
+    for file, error in run.get("failed_files", {}).items():
+        typer.echo(f"  ❌ {file}: {error}")
+
+@app.command("watch")
+def watch(run_id: str):
+    """Follow the live events of a run until it is finished."""
+    with requests.get(f"{API_URL}/runs/{run_id}/events", stream=True) as r:
+        if r.status_code != 200:
+            typer.echo(f"❌ Error: {r.text}")
+            return
+
+        for line in r.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            event = json.loads(line[len("data:"):])
+            typer.echo(_format_event(event))
+            if event["type"] == "run_finished":
+                return
+
+def _format_event(event: dict) -> str:
+    """Formats a single run event for the console."""
+    event_type = event["type"]
+    if event_type == "paper_started":
+        return f"▶️  {event['file']}"
+    if event_type == "paper_finished":
+        return f"✅ {event['file']}{_format_latency(event)}"
+    if event_type == "paper_failed":
+        return f"❌ {event['file']}{_format_latency(event)}: {event['error']}"
+    if event_type == "progress":
+        return f"   {event['status']} ({event['progress']*100:.1f}%)"
+    return f"🏁 Run {event['status']} ({event['progress']*100:.1f}%)"
+
+def _format_latency(event: dict) -> str:
+    """Formats the latency of a paper event, events without a latency (e.g. of older workers) have none."""
+    latency = event.get("latency")
+    return f" ({latency:.1f}s)" if latency is not None else ""
 
 @app.command("stop")
 def stop(run_id: str):
@@ -76,6 +176,17 @@ def serve(
     typer.echo(f"🚀 Starting RunManager API on http://{host}:{port}")
     uvicorn.run(api_app, host=host, port=port)
 
+@app.command("batch-server")
+def batch_server(
+    host: str = "127.0.0.1",
+    port: int = 8001,
+):
+    """Start the local stand-in of the OpenAI Batch API (serves batch runs of the test models)."""
+    import uvicorn
+    from sep.core.api_request.batch_server import app as batch_app
+    typer.echo(f"🚀 Starting local Batch API on http://{host}:{port}/v1")
+    uvicorn.run(batch_app, host=host, port=port)
+
 if __name__ == "__main__":
     app()
  
\ No newline at end of file
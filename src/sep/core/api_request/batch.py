@@ -0,0 +1,223 @@
+"""
+Batch mode of the providers.
+
+Instead of one interactive request per paper, all requests of a run are submitted as one batch job
+(OpenAI Batch API or Gemini batch prediction). Batches are processed offline by the provider at a
+lower price and without the per-request throttling. The job is polled until it is done, then the
+results are mapped back to the papers by their custom ID.
+The test models are sent to a local stand-in of the OpenAI Batch API (see batch_server.py).
+"""
+
+import base64
+import io
+import json
+import os
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+from sep.env_manager import BATCH, env
+from sep.core.api_request.client_registry import get_openai_client
+from sep.core.api_request.usage import Usage
+from sep.core.services.paper_cache import get_paper_text
+from sep.core.utils.get_provider import get_provider_name
+from sep.logger import setup_logger
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+log = setup_logger(__name__)
+
+# Used when the batch section of the config.yaml has no entry
+DEFAULT_LOCAL_SERVER_URL = "http://127.0.0.1:8001/v1"
+
+# Normalized states of a batch job
+BATCH_RUNNING = "running"
+BATCH_COMPLETED = "completed"
+BATCH_FAILED = "failed"
+BATCH_CANCELLED = "cancelled"
+BATCH_EXPIRED = "expired"
+
+FINAL_STATES = {BATCH_COMPLETED, BATCH_FAILED, BATCH_CANCELLED, BATCH_EXPIRED}
+
+
+@dataclass
+class BatchRequest:
+    """The request of a single paper inside a batch."""
+    custom_id: str
+    file_path: str
+    prompt: str
+    model: str
+    temperature: float
+    pdf_reader: bool = False
+
+
+@dataclass
+class BatchResult:
+    """The output of a single paper and its token usage, or the error if the provider could not process it."""
+    output: str | None = None
+    error: str | None = None
+    usage: Usage = field(default_factory=Usage)
+
+
+class OpenAIBatchBackend:
+    """Submits the requests as JSONL file to the OpenAI Batch API (chat completions endpoint)."""
+
+    ENDPOINT = "/v1/chat/completions"
+
+    _STATES = {
+        "validating": BATCH_RUNNING,
+        "in_progress": BATCH_RUNNING,
+        "finalizing": BATCH_RUNNING,
+        "cancelling": BATCH_RUNNING,
+        "completed": BATCH_COMPLETED,
+        "failed": BATCH_FAILED,
+        "cancelled": BATCH_CANCELLED,
+        "expired": BATCH_EXPIRED,
+    }
+
+    def __init__(self, client: "OpenAI"):
+        self.client = client
+
+    def submit(self, requests: list[BatchRequest]) -> str:
+        """
+        Uploads the JSONL batch file and creates the batch.
+
+        Returns:
+            str: The ID of the batch.
+        """
+        lines = [json.dumps(self._build_line(request)) for request in requests]
+        batch_file = io.BytesIO("\n".join(lines).encode("utf-8"))
+        batch_file.name = "batch.jsonl"
+
+        uploaded = self.client.files.create(file=batch_file, purpose="batch")
+        batch = self.client.batches.create(input_file_id=uploaded.id, endpoint=self.ENDPOINT, completion_window="24h")
+        return batch.id
+
+    def poll(self, batch_id: str) -> str:
+        """Returns the normalized state of the batch."""
+        return self._STATES.get(self.client.batches.retrieve(batch_id).status, BATCH_RUNNING)
+
+    def cancel(self, batch_id: str):
+        self.client.batches.cancel(batch_id)
+
+    def get_results(self, batch_id: str, custom_ids: list[str]) -> dict[str, BatchResult]:
+        """Downloads the output and error files of the batch and maps them to the custom IDs."""
+        batch = self.client.batches.retrieve(batch_id)
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id is None:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    results[entry["custom_id"]] = self._parse_line(entry)
+        return results
+
+    def _build_line(self, request: BatchRequest) -> dict:
+        if request.pdf_reader:
+            messages = [
+                {"role": "system", "content": request.prompt},
+                {"role": "user", "content": get_paper_text(request.file_path)},
+            ]
+        else:
+            with open(request.file_path, "rb") as f:
+                file_data = base64.b64encode(f.read()).decode("ascii")
+            messages = [{
+                "role": "user",
+                "content": [
+                    {"type": "file", "file": {"filename": os.path.basename(request.file_path), "file_data": f"data:application/pdf;base64,{file_data}"}},
+                    {"type": "text", "text": request.prompt},
+                ],
+            }]
+
+        return {
+            "custom_id": request.custom_id,
+            "method": "POST",
+            "url": self.ENDPOINT,
+            "body": {"model": request.model, "temperature": request.temperature, "messages": messages},
+        }
+
+    @staticmethod
+    def _parse_line(entry: dict) -> BatchResult:
+        response = entry.get("response") or {}
+        if entry.get("error") or response.get("status_code") != 200:
+            error = entry.get("error") or response.get("body", {}).get("error") or {}
+            return BatchResult(error=f"{error.get('code', response.get('status_code'))}: {error.get('message', 'unknown error')}")
+        body = response["body"]
+        return BatchResult(output=body["choices"][0]["message"]["content"], usage=Usage.from_openai(body.get("usage")))
+
+
+class GeminiBatchBackend:
+    """Submits the requests as inlined requests of a Gemini batch job. The PDFs are uploaded first."""
+
+    _STATES = {
+        "JOB_STATE_SUCCEEDED": BATCH_COMPLETED,
+        "JOB_STATE_PARTIALLY_SUCCEEDED": BATCH_COMPLETED,
+        "JOB_STATE_FAILED": BATCH_FAILED,
+        "JOB_STATE_CANCELLED": BATCH_CANCELLED,
+        "JOB_STATE_EXPIRED": BATCH_EXPIRED,
+    }
+
+    def __init__(self):
+        # the Gemini client needs its API key on import
+        from sep.core.api_request import gemini
+        self.gemini = gemini
+
+    def submit(self, requests: list[BatchRequest]) -> str:
+        """
+        Uploads the PDFs (if not uploaded yet) and creates the batch job.
+
+        Returns:
+            str: The name of the batch job.
+        """
+        if any(request.pdf_reader for request in requests):
+            raise ValueError("A request to gemini is not possible with a PDF reader. Do not use --pdf_reader in the arguments.")
+
+        inlined_requests = []
+        for request in requests:
+            file = self.gemini.get_or_upload_file(request.file_path, request.model)
+            inlined_requests.append({
+                "contents": self.gemini.build_contents(file, request.prompt),
+                "config": {"temperature": request.temperature},
+                "metadata": {"custom_id": request.custom_id},
+            })
+
+        job = self.gemini.get_client().batches.create(model=requests[0].model, src=inlined_requests)
+        return job.name
+
+    def poll(self, batch_id: str) -> str:
+        """Returns the normalized state of the batch job."""
+        state = self.gemini.get_client().batches.get(name=batch_id).state
+        return self._STATES.get(getattr(state, "name", str(state)), BATCH_RUNNING)
+
+    def cancel(self, batch_id: str):
+        self.gemini.get_client().batches.cancel(name=batch_id)
+
+    def get_results(self, batch_id: str, custom_ids: list[str]) -> dict[str, BatchResult]:
+        """Maps the inlined responses (in the order of the requests) to the custom IDs."""
+        job = self.gemini.get_client().batches.get(name=batch_id)
+        responses = (job.dest.inlined_responses if job.dest else None) or []
+
+        results = {}
+        for custom_id, inlined in zip(custom_ids, responses):
+            if inlined.error is not None or inlined.response is None:
+                results[custom_id] = BatchResult(error=str(inlined.error))
+            else:
+                results[custom_id] = BatchResult(output=inlined.response.text, usage=Usage.from_gemini(inlined.response.usage_metadata))
+        return results
+
+
+def get_batch_backend(model: str):
+    """
+    Returns the batch backend of the model's provider.
+
+    Raises:
+        ValueError: If the provider has no batch API.
+    """
+    provider = get_provider_name(model)
+    if provider == "openai":
+        return OpenAIBatchBackend(get_openai_client("openai", env('API_GPT')))
+    if provider == "gemini":
+        return GeminiBatchBackend()
+    if provider == "test":
+        return OpenAIBatchBackend(get_openai_client("test", "local", BATCH.get("local_server_url", DEFAULT_LOCAL_SERVER_URL)))
+    raise ValueError(f"Batch mode is not supported for model {model}.")
@@ -0,0 +1,149 @@
+"""
+Local stand-in of the OpenAI Batch API.
+
+Implements the file and batch endpoints that the batch mode uses, so batch runs can be tested
+offline with the test models. Every request of a batch is answered with the standart text of the
+test pipeline, requests to test-exception end up in the error file.
+Start it with: sep-run batch-server
+"""
+
+import json
+import threading
+import time
+import uuid
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import PlainTextResponse
+from sep.core.api_request.mock_api import get_test_text, get_test_usage
+
+app = FastAPI(title="Local Batch API")
+
+# Seconds a batch stays in progress before it is completed (simulates the offline processing)
+PROCESSING_DELAY = 1.0
+
+_files: dict[str, dict] = {}
+_batches: dict[str, dict] = {}
+_lock = threading.Lock()
+
+
+def _store_file(content: bytes, filename: str, purpose: str) -> dict:
+    """Stores the content as a new file (caller must hold the lock)."""
+    file_id = f"file-{uuid.uuid4().hex}"
+    entry = {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(content),
+        "created_at": int(time.time()),
+        "filename": filename,
+        "purpose": purpose,
+        "status": "processed",
+    }
+    _files[file_id] = {"meta": entry, "content": content}
+    return entry
+
+
+def _to_jsonl(entries: list[dict]) -> bytes:
+    return "\n".join(json.dumps(entry) for entry in entries).encode("utf-8")
+
+
+@app.post("/v1/files")
+async def upload_file(file: UploadFile = File(...), purpose: str = Form(...)):
+    content = await file.read()
+    with _lock:
+        return _store_file(content, file.filename, purpose)
+
+
+@app.get("/v1/files/{file_id}/content", response_class=PlainTextResponse)
+def get_file_content(file_id: str):
+    with _lock:
+        entry = _files.get(file_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"File {file_id} not found.")
+    return PlainTextResponse(entry["content"].decode("utf-8"))
+
+
+@app.post("/v1/batches")
+async def create_batch(request: Request):
+    data = await request.json()
+    with _lock:
+        input_file = _files.get(data["input_file_id"])
+    if input_file is None:
+        raise HTTPException(status_code=404, detail=f"File {data['input_file_id']} not found.")
+
+    batch_id = f"batch_{uuid.uuid4().hex}"
+    batch = {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": data["endpoint"],
+        "input_file_id": data["input_file_id"],
+        "completion_window": data.get("completion_window", "24h"),
+        "status": "in_progress",
+        "created_at": int(time.time()),
+        "output_file_id": None,
+        "error_file_id": None,
+        "request_counts": {"total": 0, "completed": 0, "failed": 0},
+    }
+    with _lock:
+        _batches[batch_id] = batch
+
+    threading.Thread(target=_process_batch, args=(batch_id, input_file["content"]), daemon=True).start()
+    return batch
+
+
+@app.get("/v1/batches/{batch_id}")
+def get_batch(batch_id: str):
+    with _lock:
+        batch = _batches.get(batch_id)
+        if batch is None:
+            raise HTTPException(status_code=404, detail=f"Batch {batch_id} not found.")
+        return dict(batch)
+
+
+@app.post("/v1/batches/{batch_id}/cancel")
+def cancel_batch(batch_id: str):
+    with _lock:
+        batch = _batches.get(batch_id)
+        if batch is None:
+            raise HTTPException(status_code=404, detail=f"Batch {batch_id} not found.")
+        if batch["status"] == "in_progress":
+            batch["status"] = "cancelled"
+        return dict(batch)
+
+
+def _process_batch(batch_id: str, content: bytes):
+    time.sleep(PROCESSING_DELAY)
+
+    outputs, errors = [], []
+    for line in content.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        body = entry["body"]
+        if body["model"] == "test-exception":
+            errors.append({
+                "custom_id": entry["custom_id"],
+                "response": None,
+                "error": {"code": "server_error", "message": "Test Exception thrown"},
+            })
+            continue
+        text = get_test_text(body["model"], body.get("temperature"))
+        usage = get_test_usage(json.dumps(body["messages"]), text)
+        outputs.append({
+            "custom_id": entry["custom_id"],
+            "response": {"status_code": 200, "body": {
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens, "total_tokens": usage.prompt_tokens + usage.completion_tokens},
+            }},
+            "error": None,
+        })
+
+    with _lock:
+        batch = _batches[batch_id]
+        if batch["status"] == "cancelled":
+            return
+        batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+        if outputs:
+            batch["output_file_id"] = _store_file(_to_jsonl(outputs), "batch_output.jsonl", "batch_output")["id"]
+        if errors:
+            batch["error_file_id"] = _store_file(_to_jsonl(errors), "batch_errors.jsonl", "batch_output")["id"]
+        batch["status"] = "completed"
+
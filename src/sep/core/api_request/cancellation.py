@@ -0,0 +1,122 @@
+"""
+Cancellation of in-flight provider requests.
+
+The provider SDKs block until the HTTP response arrives. To stop a run immediately, the blocking
+call is executed in a helper thread while the caller watches the stop event of the run. If the run
+is stopped, RequestCancelled is raised at once, so the caller's worker slot is freed without waiting
+for the provider.
+
+The pooled HTTP clients are shared by all requests, so a stopped request can not close its client.
+Instead the clients report every response they receive to track_response (an event hook), which
+adds it to the response scope of the current thread. The helper thread of run_cancellable runs in
+the scope of its caller; stopping the run closes the responses of the scope, which aborts the
+streamed requests (the provider stops generating) without touching the other requests of the pool.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+# Seconds between two checks of the stop event while waiting for a provider response
+CHECK_INTERVAL = 0.2
+
+
+class RequestCancelled(Exception):
+    """Raised when a request is aborted because its run was stopped."""
+
+
+def raise_if_cancelled(stop_event: threading.Event = None):
+    """Raises RequestCancelled if the given stop event is set."""
+    if stop_event is not None and stop_event.is_set():
+        raise RequestCancelled("The request was cancelled because the run was stopped.")
+
+
+class ResponseScope:
+    """The HTTP responses received by one request. Once the scope is closed, responses that still arrive are closed at once."""
+
+    def __init__(self):
+        self.responses = []
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def add(self, response):
+        with self._lock:
+            if not self.closed:
+                self.responses.append(response)
+                return
+        _close(response)
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            responses, self.responses = self.responses, []
+        for response in responses:
+            _close(response)
+
+
+def _close(response):
+    try:
+        response.close()
+    except Exception:
+        pass
+
+
+_local = threading.local()
+
+
+def track_response(response, *args, **kwargs):
+    """Response event hook of the pooled clients (httpx and requests): adds the response to the scope of the current thread."""
+    scope = getattr(_local, "scope", None)
+    if scope is not None:
+        scope.add(response)
+
+
+@contextmanager
+def closing_responses():
+    """Tracks the responses received in the block (also by run_cancellable calls) and closes them when it is left."""
+    previous = getattr(_local, "scope", None)
+    scope = _local.scope = ResponseScope()
+    try:
+        yield scope
+    finally:
+        _local.scope = previous
+        scope.close()
+
+
+def run_cancellable(fn: Callable, *args, stop_event: threading.Event = None, **kwargs):
+    """
+    Runs the blocking function and returns its result, unless the stop event is set first.
+    Without a stop event, the function is simply called. If the run is stopped, the responses
+    the function received (or still receives) from the pooled clients are closed.
+
+    Raises:
+        RequestCancelled: If the stop event was set before the function returned.
+    """
+    if stop_event is None:
+        return fn(*args, **kwargs)
+    raise_if_cancelled(stop_event)
+
+    outcome = {}
+    done = threading.Event()
+    scope = getattr(_local, "scope", None) or ResponseScope()
+
+    def _target():
+        _local.scope = scope
+        try:
+            outcome["result"] = fn(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            _local.scope = None
+            done.set()
+
+    threading.Thread(target=_target, name="cancellable-request", daemon=True).start()
+
+    while not done.wait(CHECK_INTERVAL):
+        if stop_event.is_set():
+            scope.close()
+            raise_if_cancelled(stop_event)
+
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
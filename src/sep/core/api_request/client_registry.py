@@ -0,0 +1,191 @@
+"""
+Shared, connection-pooled HTTP clients of the providers.
+
+Every (provider, base url, API key) gets one long-lived client per process, so the requests re-use open
+TCP/TLS connections instead of connecting again for every paper. Async clients are bound to an event loop
+and are kept per loop. Pool sizes and timeouts come from the http_clients section of the config.yaml
+(defaults at the top, entries under a provider name override them for that provider). A forked process
+does not inherit the clients (their sockets belong to the parent), it builds its own on first use.
+The SDKs are imported when their first client is built.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import weakref
+from typing import Any, Callable
+from sep.env_manager import HTTP_CLIENTS
+from sep.core.api_request.cancellation import track_response
+from sep.logger import setup_logger
+
+log = setup_logger(__name__)
+
+# Used when the http_clients section of the config.yaml has no entry (timeouts in seconds, None = no limit)
+DEFAULT_SETTINGS = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30,
+    "connect_timeout": 10,
+    "read_timeout": 600,
+}
+
+
+class ClientRegistry:
+    """Builds every client once per process (and event loop for async clients) and hands out the same instance afterwards."""
+
+    def __init__(self, settings: dict = None):
+        self.settings = HTTP_CLIENTS if settings is None else settings
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._clients: dict[tuple, Any] = {}
+        # event loop -> key -> async client, dropped together with the loop
+        self._loop_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def get(self, key: tuple, factory: Callable[[], Any]):
+        """Returns the client of the key, it is built by the factory on first use."""
+        self._check_process()
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = factory()
+                log.debug(f"Created the {key[0]} client of {key[1]}.")
+            return client
+
+    def get_async(self, key: tuple, factory: Callable[[], Any]):
+        """Returns the async client of the key for the running event loop, it is built by the factory on first use."""
+        loop = asyncio.get_running_loop()
+        self._check_process()
+        with self._lock:
+            clients = self._loop_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                client = clients[key] = factory()
+                log.debug(f"Created the {key[0]} client of {key[1]}.")
+            return client
+
+    def get_settings(self, provider: str) -> dict:
+        """Returns the pool and timeout settings of the provider (defaults overridden by the provider entry)."""
+        defaults = {name: self.settings.get(name, value) for name, value in DEFAULT_SETTINGS.items()}
+        overrides = self.settings.get(provider)
+        return {**defaults, **overrides} if isinstance(overrides, dict) else defaults
+
+    def close(self):
+        """Closes the sync clients of the process (async clients are dropped with their event loop)."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._loop_clients = weakref.WeakKeyDictionary()
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                log.exception("Could not close a pooled client.")
+
+    def _check_process(self):
+        # the clients (and maybe a held lock) were copied from the parent process
+        if os.getpid() != self._pid:
+            self._reset()
+
+
+_registry = ClientRegistry()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: _registry._reset())
+
+def get_client_registry() -> ClientRegistry:
+    """Returns the client registry of the process."""
+    return _registry
+
+
+def _key(kind: str, provider: str, base_url: str = None, api_key: str = None) -> tuple:
+    # the API key is only kept as a hash
+    return (kind, provider, base_url, hashlib.sha256(api_key.encode()).hexdigest() if api_key else None)
+
+
+def _get_limits(settings: dict):
+    import httpx
+    return httpx.Limits(
+        max_connections=settings["max_connections"],
+        max_keepalive_connections=settings["max_keepalive_connections"],
+        keepalive_expiry=settings["keepalive_expiry"],
+    )
+
+
+def _get_timeout(settings: dict):
+    import httpx
+    return httpx.Timeout(settings["read_timeout"], connect=settings["connect_timeout"])
+
+
+def _get_event_hooks() -> dict:
+    """Event hooks of the sync httpx clients: stopped runs close their responses (see cancellation.py)."""
+    return {"response": [track_response]}
+
+
+def get_openai_client(provider: str, api_key: str, base_url: str = None):
+    """Returns the pooled OpenAI client (also used for the OpenAI compatible APIs, e.g. DeepSeek)."""
+    def _create():
+        from openai import OpenAI, DefaultHttpxClient
+        settings = _registry.get_settings(provider)
+        timeout = _get_timeout(settings)
+        return OpenAI(api_key=api_key, base_url=base_url, timeout=timeout,
+                      http_client=DefaultHttpxClient(limits=_get_limits(settings), timeout=timeout, event_hooks=_get_event_hooks()))
+    return _registry.get(_key("openai", provider, base_url, api_key), _create)
+
+
+def get_async_openai_client(provider: str, api_key: str, base_url: str = None):
+    """Returns the pooled AsyncOpenAI client of the running event loop."""
+    def _create():
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        settings = _registry.get_settings(provider)
+        timeout = _get_timeout(settings)
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=timeout,
+                           http_client=DefaultAsyncHttpxClient(limits=_get_limits(settings), timeout=timeout))
+    return _registry.get_async(_key("async-openai", provider, base_url, api_key), _create)
+
+
+def get_gemini_client(api_key: str):
+    """Returns the pooled google-genai client (its aio client is created with it)."""
+    def _create():
+        from google import genai
+        from google.genai import types
+        settings = _registry.get_settings("gemini")
+        timeout = settings["read_timeout"]
+        return genai.Client(api_key=api_key, http_options=types.HttpOptions(
+            # google-genai expects milliseconds
+            timeout=int(timeout * 1000) if timeout is not None else None,
+            client_args={"limits": _get_limits(settings), "event_hooks": _get_event_hooks()},
+        ))
+    return _registry.get(_key("gemini", "gemini", None, api_key), _create)
+
+
+def get_http_session(provider: str, base_url: str = None):
+    """Returns the pooled requests session of the provider (pass get_request_timeout(provider) to every request)."""
+    def _create():
+        import requests
+        from requests.adapters import HTTPAdapter
+        settings = _registry.get_settings(provider)
+        session = requests.Session()
+        session.hooks["response"].append(track_response)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings["max_connections"])
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+    return _registry.get(_key("requests", provider, base_url), _create)
+
+
+def get_async_http_client(provider: str, base_url: str = None):
+    """Returns the pooled httpx.AsyncClient of the provider for the running event loop."""
+    def _create():
+        import httpx
+        settings = _registry.get_settings(provider)
+        return httpx.AsyncClient(limits=_get_limits(settings), timeout=_get_timeout(settings))
+    return _registry.get_async(_key("httpx", provider, base_url), _create)
+
+
+def get_request_timeout(provider: str) -> tuple:
+    """Returns the (connect, read) timeout of the provider in the format of requests."""
+    settings = _registry.get_settings(provider)
+    return (settings["connect_timeout"], settings["read_timeout"])
@@ -5,21 +5,105 @@ and testing the API connection.
 """
 
 import requests
+import httpx
 import json
-from sep.core.services.pdf_reader import get_text_from_pdf
+import asyncio
+import threading
+from typing import Callable
+from sep.core.services.paper_cache import get_paper_text
 from sep.logger import setup_logger
 from sep.env_manager import env
+from sep.core.api_request.cancellation import closing_responses, raise_if_cancelled, run_cancellable
+from sep.core.api_request.streaming import read_to_end
+from sep.core.api_request.client_registry import get_http_session, get_async_http_client, get_request_timeout
+from sep.core.api_request.usage import ModelResponse, Usage
+from sep.core.services.metrics import observe_stage, STAGE_EXTRACTION, STAGE_GENERATION
 
 log = setup_logger(__name__)
 
-def process_text_with_custom_api(prompt: str, filename: str, model: str, temp: float) -> str:
+# Name of the provider in the http_clients section of the config.yaml
+PROVIDER = "custom"
+
+def process_text_with_custom_api(prompt: str, filename: str, model: str, temp: float, stop_event: threading.Event = None) -> ModelResponse:
     """
     Processes a PDF file using the specified model via the Ollama API.
+    The output is streamed, so the request can be aborted: setting the stop_event closes the response and Ollama stops generating.
     
     Returns:
-        str: Model's response text.
+        ModelResponse: Model's response text and the token usage.
+    """
+    return stream_text_with_custom_api(prompt, filename, model, temp, read_to_end, stop_event)
+
+
+def stream_text_with_custom_api(prompt: str, filename: str, model: str, temp: float, on_text: Callable[[str], bool], stop_event: threading.Event = None) -> ModelResponse:
+    """
+    Streaming variant of process_text_with_custom_api (Ollama streams one JSON object per line).
+    Every chunk of the output is passed to on_text, the response is closed as soon as on_text returns False.
+
+    Returns:
+        ModelResponse: The output received until then and the token counts of the last line.
+    """
+    with observe_stage(STAGE_EXTRACTION, model):
+        context = get_paper_text(filename)
+    url, headers, data = _build_request(prompt, context, model, temp)
+    data["stream"] = True
+
+    session = get_http_session(PROVIDER, url)
+    parts = []
+    usage = Usage()
+    with observe_stage(STAGE_GENERATION, model), closing_responses():
+        response = run_cancellable(
+            session.post, url=url, data=json.dumps(data), headers=headers, timeout=get_request_timeout(PROVIDER), stream=True, stop_event=stop_event
+        )
+        with response:
+            if response.status_code != 200:
+                raise requests.exceptions.HTTPError(f"Response status-code: {response.status_code}", response=response)
+            for line in response.iter_lines():
+                raise_if_cancelled(stop_event)
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                text = (chunk.get("message") or {}).get("content") or chunk.get("response") or ""
+                if chunk.get("done"):
+                    usage = _parse_usage(chunk)
+                if text:
+                    parts.append(text)
+                    if not on_text(text):
+                        break
+    return ModelResponse("".join(parts), usage)
+
+
+async def process_text_with_custom_api_async(prompt: str, filename: str, model: str, temp: float) -> ModelResponse:
+    """
+    Async variant of process_text_with_custom_api that uses the pooled httpx.AsyncClient.
+    Cancelling the awaiting task aborts the request.
     """
+    with observe_stage(STAGE_EXTRACTION, model):
+        context = await asyncio.to_thread(get_paper_text, filename)
+    url, headers, data = _build_request(prompt, context, model, temp)
 
+    client = get_async_http_client(PROVIDER, url)
+    with observe_stage(STAGE_GENERATION, model):
+        response = await client.post(url, content=json.dumps(data), headers=headers)
+    if response.status_code == 200:
+        return _parse_response(response.json())
+
+    raise httpx.HTTPStatusError(f"Response status-code: {response.status_code}", request=response.request, response=response)
+
+def _parse_response(data: dict) -> ModelResponse:
+    """Reads the response text and the token counts of Ollama (prompt_eval_count, eval_count)."""
+    return ModelResponse(data['response'], _parse_usage(data))
+
+def _parse_usage(data: dict) -> Usage:
+    return Usage(prompt_tokens=data.get('prompt_eval_count') or 0, completion_tokens=data.get('eval_count') or 0)
+
+def _build_request(prompt: str, context: str, model: str, temp: float) -> tuple[str, dict, dict]:
+    """
+    Builds url, headers and body of a chat request to the custom API.
+
+    Raises:
+        Exception: If CUSTOM_API_URL or CUSTOM_API_KEY are not set.
+    """
     custom_api_key  = env("CUSTOM_API_KEY")
     custom_api_url = env("CUSTOM_API_URL")
 
@@ -28,9 +112,6 @@ def process_text_with_custom_api(prompt: str, filename: str, model: str, temp: f
     if custom_api_key is None:
         raise Exception("CUSTOM_API_KEY environment variable is not set")
 
-
-    context = get_text_from_pdf(filename)
-
     headers = {
         "Authorization": f"Bearer {custom_api_key}",
         "Content-Type": "application/json"
@@ -51,9 +132,4 @@ def process_text_with_custom_api(prompt: str, filename: str, model: str, temp: f
         "temperature": temp,
         "stream": False
     }
-    json_data = json.dumps(data)
-    response = requests.post(url=custom_api_url, data=json_data, headers=headers)
-    if response.status_code == 200:
-        return response.json()['response']
-    
-    raise requests.exceptions.RequestException(f"Response status-code: {response.status_code}")
+    return custom_api_url, headers, data
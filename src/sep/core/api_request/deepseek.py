@@ -4,43 +4,102 @@ It includes functionality to extract text from a PDF, apply a prompt, and intera
 (e.g., DeepSeek or GPT) via API calls.
 """
 
-from openai import OpenAI
+import asyncio
+import threading
+from typing import Callable
 from sep.env_manager import env
-from sep.core.services.pdf_reader import get_text_from_pdf
+from sep.core.api_request.client_registry import get_openai_client, get_async_openai_client
+from sep.core.utils.get_provider import get_provider_name
+from sep.core.api_request.cancellation import closing_responses, run_cancellable
+from sep.core.api_request.streaming import consume_chat_stream, read_to_end
+from sep.core.services.paper_cache import get_paper_text
+from sep.core.api_request.usage import ModelResponse, Usage
+from sep.core.services.metrics import observe_stage, STAGE_EXTRACTION, STAGE_GENERATION
 
-def process_text_with_openai(prompt: str, filename: str, model: str, temp: float) -> str:
+def process_text_with_openai(prompt: str, filename: str, model: str, temp: float, stop_event: threading.Event = None, samples: int = 1) -> ModelResponse:
     """
     Processes the text extracted from a PDF file with an OpenAI model using a specified prompt.
+    The output is streamed, so the request can be aborted: setting the stop_event closes the response and the provider stops generating.
+    With samples > 1, that many completions are generated in one request (n, the context is billed once).
     
     Returns:
-        str: The content generated by the model based on the input context and prompt.
+        ModelResponse: The content generated by the model based on the input context and prompt, and the token usage.
     """
+    return _stream_text(prompt, filename, model, temp, read_to_end, stop_event, samples)
+
+def stream_text_with_openai(prompt: str, filename: str, model: str, temp: float, on_text: Callable[[str], bool], stop_event: threading.Event = None) -> ModelResponse:
+    """
+    Streaming variant of process_text_with_openai. Every chunk of the output is passed to on_text,
+    the stream is closed as soon as on_text returns False.
+
+    Returns:
+        ModelResponse: The output received until then and the token usage (if the stream was read to the end).
+    """
+    return _stream_text(prompt, filename, model, temp, on_text, stop_event)
+
+def _stream_text(prompt: str, filename: str, model: str, temp: float, on_text: Callable[[str], bool], stop_event: threading.Event = None, samples: int = 1) -> ModelResponse:
     # Retrieve the PDF content
-    context = get_text_from_pdf(filename)
-    client = None
+    with observe_stage(STAGE_EXTRACTION, model):
+        context = get_paper_text(filename)
 
-    # Initialize the correct OpenAI client depending on the model
-    if model == 'deepseek-chat':
-        client = OpenAI(
-            api_key=env('API_DEEPSEEK'),
-            base_url="https://api.deepseek.com"
+    # Get the pooled OpenAI client of the provider that serves the model
+    client = get_openai_client(get_provider_name(model), **_get_client_options(model))
+
+    # Send the prompt and context to the model, a stopped run closes the response of the stream
+    with observe_stage(STAGE_GENERATION, model), closing_responses():
+        stream = run_cancellable(
+            client.chat.completions.create,
+            model=model,
+            temperature=temp,
+            messages=_build_messages(prompt, context),
+            stream=True,
+            stream_options={"include_usage": True},
+            stop_event=stop_event,
+            **_get_sampling_options(samples),
         )
-    else:
-        client = OpenAI(
-            api_key=env('API_GPT'),
+        return consume_chat_stream(stream, on_text, stop_event, samples)
+
+async def process_text_with_openai_async(prompt: str, filename: str, model: str, temp: float, samples: int = 1) -> ModelResponse:
+    """
+    Async variant of process_text_with_openai that uses the AsyncOpenAI client.
+    Cancelling the awaiting task aborts the request.
+    """
+    with observe_stage(STAGE_EXTRACTION, model):
+        context = await asyncio.to_thread(get_paper_text, filename)
+
+    client = get_async_openai_client(get_provider_name(model), **_get_client_options(model))
+    with observe_stage(STAGE_GENERATION, model):
+        response = await client.chat.completions.create(
+            model=model,
+            temperature=temp,
+            messages=_build_messages(prompt, context),
+            stream=False,
+            **_get_sampling_options(samples),
         )
-        
-    # Send the prompt and context to the model
-    response = client.chat.completions.create(
-        model=model,
-        temperature=temp,
-        messages=[
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": context}
-        ],
-        stream=False
-    )
-    return response.choices[0].message.content
+    return _build_response(response, samples)
+
+def _get_client_options(model: str) -> dict:
+    """Returns the API key (and base url) of the provider that serves the model."""
+    if model == 'deepseek-chat':
+        return {"api_key": env('API_DEEPSEEK'), "base_url": "https://api.deepseek.com"}
+    return {"api_key": env('API_GPT')}
+
+def _get_sampling_options(samples: int) -> dict:
+    return {"n": samples} if samples > 1 else {}
+
+def _build_response(response, samples: int = 1) -> ModelResponse:
+    """Reads the output (all choices if more than one sample was requested) and the token usage."""
+    usage = Usage.from_openai(response.usage)
+    if samples <= 1:
+        return ModelResponse(response.choices[0].message.content, usage)
+    texts = [choice.message.content for choice in response.choices]
+    return ModelResponse(texts[0], usage, samples=texts)
+
+def _build_messages(prompt: str, context: str) -> list:
+    return [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": context}
+    ]
 
 def test_deepseek_pipeline() -> bool:
     """
@@ -50,11 +109,8 @@ def test_deepseek_pipeline() -> bool:
         bool: True if the API call succeeds and a response is received, False otherwise.
     """
     try:
-        # Initialize the DeepSeek client
-        client = OpenAI(
-            api_key=env('API_DEEPSEEK'),
-            base_url="https://api.deepseek.com"
-        )
+        # Get the DeepSeek client
+        client = get_openai_client("deepseek", **_get_client_options("deepseek-chat"))
         
         # Make a test request to the DeepSeek model
         response = client.chat.completions.create(
@@ -1,49 +1,245 @@
+import asyncio
 import os
-from sep.env_manager import env
-from google import genai
+import threading
+from datetime import datetime
+from typing import Callable
+from sep.env_manager import env, GEMINI_UPLOADS
+from sep.core.api_request.cancellation import closing_responses, raise_if_cancelled, run_cancellable
+from sep.core.api_request.single_flight import AsyncSingleFlight, SingleFlight
+from sep.core.api_request.streaming import read_to_end
+from sep.core.api_request.usage import ModelResponse, Usage
+from sep.core.services.metrics import observe_stage, STAGE_UPLOAD, STAGE_GENERATION
+from sep.core.services.paper_cache import get_paper_hash
+from sep.core.utils.upload_registry import Upload, UploadRegistry, get_upload_registry
+from sep.core.api_request.client_registry import get_gemini_client
+from google.genai import errors as genai_errors
 from sep.logger import setup_logger
 
 log = setup_logger(__name__)
 
-client = genai.Client(api_key=env('API_GEMINI'))
+def get_client():
+    """Returns the pooled google-genai client of the process."""
+    return get_gemini_client(env('API_GEMINI'))
 
-# Global list to check for already uploaded pdfs
-uploaded_files = []
+# Name of the provider in the upload registry
+PROVIDER = "gemini"
 
-def get_filename_without_path_and_extension(filepath: str) -> str:
-    """
-    Extracts the filename without the path and extension.
-    """
-    return os.path.splitext(os.path.basename(filepath))[0]
+# Used when the gemini_uploads section of the config.yaml has no entry
+DEFAULT_EXPIRY_MARGIN = 3600
+DEFAULT_REVALIDATE_INTERVAL = 3600
+DEFAULT_TTL = 48 * 3600
+
+# Concurrent requests for the same PDF (e.g. the runs of a fan-out) wait for a single upload
+_uploads = SingleFlight()
+_async_uploads = AsyncSingleFlight()
 
-def process_file_with_gemini(prompt: str, filename: str, model: str, temperature: float) -> str:
+def process_file_with_gemini(prompt: str, filename: str, model: str, temperature: float, stop_event: threading.Event = None, samples: int = 1) -> ModelResponse:
     """
     Processes the file with Gemini model by uploading it if not already uploaded, 
     and generates content based on the prompt.
+    The upload and the generation are aborted as soon as the stop_event is set (the output is streamed,
+    so closing its response stops the generation).
+    With samples > 1, that many candidates are generated in one request (the PDF is billed once).
+
+    Returns:
+        ModelResponse: The generated text and the token usage.
     """
-    global uploaded_files
-    
-    # Extract filename without path and extension
-    file_key = get_filename_without_path_and_extension(filename)
-
-    # Check if the PDF has already been uploaded
-    for uploaded_file in uploaded_files:
-        if uploaded_file["name"] == file_key:
-            log.info(f"File '{file_key}' was already uploaded. Using the saved version instead.")
-            file = uploaded_file["file"]
-            break
-    else:
-        # Upload file if not present in the list
-        file  = client.files.upload(file=filename)
-        log.info(f"Uploaded file '{file.display_name}' as: {file.uri}")
-
-        # Add the file to the list
-        uploaded_files.append({
-            "name": file_key,
-            "file": file
-        })
-
-    contents = [
+    file = get_or_upload_file(filename, model, stop_event)
+    return _stream_file(prompt, file, model, temperature, read_to_end, stop_event, samples)
+
+def stream_file_with_gemini(prompt: str, filename: str, model: str, temperature: float, on_text: Callable[[str], bool], stop_event: threading.Event = None) -> ModelResponse:
+    """
+    Streaming variant of process_file_with_gemini. Every chunk of the output is passed to on_text,
+    the stream is closed as soon as on_text returns False.
+
+    Returns:
+        ModelResponse: The output received until then and the token usage of the last chunk.
+    """
+    file = get_or_upload_file(filename, model, stop_event)
+    return _stream_file(prompt, file, model, temperature, on_text, stop_event)
+
+def _stream_file(prompt: str, file, model: str, temperature: float, on_text: Callable[[str], bool], stop_event: threading.Event = None, samples: int = 1) -> ModelResponse:
+    """
+    Streams the output of the uploaded file, the candidates are collected by their index (on_text receives the first one).
+    google-genai sends the request when the stream is first read and does not close the response when the stream
+    is closed, so the stream is read in run_cancellable and its response is closed by the response scope.
+    """
+    parts: dict[int, list[str]] = {index: [] for index in range(samples)}
+
+    def _read():
+        usage_metadata = None
+        stream = get_client().models.generate_content_stream(
+            model=model,
+            contents=build_contents(file, prompt),
+            config=build_config(temperature, samples),
+        )
+        try:
+            for chunk in stream:
+                raise_if_cancelled(stop_event)
+                usage_metadata = chunk.usage_metadata or usage_metadata
+                if not _add_candidates(chunk, parts, on_text):
+                    break
+        finally:
+            stream.close()
+        return usage_metadata
+
+    with observe_stage(STAGE_GENERATION, model), closing_responses():
+        usage_metadata = run_cancellable(_read, stop_event=stop_event)
+    texts = ["".join(parts[index]) for index in sorted(parts)]
+    if samples <= 1:
+        return ModelResponse(texts[0], Usage.from_gemini(usage_metadata))
+    return ModelResponse(texts[0], Usage.from_gemini(usage_metadata), samples=texts)
+
+def _add_candidates(chunk, parts: dict[int, list[str]], on_text: Callable[[str], bool]) -> bool:
+    """Adds the text of the candidates of the chunk, returns False if on_text stops the stream."""
+    for candidate in chunk.candidates or []:
+        text = _get_candidate_text(candidate)
+        if not text:
+            continue
+        index = candidate.index or 0
+        parts.setdefault(index, []).append(text)
+        if index == 0 and not on_text(text):
+            return False
+    return True
+
+def _get_candidate_text(candidate) -> str:
+    content = candidate.content
+    if content is None or not content.parts:
+        return ""
+    return "".join(part.text for part in content.parts if part.text)
+
+async def process_file_with_gemini_async(prompt: str, filename: str, model: str, temperature: float, samples: int = 1) -> ModelResponse:
+    """
+    Async variant of process_file_with_gemini that uses the aio client of google-genai.
+    Cancelling the awaiting task aborts the request.
+    """
+    file = await get_or_upload_file_async(filename, model)
+
+    with observe_stage(STAGE_GENERATION, model):
+        response = await get_client().aio.models.generate_content(
+            model=model,
+            contents=build_contents(file, prompt),
+            config=build_config(temperature, samples),
+        )
+    return build_response(response, samples)
+
+def get_or_upload_file(filename: str, model: str, stop_event: threading.Event = None, registry: UploadRegistry = None) -> Upload:
+    """
+    Returns the upload of the PDF from the upload registry (indexed by the hash of the PDF).
+    The PDF is uploaded if it was never uploaded, its upload expires soon or Gemini deleted it.
+    The upload is aborted as soon as the stop_event is set.
+    """
+    registry = registry or get_upload_registry()
+    content_hash = get_paper_hash(filename)
+
+    def _get_or_upload():
+        upload = _get_valid_upload(registry, content_hash, stop_event)
+        if upload is None:
+            with observe_stage(STAGE_UPLOAD, model):
+                file = run_cancellable(get_client().files.upload, file=filename, stop_event=stop_event)
+            upload = _register_upload(registry, content_hash, filename, file)
+        return upload
+
+    upload, _ = _uploads.do(content_hash, _get_or_upload, stop_event)
+    return upload
+
+async def get_or_upload_file_async(filename: str, model: str, registry: UploadRegistry = None) -> Upload:
+    """Async variant of get_or_upload_file. The registry is read and written in worker threads."""
+    registry = registry or get_upload_registry()
+    content_hash = await asyncio.to_thread(get_paper_hash, filename)
+
+    async def _get_or_upload():
+        upload = await _get_valid_upload_async(registry, content_hash)
+        if upload is None:
+            with observe_stage(STAGE_UPLOAD, model):
+                file = await get_client().aio.files.upload(file=filename)
+            upload = await asyncio.to_thread(_register_upload, registry, content_hash, filename, file)
+        return upload
+
+    upload, _ = await _async_uploads.do(content_hash, _get_or_upload)
+    return upload
+
+def _get_valid_upload(registry: UploadRegistry, content_hash: str, stop_event: threading.Event = None) -> Upload | None:
+    """
+    Returns the registered upload of the PDF if it can still be used.
+    Uploads that were not checked for revalidate_interval seconds are looked up with the Files API first.
+    """
+    upload = registry.get(PROVIDER, content_hash)
+    if upload is None or _is_expired(registry, upload):
+        return None
+    if not _needs_revalidation(registry, upload):
+        return upload
+    try:
+        file = run_cancellable(get_client().files.get, name=upload.name, stop_event=stop_event)
+    except genai_errors.ClientError as e:
+        file = None
+        log.info(f"Upload '{upload.name}' of {upload.file_name} is no longer available ({e.code}).")
+    return _revalidate(registry, upload, file)
+
+async def _get_valid_upload_async(registry: UploadRegistry, content_hash: str) -> Upload | None:
+    """Async variant of _get_valid_upload."""
+    upload = await asyncio.to_thread(registry.get, PROVIDER, content_hash)
+    if upload is None or _is_expired(registry, upload):
+        return None
+    if not _needs_revalidation(registry, upload):
+        return upload
+    try:
+        file = await get_client().aio.files.get(name=upload.name)
+    except genai_errors.ClientError as e:
+        file = None
+        log.info(f"Upload '{upload.name}' of {upload.file_name} is no longer available ({e.code}).")
+    return await asyncio.to_thread(_revalidate, registry, upload, file)
+
+def _is_expired(registry: UploadRegistry, upload: Upload) -> bool:
+    if upload.is_expired(registry.now(), GEMINI_UPLOADS.get("expiry_margin", DEFAULT_EXPIRY_MARGIN)):
+        log.info(f"Upload '{upload.name}' of {upload.file_name} expires soon, uploading it again.")
+        return True
+    return False
+
+def _needs_revalidation(registry: UploadRegistry, upload: Upload) -> bool:
+    return registry.now() - upload.verified_at >= GEMINI_UPLOADS.get("revalidate_interval", DEFAULT_REVALIDATE_INTERVAL)
+
+def _revalidate(registry: UploadRegistry, upload: Upload, file) -> Upload | None:
+    """Keeps the upload if Gemini still has the file (file is None if it was not found), removes it otherwise."""
+    if file is None or _get_state(file) == "FAILED":
+        registry.remove(upload)
+        return None
+    registry.mark_verified(upload)
+    log.info(f"File '{upload.file_name}' was already uploaded. Using the saved version instead.")
+    return upload
+
+def _register_upload(registry: UploadRegistry, content_hash: str, filename: str, file) -> Upload:
+    """Adds a freshly uploaded file to the upload registry."""
+    log.info(f"Uploaded file '{file.display_name}' as: {file.uri}")
+    now = registry.now()
+    upload = Upload(
+        provider=PROVIDER,
+        content_hash=content_hash,
+        file_name=os.path.basename(filename),
+        name=file.name,
+        uri=file.uri,
+        mime_type=file.mime_type,
+        uploaded_at=now,
+        expires_at=_get_expiry(file, now),
+        verified_at=now,
+    )
+    registry.put(upload)
+    return upload
+
+def _get_expiry(file, now: float) -> float:
+    """Returns the expiration time reported by Gemini, or the default lifetime of uploads if it is missing."""
+    expiration_time = getattr(file, "expiration_time", None)
+    if isinstance(expiration_time, datetime):
+        return expiration_time.timestamp()
+    return now + GEMINI_UPLOADS.get("default_ttl", DEFAULT_TTL)
+
+def _get_state(file) -> str | None:
+    state = getattr(file, "state", None)
+    return getattr(state, "name", state)
+
+def build_contents(file, prompt: str) -> list:
+    """Builds the request contents from the uploaded PDF and the prompt."""
+    return [
         {
             "role": "user",
             "parts": [
@@ -53,19 +249,27 @@ def process_file_with_gemini(prompt: str, filename: str, model: str, temperature
         }
     ]
 
-    response = client.models.generate_content(
-        model=model,
-        contents=contents,
-        config={"temperature": temperature},
-    )
-    return response.text
+def build_config(temperature: float, samples: int = 1) -> dict:
+    """Builds the generation config, more than one sample is requested as candidates."""
+    config = {"temperature": temperature}
+    if samples > 1:
+        config["candidate_count"] = samples
+    return config
+
+def build_response(response, samples: int = 1) -> ModelResponse:
+    """Reads the generated text (all candidates if more than one sample was requested) and the token usage."""
+    usage = Usage.from_gemini(response.usage_metadata)
+    if samples <= 1:
+        return ModelResponse(response.text, usage)
+    texts = [_get_candidate_text(candidate) for candidate in response.candidates]
+    return ModelResponse(texts[0], usage, samples=texts)
 
 def test_gemini_pipeline():
     """
     Tests the Gemini pipeline by making a test call and checking if it responds correctly.
     """
     try:
-        response = client.models.generate_content(
+        response = get_client().models.generate_content(
             model="gemini-1.5-flash",
             contents=[{"role": "user", "parts": [{"text": "This is a test call. Simply answer with the word test."}]}]
         )
@@ -79,5 +283,5 @@ def get_gemini_model_name(model: str) -> str:
     Fetches the model information and returns the model name.
     (The real version is a TODO item)
     """
-    model_info = client.models.get(model=model)
+    model_info = get_client().models.get(model=model)
     return model_info.name #TODO GET REAL MODEL VERSION
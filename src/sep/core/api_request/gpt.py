@@ -1,78 +1,261 @@
 """
 This script interacts with the OpenAI API and processes PDF files using an assistant model.
 It includes functions to process a PDF with OpenAI, test the GPT pipeline, and get the GPT model name.
+The assistant and the vector stores of the papers are kept by the session layer (see gpt_session.py).
 """
 
-from openai import OpenAI
-from sep.env_manager import env
-from openai.types.beta.threads.message_create_params import (
-    Attachment,
-    AttachmentToolFileSearch,
-)
-from sep.core.utils.gpt_file_manager import get_file
+from sep.env_manager import env, OPENAI_ASSISTANT
+from sep.core.api_request.client_registry import get_openai_client, get_async_openai_client
+from sep.core.api_request.gpt_session import AssistantSession
+from sep.core.api_request.streaming import consume_chat_stream, read_to_end, stream_whole_response
+from sep.core.api_request.cancellation import closing_responses, raise_if_cancelled, run_cancellable
+from sep.core.api_request.usage import ModelResponse, Usage
+from sep.core.services.metrics import observe_stage, STAGE_UPLOAD, STAGE_GENERATION
+import asyncio
+import base64
+import os
+import threading
+import time
 import logging
+from typing import Callable
 
 logging.basicConfig(level=logging.INFO)
 
 # Assistant ID for interacting with the OpenAI Assistant
 assistantID = "asst_IU1BLwiptkX3J4fj5f2wRfaI"
 
-# Initialize the OpenAI client with the API key
-client = OpenAI(
-        api_key=env('API_GPT'),
-    )
+# Maximum time to wait for an assistant run and the interval between two status checks (seconds)
+RUN_TIMEOUT = 20000
+POLL_INTERVAL = 1.0
+
+# Name of the provider in the http_clients section of the config.yaml
+PROVIDER = "openai"
+
+def get_client():
+    """Returns the pooled OpenAI client of the process."""
+    return get_openai_client(PROVIDER, env('API_GPT'))
+
+def get_async_client():
+    """Returns the pooled AsyncOpenAI client of the running event loop."""
+    return get_async_openai_client(PROVIDER, env('API_GPT'))
 
-def process_pdf_with_openai(prompt: str, filename: str, model: str, temperature: float) -> str:
+# Input modes of the PDFs (pdf_input in the openai_assistant section of the config.yaml)
+PDF_INPUT_FILE_SEARCH = "file_search"
+PDF_INPUT_DIRECT = "direct"
+DEFAULT_PDF_INPUT = PDF_INPUT_FILE_SEARCH
+
+# Tools of the assistant runs: the assistant is configured by its ID, so the run enables the file_search
+# tool itself, otherwise the vector store of the PDF would be ignored
+RUN_TOOLS = [{"type": "file_search"}]
+
+# Caches the assistant and the vector stores of the papers
+_session = AssistantSession(get_client, assistantID)
+
+def process_pdf_with_openai(prompt: str, filename: str, model: str, temperature: float, stop_event: threading.Event = None, samples: int = 1) -> ModelResponse:
     """
     Processes a PDF file with OpenAI using the specified prompt and model parameters.
+    With the file_search input, the assistant answers from the vector store of the paper; with the direct
+    input, the PDF is sent with the prompt to the requested model (samples > 1 only with the direct input).
+    If the stop_event is set while the assistant is working, the thread run is cancelled.
 
     Returns:
-        str: The result text from the OpenAI assistant.
+        ModelResponse: The result text from the OpenAI assistant and the token usage of the run.
 
     Raises:
         Exception: If the OpenAI processing fails or if the response is malformed.
+        RequestCancelled: If the stop_event was set before the response arrived.
     """
-    pdf_assistant = client.beta.assistants.retrieve(assistantID)
-    
-    # Create a new thread for the processing
-    thread = client.beta.threads.create()
-    
-    # Get the file ID for the PDF
-    file_id = get_file(filename, client)
-
-    # Send the file and prompt to the assistant
-    client.beta.threads.messages.create(
-        thread_id=thread.id,
-        role="user",
-        attachments=[ 
-            Attachment(
-                file_id=file_id, tools=[AttachmentToolFileSearch(type="file_search")]
-            )
-        ],
-        content=prompt,
-    )
+    if uses_direct_input():
+        return _process_pdf_directly(prompt, filename, model, temperature, stop_event, samples)
 
-    # Run the assistant and wait for the response
-    run = client.beta.threads.runs.create_and_poll(
-        thread_id=thread.id, assistant_id=pdf_assistant.id, timeout=20000, temperature=temperature
-    )
+    pdf_assistant = _session.get_assistant()
+
+    # Get the vector store of the PDF (created and indexed on first use only)
+    with observe_stage(STAGE_UPLOAD, model):
+        vector_store_id = run_cancellable(_session.get_vector_store, filename, stop_event, stop_event=stop_event)
+
+    # Create the thread with the prompt and run the assistant on it in one request, then wait for the response
+    with observe_stage(STAGE_GENERATION, model):
+        run = get_client().beta.threads.create_and_run(
+            assistant_id=pdf_assistant.id, thread=_build_thread(prompt, vector_store_id), tools=RUN_TOOLS, temperature=temperature
+        )
+        run = _wait_for_run(run, run.thread_id, stop_event)
 
     # If the run is successful, extract the response text
     if run.status == "completed":
-        messages_cursor = client.beta.threads.messages.list(thread_id=thread.id)
-        messages = [message for message in messages_cursor]
-        res_txt = messages[0].content[0].text.value
-
-        logging.info("Res Text: " + res_txt)
-        
-        # Raise an exception if the response text is empty or malformed
-        if not res_txt.strip():
-            raise Exception(f"Completed run but received empty or malformed response for {filename}.\n status: {run.status} \n error: {run.last_error}")
-            
-        return res_txt
+        messages_cursor = get_client().beta.threads.messages.list(thread_id=run.thread_id)
+        return ModelResponse(_get_response_text([message for message in messages_cursor], run, filename), Usage.from_openai(run.usage))
+    else:
+        raise Exception(f"Run failed with \n status: {run.status} \n error: {run.last_error}")
+
+async def process_pdf_with_openai_async(prompt: str, filename: str, model: str, temperature: float, samples: int = 1) -> ModelResponse:
+    """
+    Async variant of process_pdf_with_openai that uses the AsyncOpenAI get_client().
+    Cancelling the awaiting task cancels the thread run at OpenAI.
+    """
+    if uses_direct_input():
+        return await _process_pdf_directly_async(prompt, filename, model, temperature, samples)
+
+    # The session (assistant cache and upload registry) is synchronous
+    pdf_assistant = await asyncio.to_thread(_session.get_assistant)
+    with observe_stage(STAGE_UPLOAD, model):
+        vector_store_id = await asyncio.to_thread(_session.get_vector_store, filename)
+
+    with observe_stage(STAGE_GENERATION, model):
+        run = await get_async_client().beta.threads.create_and_run(
+            assistant_id=pdf_assistant.id, thread=_build_thread(prompt, vector_store_id), tools=RUN_TOOLS, temperature=temperature
+        )
+        try:
+            deadline = time.monotonic() + RUN_TIMEOUT
+            while run.status in ("queued", "in_progress", "cancelling"):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"The assistant run {run.id} did not finish within {RUN_TIMEOUT} seconds.")
+                await asyncio.sleep(POLL_INTERVAL)
+                run = await get_async_client().beta.threads.runs.retrieve(run_id=run.id, thread_id=run.thread_id)
+        except (asyncio.CancelledError, TimeoutError):
+            try:
+                await get_async_client().beta.threads.runs.cancel(run_id=run.id, thread_id=run.thread_id)
+            except Exception:
+                logging.exception(f"Could not cancel the assistant run {run.id}.")
+            raise
+
+    if run.status == "completed":
+        messages_cursor = get_async_client().beta.threads.messages.list(thread_id=run.thread_id)
+        return ModelResponse(_get_response_text([message async for message in messages_cursor], run, filename), Usage.from_openai(run.usage))
     else:
         raise Exception(f"Run failed with \n status: {run.status} \n error: {run.last_error}")
+
+def stream_pdf_with_openai(prompt: str, filename: str, model: str, temperature: float, on_text: Callable[[str], bool], stop_event: threading.Event = None) -> ModelResponse:
+    """
+    Streaming variant of process_pdf_with_openai. With the direct input, every chunk of the output is passed
+    to on_text and the stream is closed as soon as on_text returns False. The assistant runs are not streamed,
+    their whole output is passed to on_text at once.
+
+    Returns:
+        ModelResponse: The output received until then and the token usage (if the stream was read to the end).
+    """
+    if not uses_direct_input():
+        return stream_whole_response(process_pdf_with_openai)(prompt, filename, model, temperature, on_text, stop_event)
+    return _stream_pdf_directly(prompt, filename, model, temperature, on_text, stop_event)
+
+def uses_direct_input() -> bool:
+    """Checks if PDFs are sent directly to the model instead of being searched by the assistant."""
+    return OPENAI_ASSISTANT.get("pdf_input", DEFAULT_PDF_INPUT) == PDF_INPUT_DIRECT
+
+def _process_pdf_directly(prompt: str, filename: str, model: str, temperature: float, stop_event: threading.Event = None, samples: int = 1) -> ModelResponse:
+    """Sends the PDF with the prompt to the chat completions of the model (no assistant, no vector store)."""
+    return _stream_pdf_directly(prompt, filename, model, temperature, read_to_end, stop_event, samples)
+
+def _stream_pdf_directly(prompt: str, filename: str, model: str, temperature: float, on_text: Callable[[str], bool], stop_event: threading.Event = None, samples: int = 1) -> ModelResponse:
+    """
+    Streams the output of the direct input, a stopped run closes the response of the stream.
+
+    Raises:
+        Exception: If the response text is empty.
+    """
+    with observe_stage(STAGE_GENERATION, model), closing_responses():
+        stream = run_cancellable(
+            get_client().chat.completions.create,
+            model=model,
+            temperature=temperature,
+            messages=_build_direct_messages(prompt, filename),
+            stream=True,
+            stream_options={"include_usage": True},
+            stop_event=stop_event,
+            **_get_sampling_options(samples),
+        )
+        response = consume_chat_stream(stream, on_text, stop_event, samples)
+    if not response.text.strip():
+        raise Exception(f"Received an empty response for {filename}.")
+    return response
+
+async def _process_pdf_directly_async(prompt: str, filename: str, model: str, temperature: float, samples: int = 1) -> ModelResponse:
+    """Async variant of _process_pdf_directly."""
+    messages = await asyncio.to_thread(_build_direct_messages, prompt, filename)
+    with observe_stage(STAGE_GENERATION, model):
+        response = await get_async_client().chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=messages,
+            **_get_sampling_options(samples),
+        )
+    return _build_direct_response(response, filename, samples)
+
+def _build_thread(prompt: str, vector_store_id: str) -> dict:
+    """Builds the thread with the prompt, the file_search tool of the run (RUN_TOOLS) searches the vector store of the PDF."""
+    return {
+        "messages": [{"role": "user", "content": prompt}],
+        "tool_resources": {"file_search": {"vector_store_ids": [vector_store_id]}},
+    }
+
+def _build_direct_messages(prompt: str, filename: str) -> list:
+    """Builds the message with the base64 encoded PDF and the prompt."""
+    with open(filename, "rb") as f:
+        file_data = base64.b64encode(f.read()).decode("ascii")
+    return [{
+        "role": "user",
+        "content": [
+            {"type": "file", "file": {"filename": os.path.basename(filename), "file_data": f"data:application/pdf;base64,{file_data}"}},
+            {"type": "text", "text": prompt},
+        ],
+    }]
+
+def _get_sampling_options(samples: int) -> dict:
+    return {"n": samples} if samples > 1 else {}
+
+def _build_direct_response(response, filename: str, samples: int = 1) -> ModelResponse:
+    """
+    Reads the output (all choices if more than one sample was requested) and the token usage.
+
+    Raises:
+        Exception: If the response text is empty.
+    """
+    texts = [choice.message.content or "" for choice in response.choices]
+    if not texts[0].strip():
+        raise Exception(f"Received an empty response for {filename}.")
+    usage = Usage.from_openai(response.usage)
+    if samples <= 1:
+        return ModelResponse(texts[0], usage)
+    return ModelResponse(texts[0], usage, samples=texts)
+
+def _get_response_text(messages: list, run, filename: str) -> str:
+    """
+    Extracts the response text of the assistant from the thread messages.
+
+    Raises:
+        Exception: If the response text is empty or malformed.
+    """
+    res_txt = messages[0].content[0].text.value
+
+    logging.info("Res Text: " + res_txt)
+
+    # Raise an exception if the response text is empty or malformed
+    if not res_txt.strip():
+        raise Exception(f"Completed run but received empty or malformed response for {filename}.\n status: {run.status} \n error: {run.last_error}")
+
+    return res_txt
     
+def _wait_for_run(run, thread_id: str, stop_event: threading.Event = None):
+    """
+    Polls the assistant run until it is no longer queued or in progress.
+    Cancels the run at OpenAI if the stop_event is set or the timeout is reached.
+    """
+    deadline = time.monotonic() + RUN_TIMEOUT
+    while run.status in ("queued", "in_progress", "cancelling"):
+        stopped = stop_event is not None and stop_event.wait(POLL_INTERVAL)
+        if stopped or time.monotonic() > deadline:
+            try:
+                get_client().beta.threads.runs.cancel(run_id=run.id, thread_id=thread_id)
+            except Exception:
+                logging.exception(f"Could not cancel the assistant run {run.id}.")
+            raise_if_cancelled(stop_event)
+            raise TimeoutError(f"The assistant run {run.id} did not finish within {RUN_TIMEOUT} seconds.")
+        if stop_event is None:
+            time.sleep(POLL_INTERVAL)
+
+        run = get_client().beta.threads.runs.retrieve(run_id=run.id, thread_id=thread_id)
+    return run
+
 def test_gpt_pipeline():
     """
     Tests if the GPT pipeline is functioning by sending a simple test prompt.
@@ -81,10 +264,7 @@ def test_gpt_pipeline():
         bool: True if the pipeline is working, False if an error occurs.
     """
     try:
-        client = OpenAI(
-            api_key=env('API_GPT'),
-        )
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {"role": "user", "content": "This is a test call. Simply answer with the word test."}
@@ -102,10 +282,7 @@ def get_gpt_model_name(model: str) -> str:
     Returns:
         str: The name of the GPT model used.
     """
-    client = OpenAI(
-        api_key=env('API_GPT'),
-    )
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model=model,
         messages=[
             {"role": "user", "content": "This is a test call. Simply answer with the word test."}
@@ -0,0 +1,132 @@
+"""
+Session layer of the OpenAI assistant path.
+
+The assistant is retrieved once per process instead of once per request, and every paper gets one
+persistent vector store that is indexed once and re-used by all later requests (also by other
+processes and after restarts, it is kept in the upload registry under the hash of the PDF). Vector
+stores expire after some days without use, expired or deleted ones are created again.
+"""
+
+import threading
+import time
+from typing import Callable
+from openai import NotFoundError
+from sep.env_manager import OPENAI_ASSISTANT
+from sep.core.api_request.cancellation import raise_if_cancelled
+from sep.core.services.paper_cache import get_paper_hash
+from sep.core.utils.gpt_file_manager import get_file
+from sep.core.utils.upload_registry import Upload, UploadRegistry, get_upload_registry
+from sep.logger import setup_logger
+
+log = setup_logger(__name__)
+
+# Name of the vector stores in the upload registry
+PROVIDER = "openai-vector-store"
+
+# Used when the openai_assistant section of the config.yaml has no entry
+DEFAULT_VECTOR_STORE_DAYS = 7
+DEFAULT_EXPIRY_MARGIN = 3600
+DEFAULT_REVALIDATE_INTERVAL = 3600
+DEFAULT_INDEX_TIMEOUT = 300
+
+# Seconds between two status checks while a vector store is indexed
+INDEX_POLL_INTERVAL = 1.0
+
+
+class AssistantSession:
+    """Caches the assistant and the vector stores of the papers. get_client returns the OpenAI client to use."""
+
+    def __init__(self, get_client: Callable[[], object], assistant_id: str, registry: UploadRegistry = None, options: dict = None):
+        self.get_client = get_client
+        self.assistant_id = assistant_id
+        self.registry = registry
+        self.options = OPENAI_ASSISTANT if options is None else options
+        self._assistant = None
+        self._lock = threading.Lock()
+
+    def get_assistant(self):
+        """Returns the assistant, it is retrieved on first use only."""
+        with self._lock:
+            if self._assistant is None:
+                self._assistant = self.get_client().beta.assistants.retrieve(self.assistant_id)
+            return self._assistant
+
+    def get_vector_store(self, file_path: str, stop_event: threading.Event = None) -> str:
+        """
+        Returns the ID of the vector store of the paper. It is created (and the PDF uploaded) if the paper
+        has none yet or its vector store expires soon or was deleted. Creation waits until the PDF is indexed.
+        """
+        registry = self.registry or get_upload_registry()
+        content_hash = get_paper_hash(file_path)
+
+        vector_store = registry.get(PROVIDER, content_hash)
+        if vector_store is not None and not self._is_valid(registry, vector_store, stop_event):
+            registry.remove(vector_store)
+            vector_store = None
+        if vector_store is None:
+            vector_store = registry.upload_once(PROVIDER, content_hash, lambda: self._create_vector_store(file_path, content_hash, registry, stop_event))
+        return vector_store.name
+
+    def _is_valid(self, registry: UploadRegistry, vector_store: Upload, stop_event: threading.Event = None) -> bool:
+        """
+        Checks if the vector store can be used. The registry is trusted within the revalidate interval unless the
+        vector store expires soon. Its expiry moves with every use (last_active_at), so a vector store that seems to
+        expire is retrieved and only replaced if the retrieved expiry is near as well.
+        """
+        margin = self.options.get("expiry_margin", DEFAULT_EXPIRY_MARGIN)
+        expiring = vector_store.is_expired(registry.now(), margin)
+        if not expiring and registry.now() - vector_store.verified_at < self.options.get("revalidate_interval", DEFAULT_REVALIDATE_INTERVAL):
+            return True
+
+        raise_if_cancelled(stop_event)
+        try:
+            retrieved = self.get_client().vector_stores.retrieve(vector_store.name)
+            status = retrieved.status
+        except NotFoundError:
+            retrieved = None
+            status = "deleted"
+        if status != "completed":
+            log.info(f"Vector store {vector_store.name} of {vector_store.file_name} is {status}, creating a new one.")
+            return False
+        registry.mark_verified(vector_store, retrieved.expires_at)
+        if vector_store.is_expired(registry.now(), margin):
+            log.info(f"Vector store {vector_store.name} of {vector_store.file_name} expires soon, creating a new one.")
+            return False
+        return True
+
+    def _create_vector_store(self, file_path: str, content_hash: str, registry: UploadRegistry, stop_event: threading.Event = None) -> Upload:
+        file_id = get_file(file_path, self.get_client(), registry)
+        raise_if_cancelled(stop_event)
+        days = self.options.get("vector_store_days", DEFAULT_VECTOR_STORE_DAYS)
+        vector_store = self.get_client().vector_stores.create(
+            name=f"sep-{content_hash[:16]}",
+            file_ids=[file_id],
+            expires_after={"anchor": "last_active_at", "days": days},
+        )
+
+        deadline = time.monotonic() + self.options.get("index_timeout", DEFAULT_INDEX_TIMEOUT)
+        while vector_store.status == "in_progress":
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"The vector store {vector_store.id} was not indexed within {self.options.get('index_timeout', DEFAULT_INDEX_TIMEOUT)} seconds.")
+            if stop_event is not None:
+                if stop_event.wait(INDEX_POLL_INTERVAL):
+                    raise_if_cancelled(stop_event)
+            else:
+                time.sleep(INDEX_POLL_INTERVAL)
+            vector_store = self.get_client().vector_stores.retrieve(vector_store.id)
+        if vector_store.status != "completed" or vector_store.file_counts.failed:
+            raise Exception(f"Indexing the vector store {vector_store.id} of {file_path} failed with status {vector_store.status}.")
+        log.info(f"Created vector store {vector_store.id} for {file_path}.")
+
+        now = registry.now()
+        return Upload(
+            provider=PROVIDER,
+            content_hash=content_hash,
+            file_name=file_path.replace("\\", "/").rsplit("/", 1)[-1],
+            name=vector_store.id,
+            uri=file_id,
+            uploaded_at=now,
+            # the expiry is moved with every use, the registry keeps the last one that was retrieved
+            expires_at=vector_store.expires_at or now + days * 24 * 3600,
+            verified_at=now,
+        )
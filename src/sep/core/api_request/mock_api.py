@@ -1,19 +1,83 @@
+import asyncio
+import threading
+import time
 from datetime import datetime
+from typing import Callable
+from sep.core.api_request.cancellation import raise_if_cancelled, run_cancellable
+from sep.core.api_request.usage import ModelResponse, Usage
 
-def process_test_pipeline(prompt: str, filename: str, model: str, temperature: float) -> str:
+# Response time of the test-slow model in seconds
+SLOW_RESPONSE_TIME = 30
+
+# Characters per token of the estimated usage of the test models
+CHARS_PER_TOKEN = 4
+
+def process_test_pipeline(prompt: str, filename: str, model: str, temperature: float, stop_event: threading.Event = None, samples: int = 1) -> ModelResponse:
     """
     Returns a standart text, to test the pipeline without using the APIs.
+    With samples > 1, the text is returned that many times like a provider with multi-sampling (prompt tokens counted once).
 
     Returns:
-        str: The result text.
+        ModelResponse: The result text and an estimated token usage.
+
+    Raises:
+        Exception: The model test-exception will throw exceptions, to test exceptions handling.
+    """
+
+    if model == "test-exception":
+        raise Exception(f"Run failed with \n status: Test Exception thrown")
+
+    if model == "test-slow":
+        # simulates a long, blocking provider call to test the cancellation of in-flight requests
+        run_cancellable(time.sleep, SLOW_RESPONSE_TIME, stop_event=stop_event)
+
+    return _get_test_response(prompt, model, temperature, samples)
+
+def stream_test_pipeline(prompt: str, filename: str, model: str, temperature: float, on_text: Callable[[str], bool], stop_event: threading.Event = None) -> ModelResponse:
+    """
+    Streaming variant of process_test_pipeline, the standart text is passed to on_text line by line.
 
     Raises:
         Exception: The model test-exception will throw exceptions, to test exceptions handling.
     """
+    response = process_test_pipeline(prompt, filename, model, temperature, stop_event)
+    streamed = []
+    for line in response.text.splitlines(keepends=True):
+        raise_if_cancelled(stop_event)
+        streamed.append(line)
+        if not on_text(line):
+            break
+    return ModelResponse("".join(streamed), get_test_usage(prompt, "".join(streamed)))
+
+async def process_test_pipeline_async(prompt: str, filename: str, model: str, temperature: float, samples: int = 1) -> ModelResponse:
+    """
+    Async variant of process_test_pipeline.
 
+    Raises:
+        Exception: The model test-exception will throw exceptions, to test exceptions handling.
+    """
     if model == "test-exception":
         raise Exception(f"Run failed with \n status: Test Exception thrown")
 
+    if model == "test-slow":
+        await asyncio.sleep(SLOW_RESPONSE_TIME)
+
+    return _get_test_response(prompt, model, temperature, samples)
+
+def get_test_usage(prompt: str, text: str) -> Usage:
+    """Estimates the tokens of a test request (about four characters per token)."""
+    return Usage(prompt_tokens=len(prompt) // CHARS_PER_TOKEN, completion_tokens=len(text) // CHARS_PER_TOKEN)
+
+def _get_test_response(prompt: str, model: str, temperature: float, samples: int = 1) -> ModelResponse:
+    text = get_test_text(model, temperature)
+    usage = get_test_usage(prompt, text)
+    if samples <= 1:
+        return ModelResponse(text, usage)
+    usage.completion_tokens *= samples
+    return ModelResponse(text, usage, samples=[text] * samples)
+
+def get_test_text(model: str, temperature: float) -> str:
+    """Returns the standart text of the test models (also used by the local batch server)."""
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
     res_txt = (
         "This is an standart text to test the pipeline.\n"
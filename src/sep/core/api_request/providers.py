@@ -0,0 +1,220 @@
+"""
+Registry of the provider plugins that serve the models.
+
+A plugin maps model name patterns (e.g. gpt*) to the provider functions of the PDF input and of the text
+input (pdf reader mode). The functions are given as "module:function" references and are imported on first
+use, so commands that never send a request to a provider do not import its SDK. Other packages register
+plugins through the sep.providers entry point group; an entry point names a ProviderPlugin, a list of them
+or a function returning either. If several patterns match a model, the longest one wins, a plugin that is
+registered later replaces a plugin with the same pattern.
+"""
+
+import fnmatch
+import importlib
+import threading
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+from typing import Callable
+from sep.logger import setup_logger
+
+log = setup_logger(__name__)
+
+# Entry point group of third-party provider plugins
+ENTRY_POINT_GROUP = "sep.providers"
+
+
+def resolve(reference: str | Callable) -> Callable:
+    """Imports the function of a "module:function" reference (callables are returned as they are)."""
+    if callable(reference):
+        return reference
+    module, _, name = reference.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+@dataclass(frozen=True)
+class ProviderFunctions:
+    """
+    The functions of one input mode. process and process_async are called with (prompt, file_path, model,
+    temperature), stream additionally with an on_text callback (see streaming.py). multi_sampling tells if
+    process accepts samples > 1, a reference is called to decide it at request time.
+    """
+    process: str | Callable
+    process_async: str | Callable
+    stream: str | Callable | None = None
+    multi_sampling: bool | str | Callable = False
+
+    def get_process(self) -> Callable:
+        return resolve(self.process)
+
+    def get_process_async(self) -> Callable:
+        return resolve(self.process_async)
+
+    def get_stream(self) -> Callable:
+        """Returns the stream function, providers without streaming pass their whole output at once."""
+        if self.stream is None:
+            from sep.core.api_request.streaming import stream_whole_response
+            return stream_whole_response(self.get_process())
+        return resolve(self.stream)
+
+    def supports_multi_sampling(self) -> bool:
+        if isinstance(self.multi_sampling, bool):
+            return self.multi_sampling
+        return bool(resolve(self.multi_sampling)())
+
+
+@dataclass(frozen=True)
+class ProviderPlugin:
+    """
+    A provider and the models it serves. name is the provider of the rate limits, scheduler limits and
+    metrics (several plugins may serve one provider). pdf and text are the functions of the PDF input and
+    of the text input, None if the models do not support that input.
+    """
+    name: str
+    patterns: tuple[str, ...]
+    pdf: ProviderFunctions | None = None
+    text: ProviderFunctions | None = None
+    model_name: str | Callable | None = None
+
+    def get_functions(self, model: str, pdf_reader: bool) -> ProviderFunctions:
+        """
+        Returns the functions of the input mode.
+
+        Raises:
+            ValueError: If the model does not support the input mode.
+        """
+        if pdf_reader and self.text is None:
+            raise ValueError(f"A request to {model} is not possible with a PDF reader. Do not use --pdf_reader in the arguments.")
+        if not pdf_reader and self.pdf is None:
+            raise ValueError(f"A request to {model} is not possible without a PDF reader. Use --pdf_reader in the arguments.")
+        return self.text if pdf_reader else self.pdf
+
+
+_OPENAI_TEXT = ProviderFunctions(
+    "sep.core.api_request.deepseek:process_text_with_openai",
+    "sep.core.api_request.deepseek:process_text_with_openai_async",
+    "sep.core.api_request.deepseek:stream_text_with_openai",
+    multi_sampling=True,
+)
+_OPENAI_PDF = ProviderFunctions(
+    "sep.core.api_request.gpt:process_pdf_with_openai",
+    "sep.core.api_request.gpt:process_pdf_with_openai_async",
+    "sep.core.api_request.gpt:stream_pdf_with_openai",
+    # the assistant does not support n, only the direct input does
+    multi_sampling="sep.core.api_request.gpt:uses_direct_input",
+)
+_TEST = ProviderFunctions(
+    "sep.core.api_request.mock_api:process_test_pipeline",
+    "sep.core.api_request.mock_api:process_test_pipeline_async",
+    "sep.core.api_request.mock_api:stream_test_pipeline",
+    multi_sampling=True,
+)
+
+BUILTIN_PLUGINS = [
+    ProviderPlugin(
+        "gemini", ("gemini*",),
+        pdf=ProviderFunctions(
+            "sep.core.api_request.gemini:process_file_with_gemini",
+            "sep.core.api_request.gemini:process_file_with_gemini_async",
+            "sep.core.api_request.gemini:stream_file_with_gemini",
+            multi_sampling=True,
+        ),
+        model_name="sep.core.api_request.gemini:get_gemini_model_name",
+    ),
+    ProviderPlugin("openai", ("gpt*",), pdf=_OPENAI_PDF, text=_OPENAI_TEXT, model_name="sep.core.api_request.gpt:get_gpt_model_name"),
+    # o1 models have no PDF input
+    ProviderPlugin("openai", ("o1*",), text=_OPENAI_TEXT, model_name="sep.core.api_request.gpt:get_gpt_model_name"),
+    # DeepSeek does not support n
+    ProviderPlugin(
+        "deepseek", ("deepseek-chat*",),
+        pdf=ProviderFunctions(_OPENAI_PDF.process, _OPENAI_PDF.process_async, _OPENAI_PDF.stream),
+        text=ProviderFunctions(_OPENAI_TEXT.process, _OPENAI_TEXT.process_async, _OPENAI_TEXT.stream),
+        model_name="sep.core.api_request.gpt:get_gpt_model_name",
+    ),
+    # other deepseek models run on the custom (Ollama) API
+    ProviderPlugin(
+        "custom", ("deepseek*",),
+        text=ProviderFunctions(
+            "sep.core.api_request.custom_api:process_text_with_custom_api",
+            "sep.core.api_request.custom_api:process_text_with_custom_api_async",
+            "sep.core.api_request.custom_api:stream_text_with_custom_api",
+        ),
+    ),
+    ProviderPlugin("test", ("test*",), pdf=_TEST, text=_TEST),
+]
+
+
+class ProviderRegistry:
+    """Matches model names to the registered provider plugins."""
+
+    def __init__(self, plugins: list[ProviderPlugin] = None):
+        self._lock = threading.Lock()
+        # pattern -> plugin
+        self._plugins: dict[str, ProviderPlugin] = {}
+        # model name -> plugin of the model
+        self._matches: dict[str, ProviderPlugin] = {}
+        for plugin in plugins or []:
+            self.register(plugin)
+
+    def register(self, plugin: ProviderPlugin):
+        """Adds the plugin, it replaces the plugins registered before for the same patterns."""
+        with self._lock:
+            for pattern in plugin.patterns:
+                self._plugins[pattern.lower()] = plugin
+            self._matches.clear()
+
+    def load_entry_points(self, group: str = ENTRY_POINT_GROUP):
+        """Registers the plugins of the installed packages, a plugin that fails to load is skipped."""
+        for entry_point in entry_points(group=group):
+            try:
+                loaded = entry_point.load()
+                if callable(loaded):
+                    loaded = loaded()
+                for plugin in loaded if isinstance(loaded, (list, tuple)) else [loaded]:
+                    self.register(plugin)
+                    log.info(f"Registered the provider plugin {plugin.name} ({', '.join(plugin.patterns)}) of {entry_point.value}.")
+            except Exception:
+                log.exception(f"Could not load the provider plugin {entry_point.name}.")
+
+    def match(self, model: str) -> ProviderPlugin:
+        """
+        Returns the plugin of the model.
+
+        Raises:
+            ValueError: If no plugin serves the model.
+        """
+        with self._lock:
+            plugin = self._matches.get(model)
+            if plugin is None:
+                name = model.lower()
+                matching = [pattern for pattern in self._plugins if fnmatch.fnmatchcase(name, pattern)]
+                if not matching:
+                    raise ValueError(f"Unsupported model: {model}")
+                plugin = self._matches[model] = self._plugins[max(matching, key=len)]
+            return plugin
+
+    def get_functions(self, model: str, pdf_reader: bool) -> ProviderFunctions:
+        """
+        Returns the provider functions of the model and the input mode.
+
+        Raises:
+            ValueError: If no plugin serves the model or the model does not support the input mode.
+        """
+        return self.match(model).get_functions(model, pdf_reader)
+
+    @property
+    def plugins(self) -> list[ProviderPlugin]:
+        with self._lock:
+            return list(dict.fromkeys(self._plugins.values()))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_provider_registry() -> ProviderRegistry:
+    """Returns the provider registry of the process (built-in plugins and the plugins of the entry points)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ProviderRegistry(BUILTIN_PLUGINS)
+            _registry.load_entry_points()
+        return _registry
@@ -0,0 +1,222 @@
+"""
+Shared, per-provider rate limiting for all API requests.
+
+Every provider (gemini, openai, deepseek, custom) gets one limiter with two token buckets:
+one for requests per minute and one for tokens per minute. The limiter adapts to the provider:
+a 429 / RESOURCE_EXHAUSTED response halves the allowed rate, healthy responses slowly raise it
+back to the configured budget.
+"""
+
+import os
+import asyncio
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from sep.env_manager import RATE_LIMITS
+from sep.core.utils.get_provider import get_provider_name
+from sep.core.api_request.cancellation import raise_if_cancelled
+from sep.logger import setup_logger
+
+log = setup_logger(__name__)
+
+# Used when the rate_limits section of the config.yaml has no pdf_tokens entry
+DEFAULT_PDF_TOKENS = 10000
+
+# Adaptive behaviour: lowest share of the budget, recovery per healthy response, pause after a 429 (seconds)
+MIN_RATE_FACTOR = 0.1
+RECOVERY_STEP = 0.05
+DEFAULT_COOLDOWN = 10.0
+
+
+class TokenBucket:
+    """A token bucket that refills continuously with a rate given per minute."""
+
+    def __init__(self, per_minute: float, clock=time.monotonic):
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self._clock = clock
+        self._last_refill = clock()
+
+    def refill(self, factor: float = 1.0):
+        """Adds the tokens earned since the last refill, scaled by the given rate factor."""
+        now = self._clock()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.per_minute * factor / 60.0)
+
+    def wait_time(self, amount: float, factor: float = 1.0) -> float:
+        """Returns the seconds until the given amount of tokens is available (0 if available now)."""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / (self.per_minute * factor)
+
+    def consume(self, amount: float):
+        """Takes the given amount of tokens out of the bucket."""
+        self.tokens -= min(amount, self.capacity)
+
+
+class ProviderRateLimiter:
+    """Enforces requests-per-minute and tokens-per-minute budgets for a single provider."""
+
+    def __init__(self, name: str, rpm: float = None, tpm: float = None, clock=time.monotonic, sleep=time.sleep):
+        self.name = name
+        self.request_bucket = TokenBucket(rpm, clock) if rpm else None
+        self.token_bucket = TokenBucket(tpm, clock) if tpm else None
+        self.factor = 1.0
+        self.cooldown_until = 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def _wait_time(self, tokens: float) -> float:
+        """Returns the seconds until a request with the given token estimate may be sent."""
+        wait = max(0.0, self.cooldown_until - self._clock())
+        for bucket, amount in ((self.request_bucket, 1), (self.token_bucket, tokens)):
+            if bucket is not None:
+                bucket.refill(self.factor)
+                wait = max(wait, bucket.wait_time(amount, self.factor))
+        return wait
+
+    def _try_reserve(self, tokens: float) -> float:
+        """Reserves the request if it fits into both budgets (returns 0), otherwise returns the seconds to wait."""
+        with self._lock:
+            wait = self._wait_time(tokens)
+            if wait <= 0:
+                if self.request_bucket is not None:
+                    self.request_bucket.consume(1)
+                if self.token_bucket is not None:
+                    self.token_bucket.consume(tokens)
+            return wait
+
+    def acquire(self, tokens: float = 0, stop_event: threading.Event = None):
+        """
+        Blocks until the request fits into both budgets and reserves it.
+        Raises RequestCancelled if the stop_event is set while waiting.
+        """
+        while True:
+            raise_if_cancelled(stop_event)
+            wait = self._try_reserve(tokens)
+            if wait <= 0:
+                return
+            self._sleep(min(wait, 1.0))
+
+    async def acquire_async(self, tokens: float = 0):
+        """Waits without blocking the event loop until the request fits into both budgets and reserves it."""
+        while True:
+            wait = self._try_reserve(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def on_success(self):
+        """Slowly raises the allowed rate again after a healthy response."""
+        with self._lock:
+            self.factor = min(1.0, self.factor + RECOVERY_STEP)
+
+    def on_throttled(self, retry_after: float = None):
+        """Halves the allowed rate and pauses the provider after a 429 / RESOURCE_EXHAUSTED response."""
+        with self._lock:
+            self.factor = max(MIN_RATE_FACTOR, self.factor * 0.5)
+            self.cooldown_until = max(self.cooldown_until, self._clock() + (retry_after or DEFAULT_COOLDOWN))
+            log.warning(f"Provider '{self.name}' throttled the request. Reducing rate to {self.factor:.0%} of the budget.")
+
+    @contextmanager
+    def limit(self, tokens: float = 0, stop_event: threading.Event = None):
+        """Reserves a request slot and reports the outcome of the wrapped request back to the limiter."""
+        self.acquire(tokens, stop_event)
+        try:
+            yield
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self.on_throttled(get_retry_after(e))
+            raise
+        else:
+            self.on_success()
+
+    @asynccontextmanager
+    async def limit_async(self, tokens: float = 0):
+        """Async variant of limit."""
+        await self.acquire_async(tokens)
+        try:
+            yield
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self.on_throttled(get_retry_after(e))
+            raise
+        else:
+            self.on_success()
+
+
+_limiters: dict[str, ProviderRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> ProviderRateLimiter | None:
+    """
+    Returns the shared limiter of the given provider.
+    Providers without an entry in the rate_limits section of the config.yaml are not limited (None).
+    """
+    with _limiters_lock:
+        if provider not in _limiters:
+            settings = RATE_LIMITS.get(provider)
+            if not settings:
+                return None
+            _limiters[provider] = ProviderRateLimiter(provider, rpm=settings.get("rpm"), tpm=settings.get("tpm"))
+        return _limiters[provider]
+
+
+def estimate_tokens(prompt: str, file_path: str = None) -> int:
+    """Estimates the input tokens of a request (about four characters per token plus a flat estimate per PDF)."""
+    tokens = len(prompt) // 4
+    if file_path is not None and os.path.isfile(file_path):
+        tokens += RATE_LIMITS.get("pdf_tokens", DEFAULT_PDF_TOKENS)
+    return tokens
+
+
+@contextmanager
+def rate_limited(model: str, prompt: str, file_path: str = None, stop_event: threading.Event = None):
+    """Wraps a single request to the provider of the given model with its shared rate limiter."""
+    limiter = get_rate_limiter(get_provider_name(model))
+    if limiter is None:
+        yield
+        return
+
+    with limiter.limit(estimate_tokens(prompt, file_path), stop_event):
+        yield
+
+
+@asynccontextmanager
+async def rate_limited_async(model: str, prompt: str, file_path: str = None):
+    """Async variant of rate_limited for requests sent from an event loop."""
+    limiter = get_rate_limiter(get_provider_name(model))
+    if limiter is None:
+        yield
+        return
+
+    async with limiter.limit_async(estimate_tokens(prompt, file_path)):
+        yield
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Checks if the error is a 429 / RESOURCE_EXHAUSTED response of one of the provider SDKs."""
+    status_code = getattr(error, "status_code", None) or getattr(error, "code", None)
+    response = getattr(error, "response", None)
+    if status_code is None and response is not None:
+        status_code = getattr(response, "status_code", None)
+    if status_code == 429:
+        return True
+    return "RESOURCE_EXHAUSTED" in str(getattr(error, "status", "")) or type(error).__name__ == "ResourceExhausted"
+
+
+def get_retry_after(error: Exception) -> float | None:
+    """Returns the Retry-After header of the error response in seconds, if the provider sent one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
@@ -3,72 +3,266 @@ Module to process text or PDF files using various AI models like Gemini, GPT, or
 It selects prompts dynamically and handles batch processing with optional delay and error handling.
 """
 
-from .gemini import process_file_with_gemini
-from .gpt import process_pdf_with_openai
-from .deepseek import process_text_with_openai
-from .custom_api import process_text_with_custom_api
-from .mock_api import process_test_pipeline
+from .providers import get_provider_registry
+from .rate_limiter import rate_limited, rate_limited_async
+from .retry import call_with_retry, call_with_retry_async, get_circuit_breaker
+from sep.core.utils.get_provider import get_provider_name
+from .response_cache import get_response_cache, is_cacheable, make_cache_key
+from .usage import ModelResponse, with_cost
+from .single_flight import AsyncSingleFlight, SingleFlight
+from .streaming import StreamObserver, STOP_MAX_CHARS, is_streaming_enabled
+from sep.core.services.metrics import CACHE_LOOKUPS, REQUESTS_SHARED, count_usage, track_request
+from typing import Callable
+import asyncio
+import os
+import threading
 import logging
 
 logging.basicConfig(level=logging.INFO)
 
-def run_request(prompt: str, file_path: str, model: str, process_all: bool, pdf_reader: bool, delay: int, temperature: float) -> str:
+# Identical requests in flight, shared between all runs of the process
+_flights = SingleFlight()
+_async_flights = AsyncSingleFlight()
+
+def run_request(prompt: str, file_path: str, model: str, process_all: bool, pdf_reader: bool, delay: int, temperature: float, stop_event: threading.Event = None, use_cache: bool = True, samples: int = 1, stream: bool = None) -> ModelResponse:
     """
-    Runs a request with the given parameters and returns the model output along with the used prompt.
+    Runs a request with the given parameters and returns the model output.
+    With samples > 1, that many outputs are generated (see run_prompt_response).
 
     Returns:
-        str: Raw model output and prompt used.
+        ModelResponse: Raw model output, its token usage and whether it was answered from the response cache.
     """
     if not process_all:
         raise ValueError("The --process_all argument is not supported anymore")
 
 
-    return run_prompt(prompt, file_path, model, pdf_reader, temperature)
+    return run_prompt_response(prompt, file_path, model, pdf_reader, temperature, stop_event, use_cache, samples, stream)
 
 
-def run_prompt(prompt: str, file_path: str, model: str, pdf_reader: bool, temperature: float):
+def run_prompt(prompt: str, file_path: str, model: str, pdf_reader: bool, temperature: float, stop_event: threading.Event = None, use_cache: bool = True, stream: bool = None):
     """
     Processes a file or text input with the selected model and prompt.
+    Identical deterministic requests (up to the max_temperature of the response_cache section) are answered
+    from the response cache unless use_cache is False. If such a request is already in flight, its output is
+    awaited instead of sending the request again. Sampled requests always go to the provider.
+    The request is throttled by the shared rate limiter of the model's provider, transient errors are
+    retried with backoff as long as the circuit breaker of the provider is not open.
+    If the stop_event is set, the request is aborted and RequestCancelled is raised.
+    Outcome, duration, tokens and cost are recorded in the request metrics.
+    With stream (default: enabled in the streaming section of the config.yaml), the output is streamed and
+    parsed while it arrives, the time to the first and the last token is recorded and the stream is stopped
+    once every question is answered or the output gets too long.
 
     Returns:
         str: The output generated by the model.
     """
+    return run_prompt_response(prompt, file_path, model, pdf_reader, temperature, stop_event, use_cache, stream=stream).text
+
+
+def run_prompt_response(prompt: str, file_path: str, model: str, pdf_reader: bool, temperature: float, stop_event: threading.Event = None, use_cache: bool = True, samples: int = 1, stream: bool = None) -> ModelResponse:
+    """
+    Like run_prompt, but also returns the token usage (with its cost) and if the output came from the response cache.
+    Outputs from the response cache or from an identical request in flight have no usage of their own.
+    With samples > 1, that many outputs are generated for self-consistency. Providers with multi-sampling
+    (OpenAI chat completions, Gemini) generate them in one request, so the PDF context is billed once, the
+    other providers are asked once per sample. Samples are never cached or shared, their variance is the point.
+    Streamed outputs also hold their timings; outputs cut off at max_chars are not cached.
+
+    Returns:
+        ModelResponse: The output generated by the model, its usage and whether it was a cache hit.
+    """
+    if samples > 1:
+        return _run_samples(prompt, file_path, model, pdf_reader, temperature, samples, stop_event)
+    if stream is None:
+        stream = is_streaming_enabled()
+
+    reuse = use_cache and is_cacheable(model, temperature)
+    cache = get_response_cache() if reuse else None
+    if cache is not None:
+        key = make_cache_key(model, temperature, prompt, file_path, pdf_reader)
+        output = cache.get(key)
+        _count_lookup(model, output)
+        if output is not None:
+            return ModelResponse(output, cached=True)
+
+    def _attempt():
+        with rate_limited(model, prompt, file_path, stop_event):
+            if stream:
+                return _dispatch_stream(prompt, file_path, model, pdf_reader, temperature, stop_event)
+            return _dispatch_prompt(prompt, file_path, model, pdf_reader, temperature, stop_event)
+
+    def _request():
+        with track_request(model):
+            response = call_with_retry(_attempt, get_circuit_breaker(get_provider_name(model)), stop_event=stop_event)
+        response.usage = with_cost(model, response.usage)
+        count_usage(model, response.usage)
+        if cache is not None and response.text is not None and response.stop_reason != STOP_MAX_CHARS:
+            cache.put(key, response.text, model)
+        return response
+
+    if not reuse:
+        return _request()
+    response, shared = _flights.do(_get_flight_key(prompt, file_path, model, pdf_reader, temperature), _request, stop_event)
+    if shared:
+        REQUESTS_SHARED.inc(provider=get_provider_name(model), model=model)
+        return ModelResponse(response.text)
+    return response
+
+
+async def run_prompt_async(prompt: str, file_path: str, model: str, pdf_reader: bool, temperature: float, use_cache: bool = True) -> str:
+    """
+    Async variant of run_prompt that uses the async clients of the providers.
+    Many requests can be in flight on one event loop, cancelling the awaiting task aborts the request.
+
+    Returns:
+        str: The output generated by the model.
+    """
+    return (await run_prompt_response_async(prompt, file_path, model, pdf_reader, temperature, use_cache)).text
+
+
+async def run_prompt_response_async(prompt: str, file_path: str, model: str, pdf_reader: bool, temperature: float, use_cache: bool = True, samples: int = 1) -> ModelResponse:
+    """
+    Async variant of run_prompt_response. The cache is read and written in worker threads.
+    Providers without multi-sampling are asked for all samples concurrently.
+
+    Returns:
+        ModelResponse: The output generated by the model, its usage and whether it was a cache hit.
+    """
+    if samples > 1:
+        return await _run_samples_async(prompt, file_path, model, pdf_reader, temperature, samples)
+
+    provider_function = _get_provider_function(model, pdf_reader, use_async=True)
+
+    reuse = use_cache and is_cacheable(model, temperature)
+    cache = get_response_cache() if reuse else None
+    if cache is not None:
+        key = await asyncio.to_thread(make_cache_key, model, temperature, prompt, file_path, pdf_reader)
+        output = await asyncio.to_thread(cache.get, key)
+        _count_lookup(model, output)
+        if output is not None:
+            return ModelResponse(output, cached=True)
+
+    async def _attempt():
+        async with rate_limited_async(model, prompt, file_path):
+            return await provider_function(prompt, file_path, model, temperature)
+
+    async def _request():
+        with track_request(model):
+            response = await call_with_retry_async(_attempt, get_circuit_breaker(get_provider_name(model)))
+        response.usage = with_cost(model, response.usage)
+        count_usage(model, response.usage)
+        if cache is not None and response.text is not None:
+            await asyncio.to_thread(cache.put, key, response.text, model)
+        return response
+
+    if not reuse:
+        return await _request()
+    response, shared = await _async_flights.do(_get_flight_key(prompt, file_path, model, pdf_reader, temperature), _request)
+    if shared:
+        REQUESTS_SHARED.inc(provider=get_provider_name(model), model=model)
+        return ModelResponse(response.text)
+    return response
+
+
+def _run_samples(prompt: str, file_path: str, model: str, pdf_reader: bool, temperature: float, samples: int, stop_event: threading.Event = None) -> ModelResponse:
+    """Generates several outputs of the request, in one request if the provider supports it."""
+    if not supports_multi_sampling(model, pdf_reader):
+        responses = [run_prompt_response(prompt, file_path, model, pdf_reader, temperature, stop_event, use_cache=False) for _ in range(samples)]
+        return _merge_samples(responses)
+
+    def _attempt():
+        with rate_limited(model, prompt, file_path, stop_event):
+            return _dispatch_prompt(prompt, file_path, model, pdf_reader, temperature, stop_event, samples)
+
+    with track_request(model):
+        response = call_with_retry(_attempt, get_circuit_breaker(get_provider_name(model)), stop_event=stop_event)
+    response.usage = with_cost(model, response.usage)
+    count_usage(model, response.usage)
+    return response
+
+
+async def _run_samples_async(prompt: str, file_path: str, model: str, pdf_reader: bool, temperature: float, samples: int) -> ModelResponse:
+    """Async variant of _run_samples."""
+    if not supports_multi_sampling(model, pdf_reader):
+        responses = await asyncio.gather(*(
+            run_prompt_response_async(prompt, file_path, model, pdf_reader, temperature, use_cache=False) for _ in range(samples)))
+        return _merge_samples(list(responses))
+
+    provider_function = _get_provider_function(model, pdf_reader, use_async=True)
+
+    async def _attempt():
+        async with rate_limited_async(model, prompt, file_path):
+            return await provider_function(prompt, file_path, model, temperature, samples=samples)
+
+    with track_request(model):
+        response = await call_with_retry_async(_attempt, get_circuit_breaker(get_provider_name(model)))
+    response.usage = with_cost(model, response.usage)
+    count_usage(model, response.usage)
+    return response
+
+
+def _merge_samples(responses: list[ModelResponse]) -> ModelResponse:
+    """Combines the responses of single-sample requests (usage is summed up, each already has its cost)."""
+    usage = responses[0].usage
+    for response in responses[1:]:
+        usage = usage + response.usage
+    return ModelResponse(responses[0].text, usage, samples=[response.text for response in responses])
+
+
+def supports_multi_sampling(model: str, pdf_reader: bool) -> bool:
+    """
+    Checks if the provider function of the model generates several samples in one request
+    (Gemini candidate_count, n of the OpenAI chat completions; DeepSeek and the OpenAI assistant do not support n).
+    """
+    return get_provider_registry().get_functions(model, pdf_reader).supports_multi_sampling()
+
+
+def _count_lookup(model: str, output: str | None):
+    CACHE_LOOKUPS.inc(provider=get_provider_name(model), model=model, result="miss" if output is None else "hit")
 
-    if model.lower().startswith('gemini'):
-        if pdf_reader:
-            # Gemini does not support PDF reader mode
-            raise ValueError("A request to gemini is not possible with a PDF reader. Do not use --pdf_reader in the arguments.")
-        else:
-            last_output = process_file_with_gemini(prompt, file_path, model, temperature)
-
-    elif model.lower().startswith('gpt') or model.lower().startswith('deepseek-chat'):
-        if pdf_reader:
-            # Process text input with GPT
-            last_output = process_text_with_openai(prompt, file_path, model, temperature)
-        else:
-            # Process PDF input with GPT
-            last_output = process_pdf_with_openai(prompt, file_path, model, temperature)
-
-    elif model.lower().startswith('o1'):
-        if pdf_reader:
-            # Process text input with OpenAI
-            last_output = process_text_with_openai(prompt, file_path, model, temperature)
-        else:
-            # O1 models require PDF reader mode
-            raise ValueError("A request to an o1 model is not possible without a PDF reader. Use --pdf_reader in the arguments.")
-
-    elif model.lower().startswith('deepseek'):
-        if pdf_reader:
-            # Process text input with Ollama
-            last_output = process_text_with_custom_api(prompt, file_path, model, temperature)
-        else:
-            # Ollama models require PDF reader mode
-            raise ValueError("A request to an ollama model is not possible without a PDF reader. Use --pdf_reader in the arguments.")
-        
-    elif model.lower().startswith('test'):
-        last_output = process_test_pipeline(prompt, file_path, model, temperature)
-    else:
-        raise ValueError(f"Unsupported model: {model}")
-
-
-    return last_output
+
+def _get_flight_key(prompt: str, file_path: str, model: str, pdf_reader: bool, temperature: float) -> tuple:
+    """Identifies a request in flight (unlike the cache key, without hashing the PDF)."""
+    return (model, temperature, pdf_reader, prompt, os.path.abspath(file_path) if file_path else file_path)
+
+
+def _dispatch_prompt(prompt: str, file_path: str, model: str, pdf_reader: bool, temperature: float, stop_event: threading.Event = None, samples: int = 1):
+    """
+    Sends the prompt to the provider function that matches the model.
+    More than one sample may only be requested from providers with multi-sampling.
+
+    Returns:
+        ModelResponse: The output generated by the model and its token usage.
+    """
+    provider_function = _get_provider_function(model, pdf_reader)
+    if samples > 1:
+        return provider_function(prompt, file_path, model, temperature, stop_event, samples=samples)
+    return provider_function(prompt, file_path, model, temperature, stop_event)
+
+
+def _dispatch_stream(prompt: str, file_path: str, model: str, pdf_reader: bool, temperature: float, stop_event: threading.Event = None) -> ModelResponse:
+    """
+    Streams the output of the provider function that matches the model through a StreamObserver.
+
+    Returns:
+        ModelResponse: The output, its token usage and the timings of the stream.
+    """
+    stream_function = get_provider_registry().get_functions(model, pdf_reader).get_stream()
+    observer = StreamObserver()
+    response = stream_function(prompt, file_path, model, temperature, observer.on_text, stop_event)
+    return observer.finish(response, model)
+
+
+def _get_provider_function(model: str, pdf_reader: bool, use_async: bool = False) -> Callable:
+    """
+    Selects the provider function that matches the model and the input mode (see providers.py).
+    With use_async, the coroutine function of the provider is returned.
+
+    Returns:
+        Callable: The provider function, called with (prompt, file_path, model, temperature).
+
+    Raises:
+        ValueError: If the model is not supported or does not support the input mode.
+    """
+    functions = get_provider_registry().get_functions(model, pdf_reader)
+    return functions.get_process_async() if use_async else functions.get_process()
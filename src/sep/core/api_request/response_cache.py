@@ -0,0 +1,179 @@
+"""
+Content-addressed, on-disk cache of model outputs.
+
+A request is identified by a hash of its provider, model, temperature, input mode, prompt and the
+bytes of the PDF. Identical requests (e.g. repeated re-evaluations at temperature 0) are answered from
+the cache instead of the provider. Only deterministic requests are cached by default: requests above the
+max_temperature of the response_cache section are sampled, repeating them must return new outputs.
+Entries expire after a TTL and the least recently used entries are evicted when the cache grows above
+its size limit. The index of the entries is loaded once per process, an entry that is missing from it is
+looked up in the folder, so entries written by other processes are found as well.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from sep.env_manager import RESPONSE_CACHE, RESPONSE_CACHE_FOLDER
+from sep.core.services.paper_cache import get_paper_hash
+from sep.core.utils.get_provider import get_provider_name
+from sep.logger import setup_logger
+
+log = setup_logger(__name__)
+
+# Used when the response_cache section of the config.yaml has no entry
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_SIZE_MB = 500
+DEFAULT_MAX_TEMPERATURE = 0.0
+
+# The test models simulate the providers (slow responses, exceptions), so they are never answered from the cache
+UNCACHED_PROVIDERS = {"test"}
+
+
+def is_cacheable(model: str, temperature: float) -> bool:
+    """Checks if the outputs of the model may be cached at the temperature (max_temperature null caches every temperature)."""
+    if get_provider_name(model) in UNCACHED_PROVIDERS:
+        return False
+    max_temperature = RESPONSE_CACHE.get("max_temperature", DEFAULT_MAX_TEMPERATURE)
+    return max_temperature is None or temperature <= max_temperature
+
+
+def make_cache_key(model: str, temperature: float, prompt: str, file_path: str, pdf_reader: bool) -> str:
+    """Returns the SHA-256 hash that identifies the request."""
+    digest = hashlib.sha256()
+    header = {
+        "provider": get_provider_name(model),
+        "model": model,
+        "temperature": temperature,
+        "pdf_reader": pdf_reader,
+        "prompt": prompt,
+    }
+    digest.update(json.dumps(header, sort_keys=True).encode("utf-8"))
+    if file_path is not None and os.path.isfile(file_path):
+        # the PDF is hashed once per file, also when several models are asked about it
+        digest.update(get_paper_hash(file_path).encode("ascii"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Stores one JSON file per request in the cache folder, sharded by the first two characters of the key."""
+
+    def __init__(self, folder: str, ttl: float | None = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_SIZE_MB * 1024 * 1024, clock=time.time):
+        self.folder = folder
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (size in bytes, last use), loaded from the folder on first use
+        self._index: dict[str, tuple[int, float]] | None = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        """Builds the index from the files in the cache folder (caller must hold the lock)."""
+        if self._index is not None:
+            return
+        self._index = {}
+        if not os.path.isdir(self.folder):
+            return
+        for shard in os.listdir(self.folder):
+            shard_path = os.path.join(self.folder, shard)
+            if not os.path.isdir(shard_path):
+                continue
+            for file in os.listdir(shard_path):
+                if file.endswith(".json"):
+                    stat = os.stat(os.path.join(shard_path, file))
+                    self._index[file[:-len(".json")]] = (stat.st_size, stat.st_mtime)
+
+    def get(self, key: str) -> str | None:
+        """Returns the cached output of the request or None if it is not cached or expired."""
+        with self._lock:
+            self._load_index()
+            path = self._path(key)
+            if key not in self._index:
+                # other processes (e.g. the workers of the job queue) write into the same folder
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    return None
+                self._index[key] = (stat.st_size, stat.st_mtime)
+
+            try:
+                with open(path, "r") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._remove(key)
+                return None
+
+            now = self._clock()
+            if self.ttl is not None and now - entry["created_at"] > self.ttl:
+                self._remove(key)
+                return None
+
+            # the modification time is the last use of the entry
+            os.utime(path, (now, now))
+            self._index[key] = (self._index[key][0], now)
+            return entry["output"]
+
+    def put(self, key: str, output: str, model: str = None):
+        """Stores the output of the request and evicts the least recently used entries above the size limit."""
+        now = self._clock()
+        data = json.dumps({"key": key, "model": model, "created_at": now, "output": output}).encode("utf-8")
+        path = self._path(key)
+
+        with self._lock:
+            self._load_index()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write to a temporary file first, so readers never see a partial entry
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            os.utime(path, (now, now))
+            self._index[key] = (len(data), now)
+            self._evict()
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache fits into its size limit (caller must hold the lock)."""
+        total = sum(size for size, _ in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+
+    def _remove(self, key: str):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def size(self) -> int:
+        """Returns the total size of all entries in bytes."""
+        with self._lock:
+            self._load_index()
+            return sum(size for size, _ in self._index.values())
+
+
+_cache: ResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache | None:
+    """Returns the shared response cache, or None if it is disabled in the config.yaml."""
+    global _cache
+    if not RESPONSE_CACHE.get("enabled", False) or RESPONSE_CACHE_FOLDER is None:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                RESPONSE_CACHE_FOLDER,
+                ttl=RESPONSE_CACHE.get("ttl", DEFAULT_TTL),
+                max_bytes=int(RESPONSE_CACHE.get("max_size_mb", DEFAULT_MAX_SIZE_MB) * 1024 * 1024),
+            )
+        return _cache
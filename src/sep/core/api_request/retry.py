@@ -0,0 +1,248 @@
+"""
+Retries of transient provider errors and a circuit breaker per provider.
+
+Timeouts, connection errors, 5xx and 429 responses are retried with jittered exponential backoff
+until the attempt budget is used up. Every provider has a circuit breaker: after repeated transient
+failures the provider is paused for a while instead of burning requests, then a single trial request
+decides whether it is healthy again. Rate limit errors (429) are retried but do not count as breaker
+failures, the provider is healthy and the rate limiter already backs off.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+from sep.env_manager import RETRY
+from sep.core.api_request.cancellation import RequestCancelled, raise_if_cancelled
+from sep.core.api_request.rate_limiter import get_retry_after, is_rate_limit_error
+from sep.core.services.metrics import CIRCUIT_BREAKER_OPENED, REQUEST_RETRIES
+from sep.logger import setup_logger
+
+log = setup_logger(__name__)
+
+# Used when the retry section of the config.yaml has no entry
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BASE_DELAY = 2.0
+DEFAULT_MAX_DELAY = 60.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 60.0
+
+# Seconds between two checks while a request waits for a trial slot of a half-open breaker
+HALF_OPEN_POLL_INTERVAL = 1.0
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Transient error classes of openai, google-genai, requests and httpx (matched by name, so no SDK import is needed)
+RETRYABLE_ERROR_NAMES = {
+    "APIConnectionError", "APITimeoutError", "InternalServerError", "RateLimitError", "ServerError",
+    "ConnectionError", "Timeout", "ConnectTimeout", "ReadTimeout", "TimeoutException", "NetworkError",
+    "RemoteProtocolError", "ChunkedEncodingError",
+}
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Checks if the error is transient (timeout, connection problem, 5xx or 429 response)."""
+    if isinstance(error, RequestCancelled):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+
+    status_code = getattr(error, "status_code", None) or getattr(error, "code", None)
+    response = getattr(error, "response", None)
+    if status_code is None and response is not None:
+        status_code = getattr(response, "status_code", None)
+    return status_code in RETRYABLE_STATUS_CODES
+
+
+@dataclass
+class RetryPolicy:
+    """Number of attempts and backoff of the retries."""
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    base_delay: float = DEFAULT_BASE_DELAY
+    max_delay: float = DEFAULT_MAX_DELAY
+
+    @classmethod
+    def from_config(cls) -> "RetryPolicy":
+        """Creates the policy from the retry section of the config.yaml."""
+        return cls(
+            max_attempts=RETRY.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+            base_delay=RETRY.get("base_delay", DEFAULT_BASE_DELAY),
+            max_delay=RETRY.get("max_delay", DEFAULT_MAX_DELAY),
+        )
+
+    def get_delay(self, attempt: int, retry_after: float = None) -> float:
+        """Returns the pause before the next attempt: exponential backoff with full jitter, at least the Retry-After of the provider."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        return max(delay, retry_after or 0.0)
+
+
+class CircuitBreaker:
+    """Pauses a provider after repeated transient failures."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD, reset_timeout: float = DEFAULT_RESET_TIMEOUT, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def _try_enter(self) -> float:
+        """Lets the request pass (returns 0) or returns the seconds to wait before asking again."""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.reset_timeout - self._clock()
+                if remaining > 0:
+                    return remaining
+                self.state = self.HALF_OPEN
+                log.info(f"Circuit breaker of provider '{self.name}' is half open, sending a trial request.")
+
+            if self.state == self.HALF_OPEN:
+                if self._trial_running:
+                    return HALF_OPEN_POLL_INTERVAL
+                self._trial_running = True
+            return 0.0
+
+    def acquire(self, stop_event: threading.Event = None):
+        """
+        Blocks while the provider is paused.
+        Raises RequestCancelled if the stop_event is set while waiting.
+        """
+        while True:
+            raise_if_cancelled(stop_event)
+            wait = self._try_enter()
+            if wait <= 0:
+                return
+            if stop_event is not None:
+                stop_event.wait(min(wait, 1.0))
+            else:
+                time.sleep(min(wait, 1.0))
+
+    async def acquire_async(self):
+        """Waits without blocking the event loop while the provider is paused."""
+        while True:
+            wait = self._try_enter()
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def record_success(self):
+        """Closes the breaker after a successful request."""
+        with self._lock:
+            if self.state != self.CLOSED:
+                log.info(f"Provider '{self.name}' recovered, closing the circuit breaker.")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        """Counts a transient failure, opens the breaker when the threshold is reached or the trial request failed."""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+                CIRCUIT_BREAKER_OPENED.inc(provider=self.name)
+                log.warning(f"Provider '{self.name}' failed {self.failures} times in a row. Pausing it for {self.reset_timeout} seconds.")
+            self._trial_running = False
+
+    def release(self):
+        """Ends a request whose outcome says nothing about the health of the provider (e.g. cancelled or invalid)."""
+        with self._lock:
+            self._trial_running = False
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """Returns the shared circuit breaker of the provider, configured by the retry section of the config.yaml."""
+    with _breakers_lock:
+        if provider not in _breakers:
+            settings = RETRY.get("circuit_breaker") or {}
+            _breakers[provider] = CircuitBreaker(
+                provider,
+                failure_threshold=settings.get("failure_threshold", DEFAULT_FAILURE_THRESHOLD),
+                reset_timeout=settings.get("reset_timeout", DEFAULT_RESET_TIMEOUT),
+            )
+        return _breakers[provider]
+
+
+def _record_retryable_failure(breaker: CircuitBreaker, error: Exception):
+    """Counts a transient failure at the breaker, rate limit errors are left to the backoff of the rate limiter."""
+    if is_rate_limit_error(error):
+        breaker.release()
+    else:
+        breaker.record_failure()
+
+
+def call_with_retry(fn: Callable[[], Any], breaker: CircuitBreaker, policy: RetryPolicy = None, stop_event: threading.Event = None):
+    """
+    Calls fn until it succeeds, retrying transient errors with backoff while the breaker lets requests pass.
+
+    Raises:
+        Exception: The last error if it is not retryable or the attempts are used up.
+        RequestCancelled: If the stop_event is set while waiting.
+    """
+    policy = policy or RetryPolicy.from_config()
+    for attempt in range(1, policy.max_attempts + 1):
+        breaker.acquire(stop_event)
+        try:
+            result = fn()
+        except Exception as e:
+            if not is_retryable_error(e):
+                breaker.release()
+                raise
+            _record_retryable_failure(breaker, e)
+            if attempt == policy.max_attempts:
+                raise
+
+            delay = policy.get_delay(attempt, get_retry_after(e))
+            REQUEST_RETRIES.inc(provider=breaker.name)
+            log.warning(f"Attempt {attempt} of {policy.max_attempts} at provider '{breaker.name}' failed ({type(e).__name__}: {e}). Retrying in {delay:.1f} seconds.")
+            if stop_event is not None:
+                stop_event.wait(delay)
+            else:
+                time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+
+
+async def call_with_retry_async(fn: Callable[[], Awaitable], breaker: CircuitBreaker, policy: RetryPolicy = None):
+    """Async variant of call_with_retry, fn returns a new awaitable per attempt."""
+    policy = policy or RetryPolicy.from_config()
+    for attempt in range(1, policy.max_attempts + 1):
+        await breaker.acquire_async()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            if not is_retryable_error(e):
+                breaker.release()
+                raise
+            _record_retryable_failure(breaker, e)
+            if attempt == policy.max_attempts:
+                raise
+
+            delay = policy.get_delay(attempt, get_retry_after(e))
+            REQUEST_RETRIES.inc(provider=breaker.name)
+            log.warning(f"Attempt {attempt} of {policy.max_attempts} at provider '{breaker.name}' failed ({type(e).__name__}: {e}). Retrying in {delay:.1f} seconds.")
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
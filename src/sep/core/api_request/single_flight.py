@@ -0,0 +1,130 @@
+"""
+Single-flight deduplication of concurrent identical requests.
+
+If the same request (paper, prompt, model, temperature) is started while an identical one is still
+in flight, e.g. by parallel runs or prompt designer iterations, the second caller does not send its
+own request. It waits for the one in flight and receives the same output or error.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+from sep.core.api_request.cancellation import CHECK_INTERVAL, RequestCancelled, raise_if_cancelled
+
+
+class _Call:
+    """A request in flight and its outcome."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+        # set if the caller that sent the request was cancelled, the waiting callers have to send it again
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Shares the result of a blocking call between all threads that request the same key at the same time."""
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any], stop_event: threading.Event = None) -> tuple[Any, bool]:
+        """
+        Calls fn, unless a call with the same key is in flight. Then its result is awaited instead.
+        If the caller that sent the request is cancelled, one of the waiting callers sends it again.
+
+        Returns:
+            tuple[Any, bool]: The result of fn and whether it was shared from another caller.
+
+        Raises:
+            Exception: The error of fn, also for the callers that waited for it.
+            RequestCancelled: If the stop_event is set while waiting.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+
+            if leader:
+                try:
+                    call.result = fn()
+                    return call.result, False
+                except RequestCancelled as e:
+                    call.abandoned = True
+                    call.error = e
+                    raise
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        self._calls.pop(key, None)
+                    call.done.set()
+
+            while not call.done.wait(CHECK_INTERVAL):
+                raise_if_cancelled(stop_event)
+            if call.abandoned:
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+    def in_flight(self) -> int:
+        """Returns the number of distinct calls in flight."""
+        with self._lock:
+            return len(self._calls)
+
+
+class _AsyncCall:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """
+    Async variant of SingleFlight. The request runs in its own task that is awaited by all callers,
+    so cancelling one of them does not abort it for the others. It is cancelled when no caller is left.
+    """
+
+    def __init__(self):
+        # (event loop, key) -> call, the tasks are bound to the loop they were created on
+        self._calls: dict[tuple[int, Hashable], _AsyncCall] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]) -> tuple[Any, bool]:
+        """
+        Awaits fn(), unless a call with the same key is in flight. Then its result is awaited instead.
+
+        Returns:
+            tuple[Any, bool]: The result of fn and whether it was shared from another caller.
+        """
+        flight_key = (id(asyncio.get_running_loop()), key)
+        call = self._calls.get(flight_key)
+        shared = call is not None
+        if call is None:
+            call = _AsyncCall(asyncio.ensure_future(fn()))
+            self._calls[flight_key] = call
+            call.task.add_done_callback(lambda _: self._forget(flight_key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            # only this caller was cancelled, the request goes on as long as others wait for it
+            if call.waiters == 1:
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, flight_key: tuple[int, Hashable], call: _AsyncCall):
+        if self._calls.get(flight_key) is call:
+            del self._calls[flight_key]
+
+    def in_flight(self) -> int:
+        """Returns the number of distinct calls in flight."""
+        return len(self._calls)
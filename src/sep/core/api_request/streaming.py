@@ -0,0 +1,134 @@
+"""
+Streaming generation with incremental parsing of the answers.
+
+The stream functions of the providers pass every chunk of the output to an on_text callback while it is
+generated and stop reading the stream when the callback returns False. The StreamObserver parses the
+completed lines with the IncrementalCsvParser, measures the time to the first and the last token and stops
+the stream once every expected question is answered or the output gets longer than max_chars (runaway
+outputs). Settings come from the streaming section of the config.yaml.
+"""
+
+import threading
+import time
+from typing import Callable
+from sep.env_manager import STREAMING
+from sep.core.api_request.cancellation import raise_if_cancelled
+from sep.core.api_request.usage import ModelResponse, Usage
+from sep.core.evaluation.parse_csv_answers import IncrementalCsvParser
+from sep.core.services.metrics import STREAMS_STOPPED, TIME_TO_FIRST_TOKEN, TIME_TO_LAST_TOKEN
+from sep.core.utils.get_provider import get_provider_name
+
+# Used when the streaming section of the config.yaml has no entry
+DEFAULT_STOP_WHEN_COMPLETE = True
+DEFAULT_MAX_CHARS = 20000
+
+# Reasons why a stream was stopped before the model finished
+STOP_COMPLETE = "complete"
+STOP_MAX_CHARS = "max_chars"
+
+
+def is_streaming_enabled() -> bool:
+    """Checks if run_prompt streams the outputs by default."""
+    return bool(STREAMING.get("enabled", False))
+
+
+class StreamObserver:
+    """Receives the chunks of one streamed output (pass observer.on_text to the stream function)."""
+
+    def __init__(self, stop_when_complete: bool = None, max_chars: int = None, expected: list[str] = None, clock=time.monotonic):
+        self.stop_when_complete = STREAMING.get("stop_when_complete", DEFAULT_STOP_WHEN_COMPLETE) if stop_when_complete is None else stop_when_complete
+        self.max_chars = STREAMING.get("max_chars", DEFAULT_MAX_CHARS) if max_chars is None else max_chars
+        self.parser = IncrementalCsvParser(expected)
+        self.chars = 0
+        self.stop_reason = None
+        self._clock = clock
+        self._start = clock()
+        self.ttft = None
+        self.ttlt = None
+
+    def on_text(self, text: str) -> bool:
+        """
+        Handles the next chunk of the output.
+
+        Returns:
+            bool: False if the stream should be stopped.
+        """
+        if not text:
+            return True
+        now = self._clock()
+        if self.ttft is None:
+            self.ttft = now - self._start
+        self.ttlt = now - self._start
+        self.chars += len(text)
+        self.parser.feed(text)
+
+        if self.stop_when_complete and self.parser.is_complete():
+            self.stop_reason = STOP_COMPLETE
+        elif self.max_chars and self.chars >= self.max_chars:
+            self.stop_reason = STOP_MAX_CHARS
+        return self.stop_reason is None
+
+    def finish(self, response: ModelResponse, model: str) -> ModelResponse:
+        """Parses the rest of the output, adds the timings to the response and records them in the metrics."""
+        self.parser.close()
+        response.ttft = self.ttft
+        response.ttlt = self.ttlt
+        response.stop_reason = self.stop_reason
+
+        provider = get_provider_name(model)
+        if self.ttft is not None:
+            TIME_TO_FIRST_TOKEN.observe(self.ttft, provider=provider, model=model)
+            TIME_TO_LAST_TOKEN.observe(self.ttlt, provider=provider, model=model)
+        if self.stop_reason is not None:
+            STREAMS_STOPPED.inc(provider=provider, model=model, reason=self.stop_reason)
+        return response
+
+
+def stream_whole_response(provider_function: Callable) -> Callable:
+    """Wraps a provider function without streaming, its whole output is passed to on_text at once."""
+    def _stream(prompt: str, filename: str, model: str, temperature: float, on_text: Callable[[str], bool], stop_event: threading.Event = None) -> ModelResponse:
+        response = provider_function(prompt, filename, model, temperature, stop_event)
+        on_text(response.text or "")
+        return response
+    return _stream
+
+
+def read_to_end(text: str) -> bool:
+    """on_text callback of the requests that are streamed only to be abortable, it reads the whole output."""
+    return True
+
+
+def consume_chat_stream(stream, on_text: Callable[[str], bool], stop_event: threading.Event = None, samples: int = 1) -> ModelResponse:
+    """
+    Reads a streamed OpenAI compatible chat completion (requested with include_usage).
+    A stream that is stopped early is closed, so the provider stops generating; it has no usage then.
+    With samples > 1 (requested with n), the choices are collected by their index, on_text receives the first one.
+    """
+    parts: dict[int, list[str]] = {index: [] for index in range(samples)}
+    usage = None
+    try:
+        for chunk in stream:
+            raise_if_cancelled(stop_event)
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if not _add_choices(chunk, parts, on_text):
+                break
+    finally:
+        stream.close()
+    texts = ["".join(parts[index]) for index in sorted(parts)]
+    if samples <= 1:
+        return ModelResponse(texts[0], Usage.from_openai(usage))
+    return ModelResponse(texts[0], Usage.from_openai(usage), samples=texts)
+
+
+def _add_choices(chunk, parts: dict[int, list[str]], on_text: Callable[[str], bool]) -> bool:
+    """Adds the text of the choices of the chunk, returns False if on_text stops the stream."""
+    for choice in chunk.choices or []:
+        text = choice.delta.content
+        if not text:
+            continue
+        index = getattr(choice, "index", 0) or 0
+        parts.setdefault(index, []).append(text)
+        if index == 0 and not on_text(text):
+            return False
+    return True
@@ -0,0 +1,112 @@
+"""
+Token usage and cost of the provider requests.
+
+The provider modules return the output of a request together with the tokens the provider reports
+(prompt, completion and cached prompt tokens). The cost is calculated from the price table in the
+prices section of the config.yaml, saved with the raw output of every paper and summed up per run.
+"""
+
+from dataclasses import asdict, dataclass, field
+from sep.env_manager import PRICES
+
+# Prices in the config.yaml are given per million tokens
+TOKENS_PER_PRICE_UNIT = 1_000_000
+
+
+@dataclass
+class Usage:
+    """Tokens used by one or more requests and their cost in USD."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # part of the prompt tokens that was served from the provider's prompt cache (billed at a lower price)
+    cached_tokens: int = 0
+    cost: float = 0.0
+
+    def __add__(self, other: "Usage") -> "Usage":
+        return Usage(
+            prompt_tokens=self.prompt_tokens + other.prompt_tokens,
+            completion_tokens=self.completion_tokens + other.completion_tokens,
+            cached_tokens=self.cached_tokens + other.cached_tokens,
+            cost=self.cost + other.cost,
+        )
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict | None) -> "Usage":
+        """Creates the usage from a saved dict, unknown keys are ignored."""
+        data = data or {}
+        return cls(**{key: data[key] for key in ("prompt_tokens", "completion_tokens", "cached_tokens", "cost") if data.get(key) is not None})
+
+    @classmethod
+    def from_openai(cls, usage) -> "Usage":
+        """Reads the usage of an OpenAI compatible response (chat completions, assistant runs, batch lines)."""
+        if usage is None:
+            return cls()
+        if isinstance(usage, dict):
+            details = usage.get("prompt_tokens_details") or {}
+            return cls(usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0, details.get("cached_tokens") or 0)
+        details = getattr(usage, "prompt_tokens_details", None)
+        return cls(
+            prompt_tokens=usage.prompt_tokens or 0,
+            completion_tokens=usage.completion_tokens or 0,
+            cached_tokens=(getattr(details, "cached_tokens", None) or 0) if details is not None else 0,
+        )
+
+    @classmethod
+    def from_gemini(cls, usage_metadata) -> "Usage":
+        """Reads the usage metadata of a Gemini response, thinking tokens are billed as completion tokens."""
+        if usage_metadata is None:
+            return cls()
+        return cls(
+            prompt_tokens=usage_metadata.prompt_token_count or 0,
+            completion_tokens=(usage_metadata.candidates_token_count or 0) + (usage_metadata.thoughts_token_count or 0),
+            cached_tokens=usage_metadata.cached_content_token_count or 0,
+        )
+
+
+@dataclass
+class ModelResponse:
+    """
+    The output of a request, the tokens it used and whether it was answered from the response cache.
+    Requests for several samples hold all outputs in samples (text is the first of them).
+    Streamed requests hold the seconds to the first and the last output chunk and why the stream was
+    stopped early (None if the model finished the output).
+    """
+    text: str
+    usage: Usage = field(default_factory=Usage)
+    cached: bool = False
+    samples: list[str] = field(default_factory=list)
+    ttft: float | None = None
+    ttlt: float | None = None
+    stop_reason: str | None = None
+
+
+def get_price(model: str) -> dict | None:
+    """
+    Returns the prices of the model (input, cached_input and output per million tokens).
+    Models are matched by the longest entry of the price table they start with, so gpt-4o covers gpt-4o-2024-08-06.
+    """
+    matches = [name for name in PRICES if model.startswith(name)]
+    if not matches:
+        return None
+    return PRICES[max(matches, key=len)]
+
+
+def with_cost(model: str, usage: Usage, factor: float = 1.0) -> Usage:
+    """
+    Returns the usage with its cost calculated from the price table (multiplied by factor, e.g. the batch discount).
+    Models without a price keep a cost of 0.
+    """
+    price = get_price(model)
+    if price is None:
+        return usage
+
+    uncached = max(usage.prompt_tokens - usage.cached_tokens, 0)
+    cost = (
+        uncached * price.get("input", 0)
+        + usage.cached_tokens * price.get("cached_input", price.get("input", 0))
+        + usage.completion_tokens * price.get("output", 0)
+    ) / TOKENS_PER_PRICE_UNIT
+    return Usage(usage.prompt_tokens, usage.completion_tokens, usage.cached_tokens, cost * factor)
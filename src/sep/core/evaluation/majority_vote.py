@@ -0,0 +1,59 @@
+"""
+Majority vote over several outputs of the same request (self-consistency sampling).
+
+Every output is parsed like a saved raw answer, the most frequent answer per question wins. The vote is
+saved with the outputs and, formatted as a CSV answer, as the raw data of the paper, so the evaluation
+scripts score the voted answer without any changes.
+"""
+
+import csv
+import io
+from collections import Counter
+from sep.core.evaluation.parse_csv_answers import parse_csv_string_to_json
+
+# Answer of parse_csv_string_to_json for outputs that could not be parsed
+ERROR_ANSWER = "error"
+
+
+def majority_vote(outputs: list[str]) -> list[dict]:
+    """
+    Returns the most frequent answer per question of the outputs.
+    Outputs that could not be parsed do not vote, ties go to the answer that appeared first.
+
+    Returns:
+        list[dict]: number, answer, quote (of the first output with the winning answer) and
+        agreement (share of the voting outputs that gave the winning answer) per question.
+    """
+    parsed = [parse_csv_string_to_json(output) for output in outputs if output]
+    parsed = [answers for answers in parsed if not all(answer["answer"] == ERROR_ANSWER for answer in answers)]
+
+    votes: dict[str, Counter] = {}
+    # question -> normalized answer -> first (answer, quote) with that answer
+    first_seen: dict[str, dict[str, dict]] = {}
+    for answers in parsed:
+        for answer in answers:
+            normalized = answer["answer"].strip().lower()
+            votes.setdefault(answer["number"], Counter())[normalized] += 1
+            first_seen.setdefault(answer["number"], {}).setdefault(normalized, answer)
+
+    result = []
+    for number, counter in votes.items():
+        # Counter.most_common keeps the insertion order for equal counts
+        winner, count = counter.most_common(1)[0]
+        answer = first_seen[number][winner]
+        result.append({
+            "number": number,
+            "answer": answer["answer"],
+            "quote": answer["quote"],
+            "agreement": count / len(parsed),
+        })
+    return result
+
+
+def format_vote(vote: list[dict]) -> str:
+    """Formats the vote like a raw answer of the models (number;answer;quote per line)."""
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=";", quotechar='"', lineterminator="\n")
+    for answer in vote:
+        writer.writerow([answer["number"], answer["answer"], answer["quote"]])
+    return output.getvalue()
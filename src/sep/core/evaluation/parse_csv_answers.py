@@ -54,40 +54,26 @@ def create_list(data):
         })
     return result_list
 
+# Question numbers of the prompts, other numbers in an answer are ignored
+VALID_QUESTION_NUMBERS = ['1', '2', '3', '4', '5', '6', '7a', '7b', '7c', '8', '9', '10', '11', '12']
+
+DELIMITER = ";"
+QUESTION_NUMBER_PATTERN = re.compile(r'(\d+[a-zA-Z]?)(\.)?')
+
 def parse_csv_string_to_json(csv_string, combine_7abc=False):
     """This function gets a csv string and parses it to a well-formatted json."""
     try:
-        valid_question_numbers = ['1', '2', '3', '4', '5', '6', '7a', '7b', '7c', '8', '9', '10', '11', '12']
         combine_questions = ['7a', '7b', '7c']  # Fragen, die zusammengefasst werden können
-        prompts = {num: {'number': num, 'answer': 'not-existent', 'quote': 'not-existent'} for num in valid_question_numbers}
+        prompts = {num: {'number': num, 'answer': 'not-existent', 'quote': 'not-existent'} for num in VALID_QUESTION_NUMBERS}
 
-        delimiter = ";"
         csvfile = io.StringIO(csv_string)
         
-        csvreader = csv.reader(csvfile, delimiter=delimiter, quotechar='"')
-
-        question_number_pattern = re.compile(r'(\d+[a-zA-Z]?)(\.)?')
+        csvreader = csv.reader(csvfile, delimiter=DELIMITER, quotechar='"')
 
         for row in csvreader:
-            if len(row) >= 3:
-                raw_number = row[0].strip()
-                answer = row[1].strip()
-                quote = ';'.join(row[2:]).strip() if delimiter == ';' else row[2].strip()
-
-                match = question_number_pattern.match(raw_number)
-                if match:
-                    number = match.group(1)
-
-                    if number in valid_question_numbers:
-                        prompts[number] = {
-                            'number': number,
-                            'answer': answer,
-                            'quote': quote
-                        }
-            else:
-                if len(row) == 0 or all(not cell.strip() for cell in row):
-                    continue
-                logging.warning(f"Line has a wrong format and will be ignored: {row}")
+            answer = _parse_row(row)
+            if answer is not None:
+                prompts[answer['number']] = answer
 
         if combine_7abc:
             quotes = [prompts[q]['quote'].lower() for q in combine_questions]
@@ -116,3 +102,77 @@ def parse_csv_string_to_json(csv_string, combine_7abc=False):
         prompts = {str(i + 1): {'number': str(i + 1), 'answer': 'error', 'quote': 'error'} for i in range(3)}
         
     return list(prompts.values())
+
+
+def _parse_row(row):
+    """Parses one CSV row (number;answer;quote) into an answer, returns None for rows without a valid question."""
+    if len(row) >= 3:
+        raw_number = row[0].strip()
+        answer = row[1].strip()
+        quote = ';'.join(row[2:]).strip() if DELIMITER == ';' else row[2].strip()
+
+        match = QUESTION_NUMBER_PATTERN.match(raw_number)
+        if match:
+            number = match.group(1)
+
+            if number in VALID_QUESTION_NUMBERS:
+                return {
+                    'number': number,
+                    'answer': answer,
+                    'quote': quote
+                }
+    else:
+        if len(row) == 0 or all(not cell.strip() for cell in row):
+            return None
+        logging.warning(f"Line has a wrong format and will be ignored: {row}")
+    return None
+
+
+class IncrementalCsvParser:
+    """
+    Parses a CSV answer while it is generated. Text is fed in chunks, every completed line is parsed like
+    in parse_csv_string_to_json (a line break inside a quoted quote does not complete the line).
+    """
+
+    def __init__(self, expected=None):
+        self.expected = set(VALID_QUESTION_NUMBERS if expected is None else expected)
+        # question number -> latest answer
+        self.answers = {}
+        self._pending = ""
+        self._search_from = 0
+
+    def feed(self, text):
+        """Adds the next chunk of the output and returns the answers of the lines it completed."""
+        self._pending += text
+        parsed = []
+        while True:
+            end = self._pending.find("\n", self._search_from)
+            if end == -1:
+                break
+            line = self._pending[:end]
+            if line.count('"') % 2 == 1:
+                # the line break is part of a quoted field, the line continues
+                self._search_from = end + 1
+                continue
+            self._pending = self._pending[end + 1:]
+            self._search_from = 0
+            parsed.extend(self._parse_line(line))
+        return parsed
+
+    def close(self):
+        """Parses the last line of the output (it may have no line break) and returns its answers."""
+        line, self._pending, self._search_from = self._pending, "", 0
+        return self._parse_line(line) if line.strip() else []
+
+    def is_complete(self):
+        """Checks if every expected question was answered."""
+        return self.expected.issubset(self.answers)
+
+    def _parse_line(self, line):
+        parsed = []
+        for row in csv.reader(io.StringIO(line), delimiter=DELIMITER, quotechar='"'):
+            answer = _parse_row(row)
+            if answer is not None:
+                self.answers[answer['number']] = answer
+                parsed.append(answer)
+        return parsed
@@ -14,9 +14,12 @@ logging.basicConfig(level=logging.INFO)
 
 version_number = 2.0
 
-def save_raw_data_as_json(raw_data, pdf_name, model_name, temp: float, pdf_reader, pdf_reader_version, process_mode, prompt, save_folder):
+def save_raw_data_as_json(raw_data, pdf_name, model_name, temp: float, pdf_reader, pdf_reader_version, process_mode, prompt, save_folder, cached=False, usage: dict = None, samples: list = None, majority_vote: list = None):
     """
     Saves raw output data along with metadata into a JSON file.
+    Cached marks outputs that were answered from the response cache instead of the provider.
+    Usage holds the tokens and the cost of the request (prompt_tokens, completion_tokens, cached_tokens, cost).
+    For self-consistency sampling, all outputs are saved as Samples and the vote per question as Majority_Vote.
     """
 
     # Prepare the base PDF name (without extension)
@@ -44,8 +47,13 @@ def save_raw_data_as_json(raw_data, pdf_name, model_name, temp: float, pdf_reade
         "PDF_Reader_Version": pdf_reader_version,
         "Process_Mode": process_mode,
         "Prompt": prompt,
+        "Cached": cached,
+        "Usage": usage,
         "Raw_Data": raw_data
     }
+    if samples is not None:
+        raw_data["Samples"] = samples
+        raw_data["Majority_Vote"] = majority_vote
 
     # Ensure output directory exists
     os.makedirs(os.path.dirname(output_filename), exist_ok=True)
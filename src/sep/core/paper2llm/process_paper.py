@@ -3,31 +3,135 @@ This script manages the batch processing of PDF or text files using different la
 It supports reading from local PDFs, sending data to a model via API requests, and saving raw model responses.
 """
 
-from sep.env_manager import load_valid_models, RESULT_FOLDER
-from sep.core.api_request.request_manager import run_request
-from sep.core.evaluation.save_raw_data import save_raw_data_as_json
+from sep.env_manager import load_valid_models
+from sep.core.api_request.request_manager import run_request, run_prompt_response_async
+from sep.core.api_request.usage import ModelResponse
+from sep.core.evaluation.majority_vote import majority_vote, format_vote
+from sep.core.paper2llm.run_writer import RunWriter
 from sep.core.services.pdf_reader import get_pdf_reader_version
+from sep.core.services.metrics import observe_stage, track_paper, count_skipped_paper, STAGE_SAVE
+from sep.logger import setup_logger
 
 import os
-import datetime
+import asyncio
+import threading
+
+log = setup_logger(__name__)
 
 # Supported Models
 VALID_MODELS = load_valid_models()
 
-SAVING_PATH = None
-
 
-def process_paper(prompt: str, model: str, file_path: str, delay = 15, temp = 1.0, single_process = False, pdf_reader = False, same_run = False):
+def process_paper(prompt: str, model: str, file_path: str, delay = 0, temp = 1.0, single_process = False, pdf_reader = False, writer: RunWriter = None, resume = False, stop_event: threading.Event = None, use_cache = True, samples = 1):
     """
     Processes a PDF file using a specified model and prompt.
+    The result is saved by the given run writer. Without a writer, a new run folder is created.
+    In resume mode, papers that already have a raw output in the run folder are skipped (returns None as output).
+    If the stop_event is set, the in-flight request is aborted and RequestCancelled is raised.
+    With use_cache set to False, the response cache is bypassed and the provider is always asked.
+    The token usage and cost of the request are saved with the output and added to the usage of the writer.
+    With samples > 1, the model answers the prompt that many times (self-consistency). All outputs are saved and
+    the majority vote per question is saved as the output of the paper.
+    """
+    pdf_reader_version, process_mode = _check_paper(model, file_path, single_process, pdf_reader, samples)
+
+    if writer is None:
+        writer = RunWriter.create(model, temp)
+    elif resume and writer.has_output(file_path):
+        log.info(f"Skipping {file_path}, the run folder already contains its raw output.")
+        count_skipped_paper(model)
+        return None, writer.save_folder
+
+    with track_paper(model):
+        response = run_request(prompt, file_path, model, not single_process, pdf_reader, delay, temp, stop_event, use_cache, samples)
+
+        if response.text is None:
+            raise Exception(f"Evaluation for {file_path} failed due to processing error.")
+        last_output, outputs, vote = _get_output(response, samples)
+
+        with observe_stage(STAGE_SAVE, model):
+            writer.save(
+                raw_data=last_output,
+                pdf_name=os.path.basename(file_path),
+                model_name=model,
+                temp=temp,
+                pdf_reader=pdf_reader,
+                pdf_reader_version=pdf_reader_version,
+                process_mode=process_mode,
+                prompt=prompt,
+                cached=response.cached,
+                usage=response.usage,
+                samples=outputs,
+                majority_vote=vote)
+
+    return last_output, writer.save_folder
+
+
+async def process_paper_async(prompt: str, model: str, file_path: str, temp = 1.0, single_process = False, pdf_reader = False, writer: RunWriter = None, resume = False, use_cache = True, samples = 1):
+    """
+    Async variant of process_paper. The request is sent with the async provider clients,
+    file access runs in worker threads so the event loop is never blocked.
+    Cancelling the awaiting task aborts the in-flight request.
+    """
+    pdf_reader_version, process_mode = _check_paper(model, file_path, single_process, pdf_reader, samples)
+
+    if writer is None:
+        writer = await asyncio.to_thread(RunWriter.create, model, temp)
+    elif resume and await asyncio.to_thread(writer.has_output, file_path):
+        log.info(f"Skipping {file_path}, the run folder already contains its raw output.")
+        count_skipped_paper(model)
+        return None, writer.save_folder
+
+    if single_process:
+        raise ValueError("The --process_all argument is not supported anymore")
+
+    with track_paper(model):
+        response = await run_prompt_response_async(prompt, file_path, model, pdf_reader, temp, use_cache, samples)
+
+        if response.text is None:
+            raise Exception(f"Evaluation for {file_path} failed due to processing error.")
+        last_output, outputs, vote = _get_output(response, samples)
+
+        with observe_stage(STAGE_SAVE, model):
+            await asyncio.to_thread(
+                writer.save,
+                raw_data=last_output,
+                pdf_name=os.path.basename(file_path),
+                model_name=model,
+                temp=temp,
+                pdf_reader=pdf_reader,
+                pdf_reader_version=pdf_reader_version,
+                process_mode=process_mode,
+                prompt=prompt,
+                cached=response.cached,
+                usage=response.usage,
+                samples=outputs,
+                majority_vote=vote)
+
+    return last_output, writer.save_folder
+
+
+def _get_output(response: ModelResponse, samples: int) -> tuple[str, list[str] | None, list[dict] | None]:
     """
-    global SAVING_PATH
-    if not same_run or SAVING_PATH is None:
-        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-        save_folder = RESULT_FOLDER + f"{model}-temp{temp}-{timestamp}/"
-        SAVING_PATH = save_folder
+    Returns the output that is saved as the raw data of the paper, and for sampled papers all outputs and their majority vote.
+    The vote is formatted like a model answer, so the evaluation scores the voted answers.
+    """
+    if samples <= 1:
+        return response.text, None, None
+    vote = majority_vote(response.samples)
+    return format_vote(vote), response.samples, vote
 
 
+def _check_paper(model: str, file_path: str, single_process: bool, pdf_reader: bool, samples: int = 1) -> tuple[str, str]:
+    """
+    Validates the paper and the model.
+
+    Returns:
+        tuple[str, str]: The pdf reader version and the process mode that are saved with the output.
+
+    Raises:
+        ValueError: If the file does not exist, the model is not supported or samples is below 1.
+    """
     if not os.path.isfile(file_path):
         error_message = f"{file_path}, not a valid file."
         raise ValueError(error_message)
@@ -36,32 +140,19 @@ def process_paper(prompt: str, model: str, file_path: str, delay = 15, temp = 1.
         raise ValueError(
             f"Error: Invalid model '{model}' specified. Supported models are: {', '.join(VALID_MODELS)}")
 
-
-
     if pdf_reader:
         pdf_reader_version = get_pdf_reader_version()
     else:
         pdf_reader_version = '-'
 
+    if samples < 1:
+        raise ValueError(f"Invalid number of samples: {samples}, at least one is required.")
+
     if single_process:
         process_mode = "process full pdf with prompt-split requests"
     else:
         process_mode = "process full pdf in single request"
+    if samples > 1:
+        process_mode += f", majority vote of {samples} samples"
 
-    last_output = run_request(prompt, file_path, model, not single_process, pdf_reader, delay, temp)
-
-    if last_output is None:
-        raise Exception(f"Evaluation for {file_path} failed due to processing error.")
-
-    save_raw_data_as_json(
-        raw_data=last_output,
-        pdf_name=os.path.basename(file_path),
-        model_name=model,
-        temp=temp,
-        pdf_reader=pdf_reader,
-        pdf_reader_version=pdf_reader_version,
-        process_mode=process_mode,
-        prompt=prompt,
-        save_folder=SAVING_PATH)
-
-    return last_output, SAVING_PATH
\ No newline at end of file
+    return pdf_reader_version, process_mode
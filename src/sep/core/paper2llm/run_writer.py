@@ -0,0 +1,97 @@
+"""
+Run-scoped output context.
+
+A RunWriter owns the result folder of exactly one run and writes all raw model outputs of that run.
+It is created once per run and passed down to process_paper, so parallel runs in the same process
+never share (or overwrite) an output folder.
+"""
+
+import os
+import re
+import datetime
+import threading
+from sep.env_manager import RESULT_FOLDER
+from sep.core.api_request.usage import Usage
+from sep.core.evaluation.save_raw_data import save_raw_data_as_json
+
+# Matches the file names written by save_raw_data_as_json: raw-<pdf>-<YYYYmmdd>-<HHMMSS>.json
+RAW_FILE_PATTERN = re.compile(r"^raw-(.+)-\d{8}-\d{6}\.json$")
+
+
+class RunWriter:
+    """Writes the raw outputs of a single run into its own result folder."""
+
+    def __init__(self, save_folder: str):
+        self.save_folder = save_folder
+        # usage of all outputs saved by this writer
+        self._usage = Usage()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, model: str, temp: float, base_folder: str = RESULT_FOLDER) -> "RunWriter":
+        """
+        Creates a new, timestamped result folder for a run with the given model and temperature.
+        If the folder already exists (e.g. two runs started in the same second), a counter is appended.
+        """
+        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        name = f"{model}-temp{temp}-{timestamp}"
+        save_folder = base_folder + f"{name}/"
+
+        counter = 1
+        while True:
+            try:
+                os.makedirs(save_folder)
+                return cls(save_folder)
+            except FileExistsError:
+                counter += 1
+                save_folder = base_folder + f"{name}-{counter}/"
+
+    def save(self, raw_data, pdf_name, model_name, temp: float, pdf_reader, pdf_reader_version, process_mode, prompt, cached=False, usage: Usage = None, samples: list[str] = None, majority_vote: list[dict] = None):
+        """
+        Saves the raw output of one paper into the run folder (cached marks outputs from the response cache).
+        The token usage of the request is saved with the output and added to the usage of the writer.
+        Sampled papers also save all outputs and their majority vote.
+        """
+        save_raw_data_as_json(
+            raw_data=raw_data,
+            pdf_name=pdf_name,
+            model_name=model_name,
+            temp=temp,
+            pdf_reader=pdf_reader,
+            pdf_reader_version=pdf_reader_version,
+            process_mode=process_mode,
+            prompt=prompt,
+            save_folder=self.save_folder,
+            cached=cached,
+            usage=usage.to_dict() if usage is not None else None,
+            samples=samples,
+            majority_vote=majority_vote)
+        if usage is not None:
+            with self._lock:
+                self._usage = self._usage + usage
+
+    def get_usage(self) -> Usage:
+        """Returns the summed up usage of all outputs saved by this writer."""
+        with self._lock:
+            return self._usage
+
+    def get_processed_papers(self) -> set[str]:
+        """Returns the names (without extension) of all papers that already have a raw output in the run folder."""
+        if not os.path.isdir(self.save_folder):
+            return set()
+
+        processed = set()
+        for file in os.listdir(self.save_folder):
+            match = RAW_FILE_PATTERN.match(file)
+            if match:
+                processed.add(match.group(1))
+        return processed
+
+    def has_output(self, file_path: str) -> bool:
+        """Checks if the given paper already has a raw output in the run folder."""
+        return get_paper_name(file_path) in self.get_processed_papers()
+
+
+def get_paper_name(file_path: str) -> str:
+    """Returns the paper name as it is used in the raw output file names (file name without extension)."""
+    return os.path.basename(file_path).split('.')[0]
@@ -1,5 +1,5 @@
 from sep.core.utils.load_json import load_json
-from sep.core.api_request import process_file_with_gemini
+from sep.core.api_request.request_manager import run_prompt
 from sep.core.prompt_designer.get_correct_answers import get_correct_answers
 from sep.env_manager import PROMPT_DESIGN_PROMPT_PATH
 from sep.logger import setup_logger
@@ -13,6 +13,6 @@ def adjust_prompt(old_prompt: str, paper: str, model: str, temp: float) -> str:
     log.info(f"Adjusting prompt for paper: {paper} with model: {model} and temperature: {temp}.")
 
     correct_answers = get_correct_answers(paper)
-    new_prompt = process_file_with_gemini(PROMPT_DESIGN_PROMPT + "\n\nPrompt: " + old_prompt + "\n\nCorrect Answers: " + correct_answers.strip(), paper, model, temp)
+    new_prompt = run_prompt(PROMPT_DESIGN_PROMPT + "\n\nPrompt: " + old_prompt + "\n\nCorrect Answers: " + correct_answers.strip(), paper, model, False, temp)
 
     return new_prompt
\ No newline at end of file
@@ -5,6 +5,7 @@ from sep.env_manager import DEFAULT_CSV, BASIC_PROMPT_PATH
 from sep.core.evaluation.load_saved_json import load_saved_jsons
 from sep.core.prompt_designer.adjust_prompt import adjust_prompt, PROMPT_DESIGN_PROMPT
 from sep.core.paper2llm.process_paper import process_paper
+from sep.core.paper2llm.run_writer import RunWriter
 from sep.prompt_manager import getPrompt
 from sep.core.prompt_designer.json_log import init_log, update_log
 from sep.core.evaluation.compare_answers import compare_data
@@ -12,7 +13,7 @@ from sep.logger import setup_logger
 
 log = setup_logger(__name__)
 
-def run_prompt_designer(base_prompt_json: str, loop: int, test_paper: int, papers: list[str], model: str, temp: float,  csv: str, delay: int = 5, testing: bool = True):
+def run_prompt_designer(base_prompt_json: str, loop: int, test_paper: int, papers: list[str], model: str, temp: float,  csv: str, delay: int = 0, testing: bool = True):
     """
     Executes a prompt design loop that iteratively adjusts a base prompt using given
     parameters to improve accuracy based on test papers.
@@ -116,27 +117,23 @@ def _get_number_of_papers(papers: list[str], index: int, n: int) -> list[str]:
 def _evaluate_prompt(prompt: str, papers_to_test: list[str], csv: str, model: str, delay: int) -> float:
     """Test the prompt using all papers and return the accuracy."""
 
-    save_folder = None
+    #every evaluation is saved as its own run
+    writer = RunWriter.create(model, 1.0)
 
     #run the prompt on all papers
     for paper in papers_to_test:
-        same_run = True
-        if save_folder is None: #makes sure to start with a new run
-            same_run = False
-
         #TODO: add parameter for other model settings (could be generalized with a model_settings class)
-        raw_answer, saved_at = process_paper(
+        process_paper(
             prompt=prompt,
             model=model,
             file_path=paper,
-            same_run=same_run,
+            writer=writer,
         )
-        save_folder = saved_at
         if delay > 0:
             time.sleep(delay)
 
     #evaluate the results
-    data = load_saved_jsons(save_folder + "*.json")
+    data = load_saved_jsons(writer.save_folder + "*.json")
     compared_data = compare_data(data, csv)
     accuracy = compared_data.get('global_accuracy')
 
@@ -156,7 +153,7 @@ def main():
     parser.add_argument('--files', '-f', required=True, nargs='+', help='Files or patterns to process (supports globbing).')
     parser.add_argument('--loops', '-l', type=int, default=5, help='Number of loops to run.')
     parser.add_argument('--test_papers', type=int, default=5, help='Number of papers to test after each adjustment.')
-    parser.add_argument('--delay', type=int, default=5, help='Delay time in seconds between processing files.')
+    parser.add_argument('--delay', type=int, default=0, help='Optional extra pause in seconds between processing files (requests are throttled by the rate limiter).')
     parser.add_argument('--temp', '-t', type=float, default=1.0, help='The temperature setting for model randomness.')
     parser.add_argument('--pdf_reader', action='store_true', help='Uses a local PDF reader to extract content as context for the model.')
     parser.add_argument('--csv', required=False, help='Path of the correct_answer.csv')
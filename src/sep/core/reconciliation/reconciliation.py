@@ -4,7 +4,7 @@ It uses questions, answers, and PDFs as context to evaluate and identify mistake
 """
 
 import time
-from sep.core.api_request import run_prompt
+from sep.core.api_request.request_manager import run_prompt
 from sep.env_manager import getPDFPath
 import logging
 
@@ -128,7 +128,7 @@ def main():
     parser.add_argument('--data2', type=str, required=True, help='Path to second model run JSON data (supports globbing).')
     parser.add_argument('--model1', type=str, required=True, help='Name of the first model.')
     parser.add_argument('--model2', type=str, required=True, help='Name of the second model.')
-    parser.add_argument('--delay', type=int, default=15, help='Delay time in seconds between processing reconciliations.')
+    parser.add_argument('--delay', type=int, default=0, help='Optional extra pause in seconds between reconciliations (requests are throttled by the rate limiter).')
 
     args = parser.parse_args()
 
@@ -0,0 +1,238 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Counters, gauges and latency histograms are collected by the request layer (run_prompt, the provider
+modules) and by process_paper, labeled by provider, model and stage. The API exposes them on /metrics.
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from sep.core.api_request.cancellation import RequestCancelled
+from sep.core.utils.get_provider import get_provider_name
+
+# Upper bounds of the latency buckets in seconds (requests to the providers take up to several minutes)
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# Stages of a paper
+STAGE_UPLOAD = "upload"
+STAGE_EXTRACTION = "extraction"
+STAGE_GENERATION = "generation"
+STAGE_SAVE = "save"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric {self.name} expects the labels {', '.join(self.label_names)}.")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _format_labels(self, key: tuple, extra: dict = None) -> str:
+        pairs = list(zip(self.label_names, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type_name}"]
+        return "\n".join(lines + self._samples())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter(_Metric):
+    """A value that only goes up, e.g. the number of requests."""
+    type_name = "counter"
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...] = ()):
+        super().__init__(name, description, label_names)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in sorted(values.items())]
+
+
+class Gauge(Counter):
+    """A value that goes up and down, e.g. the number of requests in flight."""
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Counts observations (e.g. latencies) in cumulative buckets."""
+    type_name = "histogram"
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict[tuple, tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            bucket_counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    bucket_counts[i] += 1
+            self._values[key] = (bucket_counts, total + value, count + 1)
+
+    def get_count(self, **labels) -> int:
+        with self._lock:
+            return self._values.get(self._key(labels), (None, 0.0, 0))[2]
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = {key: (list(buckets), total, count) for key, (buckets, total, count) in self._values.items()}
+
+        lines = []
+        for key, (bucket_counts, total, count) in sorted(values.items()):
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': str(bound)})} {bucket_count}")
+            lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds all metrics of the process and renders them for /metrics."""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    """Returns the shared metrics registry of the process."""
+    return _registry
+
+
+REQUESTS = _registry.register(Counter(
+    "sep_requests_total", "Requests sent through run_prompt by outcome (success, error, cancelled).", ("provider", "model", "status")))
+REQUESTS_IN_FLIGHT = _registry.register(Gauge(
+    "sep_requests_in_flight", "Requests that are currently processed by run_prompt.", ("provider", "model")))
+REQUEST_RETRIES = _registry.register(Counter(
+    "sep_request_retries_total", "Attempts that failed with a transient error and were retried.", ("provider",)))
+CIRCUIT_BREAKER_OPENED = _registry.register(Counter(
+    "sep_circuit_breaker_opened_total", "Number of times a provider was paused by its circuit breaker.", ("provider",)))
+REQUEST_DURATION = _registry.register(Histogram(
+    "sep_request_duration_seconds", "Duration of run_prompt including rate limiting and retries.", ("provider", "model")))
+STAGE_DURATION = _registry.register(Histogram(
+    "sep_stage_duration_seconds", "Duration of the stages of a paper (upload, extraction, generation, save).", ("provider", "model", "stage")))
+TIME_TO_FIRST_TOKEN = _registry.register(Histogram(
+    "sep_time_to_first_token_seconds", "Time from sending a streamed request to its first output chunk.", ("provider", "model")))
+TIME_TO_LAST_TOKEN = _registry.register(Histogram(
+    "sep_time_to_last_token_seconds", "Time from sending a streamed request to its last output chunk.", ("provider", "model")))
+STREAMS_STOPPED = _registry.register(Counter(
+    "sep_streams_stopped_total", "Streamed outputs stopped before the model finished by reason (complete, max_chars).", ("provider", "model", "reason")))
+CACHE_LOOKUPS = _registry.register(Counter(
+    "sep_response_cache_lookups_total", "Lookups in the response cache by result (hit, miss).", ("provider", "model", "result")))
+REQUESTS_SHARED = _registry.register(Counter(
+    "sep_requests_shared_total", "Requests answered by an identical request in flight instead of an own provider call.", ("provider", "model")))
+TOKENS = _registry.register(Counter(
+    "sep_tokens_total", "Tokens used by the provider requests by kind (prompt, completion, cached).", ("provider", "model", "kind")))
+COST = _registry.register(Counter(
+    "sep_cost_usd_total", "Cost of the provider requests in USD, calculated from the price table of the config.yaml.", ("provider", "model")))
+PAPERS = _registry.register(Counter(
+    "sep_papers_total", "Papers handled by process_paper by outcome (success, error, cancelled, skipped).", ("provider", "model", "status")))
+
+
+@contextmanager
+def observe_stage(stage: str, model: str):
+    """Measures the duration of one stage of a paper, also if it fails."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.observe(time.monotonic() - start, provider=get_provider_name(model), model=model, stage=stage)
+
+
+@contextmanager
+def track_request(model: str):
+    """Counts a request of run_prompt by outcome and measures its duration and the requests in flight."""
+    provider = get_provider_name(model)
+    REQUESTS_IN_FLIGHT.inc(provider=provider, model=model)
+    start = time.monotonic()
+    try:
+        with _count_outcome(REQUESTS, provider=provider, model=model):
+            yield
+    finally:
+        REQUESTS_IN_FLIGHT.dec(provider=provider, model=model)
+        REQUEST_DURATION.observe(time.monotonic() - start, provider=provider, model=model)
+
+
+def count_usage(model: str, usage):
+    """Adds the tokens and the cost of a provider request (a Usage) to the usage metrics."""
+    provider = get_provider_name(model)
+    TOKENS.inc(usage.prompt_tokens, provider=provider, model=model, kind="prompt")
+    TOKENS.inc(usage.completion_tokens, provider=provider, model=model, kind="completion")
+    TOKENS.inc(usage.cached_tokens, provider=provider, model=model, kind="cached")
+    COST.inc(usage.cost, provider=provider, model=model)
+
+
+def track_paper(model: str):
+    """Counts a paper of process_paper by outcome."""
+    return _count_outcome(PAPERS, provider=get_provider_name(model), model=model)
+
+
+def count_skipped_paper(model: str):
+    """Counts a paper that was skipped because the run folder already contains its output."""
+    PAPERS.inc(provider=get_provider_name(model), model=model, status="skipped")
+
+
+@contextmanager
+def _count_outcome(counter: Counter, **labels):
+    status = "success"
+    try:
+        yield
+    except (RequestCancelled, asyncio.CancelledError):
+        status = "cancelled"
+        raise
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        counter.inc(status=status, **labels)
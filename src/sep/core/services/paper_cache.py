@@ -0,0 +1,109 @@
+"""
+In-memory cache of the prepared papers.
+
+Hashing a PDF (for the response cache) and extracting its text (for the pdf reader mode) is done once
+per file and shared by all requests of the process, e.g. by the runs of a fan-out that send the same
+papers to several models. Concurrent callers of the same paper wait for the first one instead of
+repeating the work. A file is identified by its path, size and modification time, so a changed file
+is prepared again.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from sep.env_manager import PAPER_CACHE
+from sep.core.services.pdf_reader import get_text_from_pdf
+
+# Used when the paper_cache section of the config.yaml has no entry
+DEFAULT_MAX_ENTRIES = 256
+
+# Bytes read at once while hashing a PDF
+CHUNK_SIZE = 1024 * 1024
+
+
+class PaperCache:
+    """Keeps the hash and the extracted text of the most recently used papers."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, extract=get_text_from_pdf):
+        self.max_entries = max_entries
+        self._extract = extract
+        self._lock = threading.Lock()
+        # file key -> {"hash": ..., "text": ...}, least recently used first
+        self._entries: OrderedDict[tuple, dict] = OrderedDict()
+        # file key -> lock held while the paper is prepared
+        self._key_locks: dict[tuple, threading.Lock] = {}
+
+    def get_hash(self, file_path: str) -> str:
+        """Returns the SHA-256 hash of the bytes of the file."""
+        return self._get(file_path, "hash", _hash_file)
+
+    def get_text(self, file_path: str) -> str:
+        """Returns the text of the PDF, extracted with the pdf reader."""
+        return self._get(file_path, "text", self._extract)
+
+    def _get(self, file_path: str, field: str, compute) -> str:
+        key = _file_key(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and field in entry:
+                self._entries.move_to_end(key)
+                return entry[field]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # another caller may have prepared the paper while we waited
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and field in entry:
+                    return entry[field]
+            try:
+                value = compute(file_path)
+                with self._lock:
+                    self._entries.setdefault(key, {})[field] = value
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _file_key(file_path: str) -> tuple:
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+
+def _hash_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_paper_cache = None
+_paper_cache_lock = threading.Lock()
+
+def get_paper_cache() -> PaperCache:
+    """Returns the paper cache of the process."""
+    global _paper_cache
+    with _paper_cache_lock:
+        if _paper_cache is None:
+            _paper_cache = PaperCache(PAPER_CACHE.get("max_entries", DEFAULT_MAX_ENTRIES))
+        return _paper_cache
+
+
+def get_paper_hash(file_path: str) -> str:
+    """Returns the SHA-256 hash of the file, computed once per file."""
+    return get_paper_cache().get_hash(file_path)
+
+
+def get_paper_text(file_path: str) -> str:
+    """Returns the text of the PDF, extracted once per file."""
+    return get_paper_cache().get_text(file_path)
@@ -1,16 +1,8 @@
-from sep.core.api_request import get_gemini_model_name
-from sep.core.api_request.gpt import get_gpt_model_name
+from sep.core.api_request.providers import get_provider_registry, resolve
 
 def get_full_model_name(name: str) -> str:
     """This function receives the name of an AI model as a string and checks the current full name of this model."""
-    if name.lower().startswith('gemini'):
-        return get_gemini_model_name(name)
-    
-    elif name.lower().startswith('gpt') or name.lower().startswith('deepseek-chat'):
-        return get_gpt_model_name(name)
-    
-    elif name.lower().startswith('o1'):
-        return get_gpt_model_name(name)
-    
-    elif name.lower().startswith('deepseek'):
-        raise("Local model information can not be retrieved.")
\ No newline at end of file
+    plugin = get_provider_registry().match(name)
+    if plugin.model_name is None:
+        raise ValueError(f"The model information of {name} can not be retrieved.")
+    return resolve(plugin.model_name)(name)
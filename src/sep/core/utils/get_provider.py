@@ -0,0 +1,5 @@
+from sep.core.api_request.providers import get_provider_registry
+
+def get_provider_name(model: str) -> str:
+    """This function receives the name of an AI model and returns the provider that serves it (gemini, openai, deepseek, custom, test or the provider of a plugin)."""
+    return get_provider_registry().match(model).name
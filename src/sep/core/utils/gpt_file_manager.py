@@ -1,64 +1,147 @@
 import json
 import os
-from openai import OpenAI
+import threading
+import warnings
+from dataclasses import replace
 from sep import env_manager
+from sep.core.services.paper_cache import get_paper_hash
+from sep.core.utils.upload_registry import Upload, UploadRegistry, get_upload_registry
+from sep.logger import setup_logger
 
 # This script handles file management for uploaded files, including retrieving, storing, and checking for previously uploaded files
 # for a given file. It interacts with the OpenAI client to upload files if they haven't been uploaded already.
+# The uploads are kept in the shared upload registry (indexed by the hash of the PDF and by its file name), the file IDs
+# are additionally cached in memory. Entries of the old JSON registry are imported once and matched by file name.
 
+log = setup_logger(__name__)
+
+# Name of the provider in the upload registry
+PROVIDER = "openai"
+
+# Old JSON registry (list of file_name/file_id entries), imported into the upload registry
 uploaded_files = env_manager.GPT_UPLOADED_FILES
 
-def get_file(file_path: str, client: object):
+# (registry path, content hash) -> file ID of the uploads this process already looked up
+_index: dict[tuple[str, str], str] = {}
+_index_lock = threading.Lock()
+# registries into which the JSON registry was imported already
+_imported: set[str] = set()
+
+# Prefix of the placeholder hashes of the imported entries, they are replaced by the real hash on first use
+LEGACY_HASH_PREFIX = "legacy:"
+
+def get_file(file_path: str, client: object, registry: UploadRegistry = None):
     """
     Retrieves the file ID for a given file. If the file has not been uploaded yet, it uploads the file to the client and stores its ID.
-    
+    Threads and processes that share the upload registry upload a PDF only once.
+
     Returns:
         str: The file ID of the uploaded or retrieved file.
     """
-    file_name = os.path.splitext(os.path.basename(file_path))[0]
-    
-    file_id = get_file_from_json(file_name)
-    
-    if file_id is None:
-        with open(file_path, "rb") as f:
-            file = client.files.create(file=f, purpose="assistants")
-        
-        add_file_to_json(file_name, file.id)
-        return file.id
-    
-    return file_id
-
-def add_file_to_json(file_name: str, file_id: str):
-    """
-    Adds a new file's name and ID to the JSON file that keeps track of uploaded files.
+    registry = registry or get_upload_registry()
+    content_hash = get_paper_hash(file_path)
+
+    with _index_lock:
+        file_id = _index.get((registry.path, content_hash))
+    if file_id is not None:
+        return file_id
+
+    upload = registry.get(PROVIDER, content_hash) or _adopt_legacy_upload(registry, content_hash, file_path)
+    if upload is None:
+        upload = registry.upload_once(PROVIDER, content_hash, lambda: _upload(file_path, client, content_hash, registry))
+    else:
+        log.info(f"File '{os.path.basename(file_path)}' was already uploaded. Using the saved version instead.")
+
+    with _index_lock:
+        _index[(registry.path, content_hash)] = upload.name
+    return upload.name
+
+def get_file_by_name(file_name: str, registry: UploadRegistry = None):
     """
-    if not os.path.exists(uploaded_files):
-        with open(uploaded_files, "w") as f:
-            json.dump([], f)
+    Retrieves the file ID of the most recent upload of a PDF with the given name (with or without extension).
 
-    with open(uploaded_files, "r") as f:
-        data = json.load(f)
-    
-    data.append({"file_name": file_name, "file_id": file_id})
+    Returns:
+        str or None: The file ID if the file was uploaded, or None if the file is not found.
+    """
+    registry = registry or get_upload_registry()
+    _import_json_registry(registry)
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    uploads = registry.find_by_name(PROVIDER, f"{stem}.pdf")
+    return uploads[0].name if uploads else None
 
-    with open(uploaded_files, "w") as f:
-        json.dump(data, f, indent=4)
+def add_file_to_json(file_name: str, file_id: str, registry: UploadRegistry = None):
+    """
+    Deprecated: the uploads are kept in the upload registry, get_file registers them itself.
+    Adds the upload of a file name (without extension) to the upload registry, like an entry of the old JSON registry.
+    """
+    warnings.warn("add_file_to_json is deprecated, get_file registers the uploads in the upload registry.", DeprecationWarning, stacklevel=2)
+    registry = registry or get_upload_registry()
+    now = registry.now()
+    registry.put(Upload(PROVIDER, LEGACY_HASH_PREFIX + file_name, f"{file_name}.pdf", file_id, uploaded_at=now, verified_at=now))
 
-def get_file_from_json(file_name: str):
+def get_file_from_json(file_name: str, registry: UploadRegistry = None):
     """
-    Retrieves the file ID for a given file name from the JSON file.
+    Deprecated: use get_file_by_name.
+    Retrieves the file ID for a given file name from the upload registry.
 
     Returns:
         str or None: The file ID if the file exists, or None if the file is not found.
     """
-    if not os.path.exists(uploaded_files):
-        return None
+    warnings.warn("get_file_from_json is deprecated, use get_file_by_name.", DeprecationWarning, stacklevel=2)
+    return get_file_by_name(file_name, registry)
+
+def _upload(file_path: str, client: object, content_hash: str, registry: UploadRegistry) -> Upload:
+    with open(file_path, "rb") as f:
+        file = client.files.create(file=f, purpose="assistants")
+    log.info(f"Uploaded file '{os.path.basename(file_path)}' as: {file.id}")
+
+    now = registry.now()
+    return Upload(
+        provider=PROVIDER,
+        content_hash=content_hash,
+        file_name=_get_file_name(file_path),
+        name=file.id,
+        uploaded_at=now,
+        expires_at=getattr(file, "expires_at", None),
+        verified_at=now,
+    )
+
+def _adopt_legacy_upload(registry: UploadRegistry, content_hash: str, file_path: str) -> Upload | None:
+    """
+    Returns an imported upload of a PDF with the same name, now registered under the hash of the PDF.
+    The old registry only knew the file names, so a PDF with the same name is trusted to be the same PDF.
+    """
+    _import_json_registry(registry)
+    for legacy in registry.find_by_name(PROVIDER, _get_file_name(file_path)):
+        if legacy.content_hash.startswith(LEGACY_HASH_PREFIX):
+            upload = replace(legacy, content_hash=content_hash)
+            registry.put(upload)
+            registry.remove(legacy)
+            return upload
+    return None
 
+def _import_json_registry(registry: UploadRegistry):
+    """Imports the entries of the old JSON registry that are not in the upload registry yet (once per process)."""
+    with _index_lock:
+        if registry.path in _imported:
+            return
+        _imported.add(registry.path)
+
+    if not uploaded_files or not os.path.exists(uploaded_files):
+        return
     with open(uploaded_files, "r") as f:
         data = json.load(f)
-    
+
+    now = registry.now()
+    imported = 0
     for entry in data:
-        if entry["file_name"] == file_name:
-            return entry["file_id"]
+        file_name = f"{entry['file_name']}.pdf"
+        if registry.find_by_name(PROVIDER, file_name):
+            continue
+        registry.put(Upload(PROVIDER, LEGACY_HASH_PREFIX + entry["file_name"], file_name, entry["file_id"], uploaded_at=now, verified_at=now))
+        imported += 1
+    if imported:
+        log.info(f"Imported {imported} uploads from {uploaded_files} into the upload registry.")
 
-    return None
+def _get_file_name(file_path: str) -> str:
+    return os.path.basename(file_path)
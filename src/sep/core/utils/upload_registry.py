@@ -0,0 +1,193 @@
+"""
+Persistent registry of the PDFs uploaded to the providers.
+
+Uploads are indexed by provider and SHA-256 hash of the PDF, so a renamed or copied paper is not
+uploaded again while a changed paper with the same name is. The registry is a SQLite database that
+survives restarts and is shared by all processes (API server and sep-worker processes) that use the
+same path. Besides the provider's file name and URI, the upload time and the expiry time reported by
+the provider are stored, so expired uploads can be replaced. A process that uploads a PDF claims its
+hash first, other processes wait for that upload instead of uploading the PDF a second time.
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+from sep.env_manager import UPLOAD_REGISTRY_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    provider TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    name TEXT NOT NULL,
+    uri TEXT,
+    mime_type TEXT,
+    uploaded_at REAL NOT NULL,
+    expires_at REAL,
+    verified_at REAL NOT NULL,
+    PRIMARY KEY (provider, content_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_uploads_file_name ON uploads (provider, file_name);
+CREATE TABLE IF NOT EXISTS upload_claims (
+    provider TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    claimed_at REAL NOT NULL,
+    PRIMARY KEY (provider, content_hash)
+);
+"""
+
+# Seconds between two checks while another process uploads the same PDF
+DEFAULT_POLL_INTERVAL = 0.5
+# A claim older than this (seconds) belongs to a crashed process and is taken over
+DEFAULT_CLAIM_TIMEOUT = 300
+
+_COLUMNS = ["provider", "content_hash", "file_name", "name", "uri", "mime_type", "uploaded_at", "expires_at", "verified_at"]
+
+
+@dataclass
+class Upload:
+    """A PDF uploaded to a provider. Times are Unix timestamps, expires_at is None for uploads that do not expire."""
+    provider: str
+    content_hash: str
+    file_name: str
+    name: str
+    uri: str | None = None
+    mime_type: str | None = None
+    uploaded_at: float = 0.0
+    expires_at: float | None = None
+    verified_at: float = 0.0
+
+    def is_expired(self, now: float, margin: float = 0.0) -> bool:
+        """Checks if the upload expires within margin seconds."""
+        return self.expires_at is not None and self.expires_at - margin <= now
+
+
+class UploadRegistry:
+    """SQLite backed upload registry. A single connection is shared by all threads and guarded by a lock."""
+
+    def __init__(self, path: str = UPLOAD_REGISTRY_PATH, clock=time.time):
+        self.path = path
+        self._clock = clock
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+
+    def get(self, provider: str, content_hash: str) -> Upload | None:
+        """Returns the upload of the PDF with the given hash or None if it was not uploaded to the provider."""
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM uploads WHERE provider = ? AND content_hash = ?", (provider, content_hash)).fetchone()
+        return Upload(*row) if row else None
+
+    def find_by_name(self, provider: str, file_name: str) -> list[Upload]:
+        """Returns all uploads of PDFs with the given file name (newest first), e.g. for entries without a known hash."""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM uploads WHERE provider = ? AND file_name = ? ORDER BY uploaded_at DESC", (provider, file_name)).fetchall()
+        return [Upload(*row) for row in rows]
+
+    def put(self, upload: Upload):
+        """Adds the upload or replaces the previous upload of the same PDF."""
+        values = [getattr(upload, column) for column in _COLUMNS]
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO uploads ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)})", values)
+
+    def mark_verified(self, upload: Upload, expires_at: float = None):
+        """Notes that the upload was checked with the provider and still exists, with the expiry the provider reported (if given)."""
+        upload.verified_at = self._clock()
+        if expires_at is not None:
+            upload.expires_at = expires_at
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE uploads SET verified_at = ?, expires_at = ? WHERE provider = ? AND content_hash = ? AND name = ?",
+                (upload.verified_at, upload.expires_at, upload.provider, upload.content_hash, upload.name))
+
+    def remove(self, upload: Upload):
+        """Removes the upload (e.g. when the provider deleted the file)."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM uploads WHERE provider = ? AND content_hash = ? AND name = ?", (upload.provider, upload.content_hash, upload.name))
+
+    def remove_expired(self, provider: str = None) -> int:
+        """
+        Removes the uploads that are expired.
+
+        Returns:
+            int: Number of removed uploads.
+        """
+        query = "DELETE FROM uploads WHERE expires_at IS NOT NULL AND expires_at <= ?"
+        params = [self._clock()]
+        if provider is not None:
+            query += " AND provider = ?"
+            params.append(provider)
+        with self._lock, self._connection:
+            return self._connection.execute(query, params).rowcount
+
+    def upload_once(self, provider: str, content_hash: str, upload_fn: Callable[[], Upload], poll_interval: float = DEFAULT_POLL_INTERVAL, claim_timeout: float = DEFAULT_CLAIM_TIMEOUT) -> Upload:
+        """
+        Returns the registered upload of the PDF or registers the upload created by upload_fn.
+        Only the thread or process that holds the claim of the hash uploads, the others wait for its upload.
+        If the upload fails, the claim is released and the next waiting caller tries again.
+        """
+        owner = f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+        while True:
+            upload = self.get(provider, content_hash)
+            if upload is not None:
+                return upload
+            if self._claim(provider, content_hash, owner, claim_timeout):
+                try:
+                    # the previous owner may have finished between the check and the claim
+                    upload = self.get(provider, content_hash)
+                    if upload is None:
+                        upload = upload_fn()
+                        self.put(upload)
+                    return upload
+                finally:
+                    self._release(provider, content_hash, owner)
+            time.sleep(poll_interval)
+
+    def _claim(self, provider: str, content_hash: str, owner: str, claim_timeout: float) -> bool:
+        now = self._clock()
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO upload_claims (provider, content_hash, owner, claimed_at) VALUES (?, ?, ?, ?)",
+                (provider, content_hash, owner, now))
+            if cursor.rowcount == 1:
+                return True
+            cursor = self._connection.execute(
+                "UPDATE upload_claims SET owner = ?, claimed_at = ? WHERE provider = ? AND content_hash = ? AND claimed_at <= ?",
+                (owner, now, provider, content_hash, now - claim_timeout))
+            return cursor.rowcount == 1
+
+    def _release(self, provider: str, content_hash: str, owner: str):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM upload_claims WHERE provider = ? AND content_hash = ? AND owner = ?", (provider, content_hash, owner))
+
+    def now(self) -> float:
+        return self._clock()
+
+    def close(self):
+        self._connection.close()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_upload_registry() -> UploadRegistry:
+    """Returns the upload registry of the process."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = UploadRegistry()
+        return _registry
@@ -38,9 +38,28 @@ PROMPT_DESIGN_PROMPT_PATH = config("prompt_design_prompt_path")
 PDF_FOLDER = PROJECT_ROOT / config("pdf_folder")
 RESULT_FOLDER = config("result_folder")
 CSV_FOLDER = config("csv_folder")
+RESPONSE_CACHE_FOLDER = config("response_cache_folder")
+JOB_QUEUE_PATH = config("job_queue_path")
+UPLOAD_REGISTRY_PATH = config("upload_registry_path")
 ADJUSTED_PROMPT_FOLDER = config("adjusted_prompts")
 DEFAULT_CSV = config("standard_csv_responses")
 DEFAULT_CSV_COMBINED = config("standard_csv_responses_7abc_combined")
+RATE_LIMITS = config("rate_limits") or {}
+HTTP_CLIENTS = config("http_clients") or {}
+SCHEDULER = config("scheduler") or {}
+RETRY = config("retry") or {}
+BATCH = config("batch") or {}
+RESPONSE_CACHE = config("response_cache") or {}
+STREAMING = config("streaming") or {}
+PAPER_CACHE = config("paper_cache") or {}
+GEMINI_UPLOADS = config("gemini_uploads") or {}
+OPENAI_ASSISTANT = config("openai_assistant") or {}
+JOB_QUEUE = config("job_queue") or {}
+PRICES = config("prices") or {}
+RUN_MANAGER = config("run_manager") or {}
+
+# Database of all runs started through the RunManager (lives in the result folder)
+RUN_STORE_PATH = RESULT_FOLDER + "runs.sqlite3"
 
 
 def env(key):
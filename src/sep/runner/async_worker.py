@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+import traceback
+import weakref
+from contextlib import AsyncExitStack
+from typing import Callable
+from sep.env_manager import SCHEDULER
+from sep.core.paper2llm.process_paper import process_paper_async
+from sep.core.api_request.cancellation import CHECK_INTERVAL
+from sep.core.paper2llm.run_writer import RunWriter, get_paper_name
+from sep.core.utils.get_provider import get_provider_name
+from sep.logger import setup_logger
+from sep.runner.models import Run, RunStatus
+from sep.runner.worker import finish_status
+from sep.runner import events
+
+log = setup_logger(__name__)
+
+# Provider and model limits of the scheduler section, shared by all async runs of an event loop.
+# Semaphores are bound to the loop that first uses them, so they are kept per loop and dropped together with it.
+_limits: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_limits_lock = threading.Lock()
+
+
+def _get_limit(kind: str, name: str) -> asyncio.Semaphore | None:
+    """Returns the semaphore of a provider or model on the running event loop, or None if the config.yaml sets no limit for it."""
+    limit = (SCHEDULER.get(f"{kind}_limits") or {}).get(name)
+    if limit is None:
+        return None
+    loop = asyncio.get_running_loop()
+    with _limits_lock:
+        limits = _limits.setdefault(loop, {})
+        if (kind, name) not in limits:
+            limits[(kind, name)] = asyncio.Semaphore(limit)
+        return limits[(kind, name)]
+
+
+async def run_paper_async(run: Run, delay=0, temp=1.0, single_process=False, pdf_reader=False, max_concurrency=1, stop_event: threading.Event = None, writer: RunWriter = None, resume=False, on_progress: Callable[[Run], None] = None, priority=0, use_cache=True, samples=1):
+    """
+    Async variant of run_paper: processes all files of the run as tasks on the current event loop.
+    At most max_concurrency papers of the run are in flight at the same time, the provider and model
+    limits of the scheduler section apply to all async runs together. The priority is accepted for
+    compatibility with run_paper, tasks on the event loop are not ordered by it.
+    Setting the stop_event cancels all in-flight requests of the run. Failed papers are recorded
+    in run.failed_files like in run_paper.
+    """
+    event_bus = events.get_event_bus()
+
+    def _save_progress():
+        run.usage = writer.get_usage()
+        if on_progress is not None:
+            on_progress(run)
+
+    async def _report():
+        # reading the usage and saving the run hit SQLite, so they run in a worker thread and not on the shared event loop
+        await asyncio.to_thread(_save_progress)
+        event_bus.publish(run.id, events.PROGRESS, status=run.status.value, progress=run.progress)
+
+    run.status = RunStatus.RUNNING
+    run.failed_files = {}
+    if writer is None:
+        writer = await asyncio.to_thread(RunWriter.create, run.model, temp)
+    run.result_path = writer.save_folder
+
+    files = run.files
+    if resume:
+        processed = await asyncio.to_thread(writer.get_processed_papers)
+        files = [file for file in run.files if get_paper_name(file) not in processed]
+        log.info(f"Resuming run {run.id}: {len(run.files) - len(files)} of {len(run.files)} papers already processed.")
+
+    completed = len(run.files) - len(files)
+    if run.files:
+        run.progress = completed / len(run.files)
+    await _report()
+
+    run_limit = asyncio.Semaphore(max(1, max_concurrency))
+    limits = [limit for limit in (_get_limit("provider", get_provider_name(run.model)), _get_limit("model", run.model)) if limit is not None]
+
+    async def _process(file: str) -> bool:
+        nonlocal completed
+        async with AsyncExitStack() as stack:
+            for limit in (run_limit, *limits):
+                await stack.enter_async_context(limit)
+
+            event_bus.publish(run.id, events.PAPER_STARTED, file=file)
+            start = time.monotonic()
+            try:
+                await process_paper_async(run.prompt, run.model, file, temp, single_process, pdf_reader, writer=writer, resume=resume, use_cache=use_cache, samples=samples)
+            except asyncio.CancelledError:
+                log.info(f"Aborted {file} of run {run.id}.")
+                raise
+            except Exception as e:
+                log.error(f"Processing {file} of run {run.id} failed: {traceback.format_exc()}")
+                event_bus.publish(run.id, events.PAPER_FAILED, file=file, latency=time.monotonic() - start, error=str(e))
+                run.failed_files[file] = f"{type(e).__name__}: {e}"
+                completed += 1
+                run.progress = completed / len(run.files)
+                await _report()
+                return False
+            event_bus.publish(run.id, events.PAPER_FINISHED, file=file, latency=time.monotonic() - start)
+
+            completed += 1
+            run.progress = completed / len(run.files)
+            await _report()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        return True
+
+    async def _watch_stop_event():
+        while not stop_event.is_set():
+            await asyncio.sleep(CHECK_INTERVAL)
+        for task in tasks:
+            task.cancel()
+
+    tasks = [asyncio.create_task(_process(file)) for file in files]
+    watcher = asyncio.create_task(_watch_stop_event()) if stop_event is not None else None
+    try:
+        if tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if not task.cancelled():
+                    task.result()
+
+        if stop_event and stop_event.is_set() and completed < len(run.files):
+            run.status = RunStatus.CANCELLED
+            log.warning(f"Run {run.id} cancelled.")
+            return
+
+        run.status = finish_status(run, len(files))
+    except asyncio.CancelledError:
+        run.status = RunStatus.CANCELLED
+        log.warning(f"Run {run.id} cancelled.")
+    except Exception:
+        run.status = RunStatus.FAILED
+        run.message = traceback.format_exc()
+        log.error(f"Error in run {run.id}: {run.message}")
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await _report()
+        event_bus.publish(run.id, events.RUN_FINISHED, status=run.status.value, progress=run.progress, message=run.message)
@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+import traceback
+from typing import Callable
+from sep.env_manager import BATCH, load_valid_models
+from sep.core.api_request.batch import BatchRequest, BATCH_COMPLETED, BATCH_CANCELLED, FINAL_STATES, get_batch_backend
+from sep.core.api_request.usage import with_cost
+from sep.core.paper2llm.run_writer import RunWriter, get_paper_name
+from sep.core.services.metrics import PAPERS, STAGE_SAVE, count_usage, observe_stage
+from sep.core.services.pdf_reader import get_pdf_reader_version
+from sep.core.utils.get_provider import get_provider_name
+from sep.logger import setup_logger
+from sep.runner.models import Run, RunStatus
+from sep.runner.worker import finish_status
+from sep.runner import events
+
+log = setup_logger(__name__)
+
+# Used when the batch section of the config.yaml has no poll_interval or price_factor entry
+DEFAULT_POLL_INTERVAL = 30
+DEFAULT_PRICE_FACTOR = 1.0
+
+PROCESS_MODE = "process full pdf in batch request"
+
+
+def run_paper_batch(run: Run, delay=0, temp=1.0, single_process=False, pdf_reader=False, max_concurrency=1, stop_event: threading.Event = None, writer: RunWriter = None, resume=False, on_progress: Callable[[Run], None] = None, priority=0, use_cache=True, samples=1, backend=None, poll_interval: float = None):
+    """
+    Processes all files of the run as one batch job of the model's provider.
+    The batch is polled until it is done, then all outputs are saved into the run folder like in run_paper
+    and papers without an output are recorded in run.failed_files. Setting the stop_event cancels the batch.
+    The batch is saved with the run (run.batch_id, run.batch_files): a resumed run that carries the batch of the
+    interrupted run collects its outputs instead of submitting the papers again, unless the batch was cancelled.
+    The cost of the batch requests is reduced by the price_factor of the batch section.
+    delay, max_concurrency, priority and use_cache are accepted for compatibility with run_paper, they have no effect on a batch.
+    Self-consistency sampling (samples > 1) is not supported in batch mode.
+    """
+    event_bus = events.get_event_bus()
+
+    def _report():
+        run.usage = writer.get_usage()
+        if on_progress is not None:
+            on_progress(run)
+        event_bus.publish(run.id, events.PROGRESS, status=run.status.value, progress=run.progress)
+
+    run.status = RunStatus.RUNNING
+    run.failed_files = {}
+    stop_event = stop_event or threading.Event()
+    if writer is None:
+        writer = RunWriter.create(run.model, temp)
+    run.result_path = writer.save_folder
+    poll_interval = poll_interval if poll_interval is not None else BATCH.get("poll_interval", DEFAULT_POLL_INTERVAL)
+
+    try:
+        if single_process:
+            raise ValueError("The --process_all argument is not supported anymore")
+        if samples > 1:
+            raise ValueError("Self-consistency sampling is not supported in batch mode.")
+        if run.model not in load_valid_models():
+            raise ValueError(f"Error: Invalid model '{run.model}' specified.")
+        backend = backend or get_batch_backend(run.model)
+
+        files = run.files
+        if resume:
+            processed = writer.get_processed_papers()
+            files = [file for file in run.files if get_paper_name(file) not in processed]
+            log.info(f"Resuming run {run.id}: {len(run.files) - len(files)} of {len(run.files)} papers already processed.")
+
+        completed = len(run.files) - len(files)
+        missing = [file for file in files if not os.path.isfile(file)]
+        for file in missing:
+            run.failed_files[file] = f"ValueError: {file}, not a valid file."
+            completed += 1
+        if run.files:
+            run.progress = completed / len(run.files)
+
+        # custom ID -> request of all requests of the batch, in submission order (the results of some providers are matched by position)
+        requests = {}
+        state = None
+        pending = [file for file in files if file not in missing]
+        if resume and pending and run.batch_id and set(pending) <= set(run.batch_files.values()):
+            state = backend.poll(run.batch_id)
+            if state == BATCH_CANCELLED:
+                log.info(f"Batch {run.batch_id} of run {run.id} was cancelled, submitting a new batch.")
+            else:
+                requests = {custom_id: BatchRequest(custom_id=custom_id, file_path=file, prompt=run.prompt, model=run.model, temperature=temp, pdf_reader=pdf_reader) for custom_id, file in run.batch_files.items()}
+                run.message = f"Resumed batch {run.batch_id} with {len(requests)} papers."
+                log.info(f"Run {run.id}: {run.message}")
+
+        if not requests:
+            run.batch_id = None
+            run.batch_files = {}
+            for file in pending:
+                request = BatchRequest(custom_id=str(len(requests)), file_path=file, prompt=run.prompt, model=run.model, temperature=temp, pdf_reader=pdf_reader)
+                requests[request.custom_id] = request
+            if requests:
+                run.batch_id = backend.submit(list(requests.values()))
+                # saved with the run, so a resumed run collects this batch instead of submitting the papers again
+                run.batch_files = {custom_id: request.file_path for custom_id, request in requests.items()}
+                run.message = f"Batch {run.batch_id} submitted with {len(requests)} papers."
+                log.info(f"Run {run.id}: {run.message}")
+                state = None
+
+        if requests:
+            batch_id = run.batch_id
+            # the latency of the papers is the time from the submission (or the resume) of the batch to the collection of its results
+            start = time.monotonic()
+            _report()
+
+            if state is None:
+                state = backend.poll(batch_id)
+            while state not in FINAL_STATES:
+                if stop_event.wait(poll_interval):
+                    backend.cancel(batch_id)
+                    run.status = RunStatus.CANCELLED
+                    log.warning(f"Run {run.id} cancelled, batch {batch_id} was cancelled.")
+                    return
+                state = backend.poll(batch_id)
+
+            if state == BATCH_CANCELLED:
+                run.status = RunStatus.CANCELLED
+                log.warning(f"Batch {batch_id} of run {run.id} was cancelled by the provider.")
+                return
+
+            results = backend.get_results(batch_id, list(requests))
+            latency = time.monotonic() - start
+            pdf_reader_version = get_pdf_reader_version() if pdf_reader else '-'
+            provider = get_provider_name(run.model)
+
+            remaining = set(files)
+            for custom_id, request in requests.items():
+                # a resumed batch also holds the papers the interrupted run already saved
+                if request.file_path not in remaining:
+                    continue
+                result = results.get(custom_id)
+                if result is None or result.output is None:
+                    error = result.error if result is not None else f"No output, the batch ended as {state}."
+                    run.failed_files[request.file_path] = error
+                    PAPERS.inc(provider=provider, model=run.model, status="error")
+                    event_bus.publish(run.id, events.PAPER_FAILED, file=request.file_path, latency=latency, error=error)
+                else:
+                    usage = with_cost(run.model, result.usage, BATCH.get("price_factor", DEFAULT_PRICE_FACTOR))
+                    count_usage(run.model, usage)
+                    with observe_stage(STAGE_SAVE, run.model):
+                        writer.save(
+                            raw_data=result.output,
+                            pdf_name=os.path.basename(request.file_path),
+                            model_name=run.model,
+                            temp=temp,
+                            pdf_reader=pdf_reader,
+                            pdf_reader_version=pdf_reader_version,
+                            process_mode=PROCESS_MODE,
+                            prompt=run.prompt,
+                            usage=usage)
+                    PAPERS.inc(provider=provider, model=run.model, status="success")
+                    event_bus.publish(run.id, events.PAPER_FINISHED, file=request.file_path, latency=latency)
+                completed += 1
+                run.progress = completed / len(run.files)
+            if state != BATCH_COMPLETED:
+                log.warning(f"Batch {batch_id} of run {run.id} ended as {state}.")
+            # the outputs are saved, a later resume submits the papers that are still missing again
+            run.batch_files = {}
+
+        run.message = None
+        run.status = finish_status(run, len(files))
+    except Exception:
+        run.status = RunStatus.FAILED
+        run.message = traceback.format_exc()
+        log.error(f"Error in run {run.id}: {run.message}")
+    finally:
+        _report()
+        event_bus.publish(run.id, events.RUN_FINISHED, status=run.status.value, progress=run.progress, message=run.message)
@@ -0,0 +1,50 @@
+"""
+Shared asyncio event loop for async runs.
+
+All runs started in async mode are driven by one event loop in a background thread. Their requests
+are coroutines on that loop, so hundreds of papers can be in flight without a thread per request.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Coroutine
+from sep.logger import setup_logger
+
+log = setup_logger(__name__)
+
+
+class EventLoopThread:
+    """Runs an asyncio event loop forever in a daemon thread."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="async-runs", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """
+        Schedules the coroutine on the loop (thread-safe).
+
+        Returns:
+            Future: Resolves with the result of the coroutine, cancelling it cancels the coroutine.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+
+_event_loop: EventLoopThread | None = None
+_event_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> EventLoopThread:
+    """Returns the shared event loop of the process, started on first use."""
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = EventLoopThread()
+            log.info("Started event loop for async runs.")
+        return _event_loop
@@ -0,0 +1,86 @@
+"""
+In-process event bus for live run progress.
+
+Workers publish per-paper events (started, finished, failed, progress) while a run is processed.
+Subscribers, e.g. the server-sent-events endpoint of the API, receive them on an asyncio queue of
+their own event loop, so a publishing worker thread never blocks on a slow consumer.
+"""
+
+import asyncio
+import threading
+import time
+from sep.logger import setup_logger
+
+log = setup_logger(__name__)
+
+# Event types
+PAPER_STARTED = "paper_started"
+PAPER_FINISHED = "paper_finished"
+PAPER_FAILED = "paper_failed"
+PROGRESS = "progress"
+RUN_FINISHED = "run_finished"
+
+# Events that are buffered per subscriber before the oldest ones are dropped
+MAX_QUEUED_EVENTS = 1000
+
+
+class Subscription:
+    """The events of one run for one subscriber, delivered to an asyncio queue."""
+
+    def __init__(self, run_id: str, loop: asyncio.AbstractEventLoop):
+        self.run_id = run_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_QUEUED_EVENTS)
+
+    def _put(self, event: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            log.warning(f"Event queue of run {self.run_id} is full, dropping the oldest event.")
+        self.queue.put_nowait(event)
+
+    def deliver(self, event: dict):
+        """Hands the event over to the subscriber's event loop (thread-safe)."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # the event loop of the subscriber is already closed
+            pass
+
+
+class RunEventBus:
+    """Distributes the events of runs to all of their subscribers."""
+
+    def __init__(self):
+        self._subscriptions: dict[str, list[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, run_id: str) -> Subscription:
+        """Subscribes to the events of a run. Must be called from within the event loop that consumes them."""
+        subscription = Subscription(run_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.setdefault(run_id, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.run_id, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.run_id, None)
+
+    def publish(self, run_id: str, event_type: str, **data):
+        """Sends an event to all subscribers of the run."""
+        event = {"type": event_type, "run_id": run_id, "time": time.time(), **data}
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(run_id, []))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+
+_event_bus = RunEventBus()
+
+
+def get_event_bus() -> RunEventBus:
+    """Returns the shared event bus of the process."""
+    return _event_bus
@@ -0,0 +1,221 @@
+"""
+Durable job queue of the worker pool.
+
+Runs in queue mode are split into one job per paper that is stored in a SQLite database. Worker
+processes (sep-worker), on this or on other machines that share the filesystem, lease the jobs,
+renew the lease with heartbeats while they process a paper and report the outcome back into the
+database, where the RunManager picks it up. A job whose lease expires, e.g. because its worker
+crashed, is handed out again until its attempts are used up.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from sep.env_manager import JOB_QUEUE, JOB_QUEUE_PATH
+
+# Used when the job_queue section of the config.yaml has no entry
+DEFAULT_LEASE_TIMEOUT = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+# States of a job
+JOB_QUEUED = "queued"
+JOB_LEASED = "leased"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+OPEN_STATES = (JOB_QUEUED, JOB_LEASED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    file TEXT NOT NULL,
+    params TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_expires_at REAL,
+    error TEXT,
+    usage TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_run ON jobs (run_id, status);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (status, priority, id);
+"""
+
+# Columns added after the first version of the schema, added to older databases on startup
+_MIGRATIONS = {
+    "usage": "ALTER TABLE jobs ADD COLUMN usage TEXT",
+}
+
+
+@dataclass
+class Job:
+    """A single paper of a run, together with the parameters to process it."""
+    id: int
+    run_id: str
+    file: str
+    params: dict
+    attempts: int = 0
+    worker_id: str | None = None
+
+
+class JobQueue:
+    """
+    SQLite backed job queue that can be shared by several processes.
+    Every instance opens its own connection, so create one per thread.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, lease_timeout: float = None, max_attempts: int = None, clock=time.time):
+        self.path = path
+        self.lease_timeout = lease_timeout if lease_timeout is not None else JOB_QUEUE.get("lease_timeout", DEFAULT_LEASE_TIMEOUT)
+        self.max_attempts = max_attempts if max_attempts is not None else JOB_QUEUE.get("max_attempts", DEFAULT_MAX_ATTEMPTS)
+        self._clock = clock
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # isolation_level=None: transactions are started explicitly, so a lease can take the write lock up front
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Adds columns that are missing in databases created by an older version."""
+        existing = {row[1] for row in self._connection.execute("PRAGMA table_info(jobs)")}
+        for column, statement in _MIGRATIONS.items():
+            if column not in existing:
+                self._connection.execute(statement)
+
+    def close(self):
+        self._connection.close()
+
+    def _transaction(self):
+        return _Transaction(self._connection)
+
+    def enqueue(self, run_id: str, files: list[str], params: dict, priority: int = 0) -> int:
+        """
+        Adds one job per file of the run.
+
+        Returns:
+            int: Number of added jobs.
+        """
+        now = self._clock()
+        rows = [(run_id, file, json.dumps(params), priority, JOB_QUEUED, now) for file in files]
+        with self._transaction():
+            self._connection.executemany(
+                "INSERT INTO jobs (run_id, file, params, priority, status, updated_at) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def lease(self, worker_id: str) -> Job | None:
+        """
+        Hands out the next queued job (highest priority first) or a job whose lease has expired.
+        Expired jobs that used up their attempts are marked as failed instead.
+
+        Returns:
+            Job | None: The leased job or None if there is no job.
+        """
+        now = self._clock()
+        with self._transaction():
+            while True:
+                row = self._connection.execute(
+                    "SELECT id, run_id, file, params, attempts FROM jobs "
+                    "WHERE status = ? OR (status = ? AND lease_expires_at < ?) "
+                    "ORDER BY priority DESC, id LIMIT 1",
+                    (JOB_QUEUED, JOB_LEASED, now)).fetchone()
+                if row is None:
+                    return None
+
+                job_id, run_id, file, params, attempts = row
+                if attempts >= self.max_attempts:
+                    self._connection.execute(
+                        "UPDATE jobs SET status = ?, error = ?, worker_id = NULL, updated_at = ? WHERE id = ?",
+                        (JOB_FAILED, f"LeaseExpired: the worker stopped responding {attempts} times.", now, job_id))
+                    continue
+
+                self._connection.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, worker_id = ?, lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                    (JOB_LEASED, worker_id, now + self.lease_timeout, now, job_id))
+                return Job(id=job_id, run_id=run_id, file=file, params=json.loads(params), attempts=attempts + 1, worker_id=worker_id)
+
+    def heartbeat(self, job: Job) -> bool:
+        """
+        Renews the lease of the job.
+
+        Returns:
+            bool: False if the worker lost the job (lease expired and taken over, or the run was cancelled).
+        """
+        now = self._clock()
+        with self._transaction():
+            cursor = self._connection.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+                (now + self.lease_timeout, now, job.id, job.worker_id, JOB_LEASED))
+        return cursor.rowcount == 1
+
+    def complete(self, job: Job, usage: dict = None) -> bool:
+        """Marks the job as done and stores the token usage of the paper. Returns False if the worker no longer held the lease."""
+        return self._finish(job, JOB_DONE, None, usage)
+
+    def fail(self, job: Job, error: str) -> bool:
+        """Marks the job as failed with the given error. Returns False if the worker no longer held the lease."""
+        return self._finish(job, JOB_FAILED, error)
+
+    def release(self, job: Job):
+        """Puts the job back into the queue without counting the attempt (e.g. when the worker shuts down)."""
+        with self._transaction():
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts - 1, worker_id = NULL, lease_expires_at = NULL, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = ?",
+                (JOB_QUEUED, self._clock(), job.id, job.worker_id, JOB_LEASED))
+
+    def _finish(self, job: Job, status: str, error: str | None, usage: dict = None) -> bool:
+        with self._transaction():
+            cursor = self._connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, usage = ?, lease_expires_at = NULL, updated_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+                (status, error, json.dumps(usage) if usage is not None else None, self._clock(), job.id, job.worker_id, JOB_LEASED))
+        return cursor.rowcount == 1
+
+    def cancel_run(self, run_id: str) -> int:
+        """
+        Cancels all open jobs of the run. Workers notice it with their next heartbeat.
+
+        Returns:
+            int: Number of cancelled jobs.
+        """
+        with self._transaction():
+            cursor = self._connection.execute(
+                f"UPDATE jobs SET status = ?, updated_at = ? WHERE run_id = ? AND status IN ({', '.join('?' for _ in OPEN_STATES)})",
+                (JOB_CANCELLED, self._clock(), run_id, *OPEN_STATES))
+        return cursor.rowcount
+
+    def get_jobs(self, run_id: str) -> dict[str, tuple[str, str | None, dict | None]]:
+        """
+        Returns the state of all jobs of the run.
+
+        Returns:
+            dict[str, tuple[str, str | None, dict | None]]: Status, error and token usage per file.
+        """
+        rows = self._connection.execute("SELECT file, status, error, usage FROM jobs WHERE run_id = ? ORDER BY id", (run_id,)).fetchall()
+        return {file: (status, error, json.loads(usage) if usage else None) for file, status, error, usage in rows}
+
+    def purge_run(self, run_id: str):
+        """Removes all jobs of a finished run."""
+        with self._transaction():
+            self._connection.execute("DELETE FROM jobs WHERE run_id = ?", (run_id,))
+
+
+class _Transaction:
+    """Runs the statements of the block in one write transaction (BEGIN IMMEDIATE), so concurrent workers never lease the same job."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc, tb):
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
@@ -1,34 +1,234 @@
 import threading
+import time
 import uuid
-from sep.runner.models import Run
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from sep.env_manager import RUN_MANAGER, load_valid_models
+from sep.core.paper2llm.run_writer import RunWriter
+from sep.runner.models import Run, RunStatus, RunSummary
+from sep.runner.scheduler import get_scheduler
+from sep.runner.store import RunStore
 from sep.runner.worker import run_paper
+from sep.runner.async_worker import run_paper_async
+from sep.runner.batch_worker import run_paper_batch
+from sep.runner.queue_worker import run_paper_queued
+from sep.runner.event_loop import get_event_loop
+from sep.logger import setup_logger
+
+log = setup_logger(__name__)
+
+# Used when the run_manager section of the config.yaml has no entry
+DEFAULT_FINISHED_RUN_TTL = 3600.0
+DEFAULT_MAX_SUMMARIES = 10000
+DEFAULT_CLEANUP_INTERVAL = 60.0
+
+ACTIVE_STATES = (RunStatus.PENDING, RunStatus.RUNNING)
 
 class RunManager:
-    def __init__(self):
+    """
+    Starts runs and keeps track of them.
+    Active runs are held in memory. When a run is done, its worker bookkeeping is removed and it is saved to
+    the run store. After finished_run_ttl seconds the full run is dropped from memory, only a compact summary
+    stays (at most max_summaries of them), reads of the full run go to the run store then.
+    """
+
+    def __init__(self, store: RunStore = None, finished_run_ttl: float = None, max_summaries: int = None, cleanup_interval: float = None, clock=time.monotonic):
+        self.store = store or RunStore()
+        self.finished_run_ttl = finished_run_ttl if finished_run_ttl is not None else RUN_MANAGER.get("finished_run_ttl", DEFAULT_FINISHED_RUN_TTL)
+        self.max_summaries = max_summaries if max_summaries is not None else RUN_MANAGER.get("max_summaries", DEFAULT_MAX_SUMMARIES)
         self.runs: dict[str, Run] = {}
         self.threads: dict[str, threading.Thread] = {}
+        self.tasks: dict[str, Future] = {}
         self.stop_events: dict[str, threading.Event] = {}
+        # runs whose papers are queued in the shared scheduler (threaded runs without batch or queue mode)
+        self.scheduled: set[str] = set()
+        self.summaries: OrderedDict[str, RunSummary] = OrderedDict()
+        # run ID -> (time of the clock, wall time) when the run was done, for the runs that are still held in full
+        self._finished: dict[str, tuple[float, datetime]] = {}
+        self._clock = clock
+        self._lock = threading.Lock()
 
-    def start_run(self, prompt, model, files, **kwargs) -> Run:
-        run_id = str(uuid.uuid4())
-        run = Run(id=run_id, prompt=prompt, model=model, files=files)
-        self.runs[run_id] = run
+        interrupted = self.store.mark_interrupted()
+        if interrupted:
+            log.warning(f"{interrupted} run(s) were interrupted by the last shutdown and are marked as failed.")
+
+        cleanup_interval = cleanup_interval if cleanup_interval is not None else RUN_MANAGER.get("cleanup_interval", DEFAULT_CLEANUP_INTERVAL)
+        self._closed = threading.Event()
+        if cleanup_interval and cleanup_interval > 0:
+            threading.Thread(target=self._cleanup_loop, args=(cleanup_interval,), name="run-manager-cleanup", daemon=True).start()
 
+    def start_run(self, prompt, model, files, resume_run_id: str = None, use_async: bool = False, use_batch: bool = False, use_queue: bool = False, **kwargs) -> Run:
+        """
+        Starts a new run in a background thread.
+        With use_async, the run is processed on the shared event loop with the async provider clients instead.
+        With use_batch, all papers are submitted as one batch job of the provider (use_async is ignored then).
+        With use_queue, the papers are added to the durable job queue and processed by the worker processes (sep-worker).
+        With a resume_run_id, the new run continues in the folder of that run and only processes the missing papers,
+        a resumed batch run collects the batch of that run instead of submitting it again.
+        Finished runs whose TTL has expired are archived whenever a new run is started.
+        """
+        self.evict_finished()
+
+        previous = None
+        if resume_run_id is not None:
+            previous = self._get_resume_run(resume_run_id, model)
+            writer = RunWriter(previous.result_path)
+            kwargs["resume"] = True
+        else:
+            writer = RunWriter.create(model, kwargs.get("temp", 1.0))
+
+        run_id = str(uuid.uuid4())
+        run = Run(id=run_id, prompt=prompt, model=model, files=files, result_path=writer.save_folder)
+        if use_batch and previous is not None:
+            # the resumed run collects the batch of the interrupted run if it covers the missing papers
+            run.batch_id = previous.batch_id
+            run.batch_files = dict(previous.batch_files)
         stop_event = threading.Event()
-        self.stop_events[run_id] = stop_event
+        with self._lock:
+            self.runs[run_id] = run
+            self.stop_events[run_id] = stop_event
+        self.store.save(run)
 
-        thread = threading.Thread(target=run_paper, args=(run,), kwargs={**kwargs, "stop_event": stop_event}, daemon=True)
-        self.threads[run_id] = thread
-        thread.start()
+        kwargs = {**kwargs, "stop_event": stop_event, "writer": writer, "on_progress": self.store.save}
+        if use_async and not use_batch:
+            with self._lock:
+                future = self.tasks[run_id] = get_event_loop().submit(run_paper_async(run, **kwargs))
+            future.add_done_callback(lambda _: self._on_finished(run_id))
+        else:
+            target = run_paper_batch if use_batch else run_paper_queued if use_queue else run_paper
+            thread = threading.Thread(target=self._run_worker, args=(target, run, kwargs), daemon=True)
+            with self._lock:
+                self.threads[run_id] = thread
+                if target is run_paper:
+                    self.scheduled.add(run_id)
+            thread.start()
 
         return run
 
+    def start_fanout(self, prompt, configs: list[tuple[str, float]], files, **kwargs) -> list[Run]:
+        """
+        Starts one run per (model, temperature) configuration on the same papers, e.g. to benchmark a new model against
+        the baselines. Every run writes its own run folder and can be stopped on its own. The runs are dispatched at the
+        same time and share the preparation of the papers: every PDF is hashed and its text extracted once (paper cache)
+        and uploaded once per provider. The other arguments are passed to start_run.
+
+        Returns:
+            list[Run]: The started runs, in the order of the configurations.
+
+        Raises:
+            ValueError: If there is no configuration, a configuration is repeated or a model is not supported.
+        """
+        if not configs:
+            raise ValueError("A fan-out run needs at least one model configuration.")
+        if len(set(configs)) != len(configs):
+            raise ValueError("The model configurations of a fan-out run must be unique.")
+        if kwargs.get("resume_run_id") is not None:
+            raise ValueError("A fan-out run can not be resumed, resume its runs one by one.")
+        valid_models = load_valid_models()
+        for model, _ in configs:
+            if model not in valid_models:
+                raise ValueError(f"Invalid model '{model}' specified.")
+
+        kwargs.pop("temp", None)
+        runs = [self.start_run(prompt, model, files, temp=temp, **kwargs) for model, temp in configs]
+        log.info(f"Started fan-out of {len(runs)} runs on {len(files)} papers: {', '.join(run.id for run in runs)}")
+        return runs
+
+    def _run_worker(self, target, run: Run, kwargs: dict):
+        try:
+            target(run, **kwargs)
+        finally:
+            self._on_finished(run.id)
+
+    def _on_finished(self, run_id: str):
+        """Removes the worker bookkeeping of a run that is done and saves its final state."""
+        with self._lock:
+            self.threads.pop(run_id, None)
+            self.tasks.pop(run_id, None)
+            self.stop_events.pop(run_id, None)
+            self.scheduled.discard(run_id)
+            run = self.runs.get(run_id)
+            if run is None:
+                return
+            self._finished[run_id] = (self._clock(), datetime.utcnow())
+        self.store.save(run)
+
+    def _get_resume_run(self, run_id: str, model: str) -> Run:
+        """Returns the run that should be resumed."""
+        previous = self.get_run(run_id)
+        if previous is None or previous.result_path is None:
+            raise KeyError(f"Run {run_id} not found.")
+        if previous.status in ACTIVE_STATES:
+            raise ValueError(f"Run {run_id} is still {previous.status.value} and can not be resumed.")
+        if previous.model != model:
+            raise ValueError(f"Run {run_id} was started with model '{previous.model}', not '{model}'.")
+        return previous
+
     def stop_run(self, run_id: str):
-        if run_id in self.stop_events:
-            self.stop_events[run_id].set()
+        stop_event = self.stop_events.get(run_id)
+        if stop_event is not None:
+            stop_event.set()
+            # async, batch and queue runs do not use the scheduler, it is not started for them
+            if run_id in self.scheduled:
+                get_scheduler().cancel_run(run_id)
 
     def get_run(self, run_id: str) -> Run:
-        return self.runs.get(run_id)
+        """Returns the live run if it is still in memory, otherwise the stored version."""
+        run = self.runs.get(run_id)
+        if run is None:
+            run = self.store.get(run_id)
+        return run
+
+    def get_summary(self, run_id: str) -> RunSummary | None:
+        """Returns the summary of an archived run, or None if the run is still in memory or unknown."""
+        return self.summaries.get(run_id)
+
+    def list_summaries(self) -> list[RunSummary]:
+        """Returns the summaries of the archived runs, most recently archived first."""
+        with self._lock:
+            return list(reversed(self.summaries.values()))
+
+    def list_runs(self, status: RunStatus = None, model: str = None, limit: int = 50, offset: int = 0) -> list[Run]:
+        """Returns one page of runs (newest first) from the run store, optionally filtered by status and model."""
+        return self.store.list(status=status, model=model, limit=limit, offset=offset)
+
+    def evict_finished(self, max_age: float = None) -> int:
+        """
+        Archives the runs that are done since more than max_age seconds (default: finished_run_ttl).
+        They are saved to the run store and replaced by a compact summary, the oldest summaries are
+        dropped above max_summaries.
+
+        Returns:
+            int: Number of archived runs.
+        """
+        max_age = self.finished_run_ttl if max_age is None else max_age
+        now = self._clock()
+        with self._lock:
+            expired = [run_id for run_id, (done_at, _) in self._finished.items() if now - done_at >= max_age]
+            archived = []
+            for run_id in expired:
+                _, finished_at = self._finished.pop(run_id)
+                run = self.runs.pop(run_id, None)
+                if run is not None:
+                    archived.append(run)
+                    self.summaries[run_id] = RunSummary.from_run(run, finished_at)
+            while len(self.summaries) > self.max_summaries:
+                self.summaries.popitem(last=False)
+
+        for run in archived:
+            self.store.save(run)
+        if archived:
+            log.info(f"Archived {len(archived)} finished run(s), {len(self.runs)} run(s) remain in memory.")
+        return len(archived)
+
+    def _cleanup_loop(self, interval: float):
+        while not self._closed.wait(interval):
+            try:
+                self.evict_finished()
+            except Exception:
+                log.exception("Archiving the finished runs failed.")
 
-    def list_runs(self) -> list[Run]:
-        return list(self.runs.values())
+    def close(self):
+        """Stops the periodic archiving of finished runs."""
+        self._closed.set()
@@ -2,6 +2,7 @@ from enum import Enum
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
+from sep.core.api_request.usage import Usage
 
 class RunStatus(str, Enum):
     PENDING = "pending"
@@ -21,3 +22,29 @@ class Run:
     progress: float = 0.0
     message: Optional[str] = None
     result_path: Optional[str] = None
+    failed_files: dict[str, str] = field(default_factory=dict)
+    usage: Usage = field(default_factory=Usage)
+    # Batch job of a batch run and its requests (custom ID -> file, in submission order) until the outputs are saved
+    batch_id: Optional[str] = None
+    batch_files: dict[str, str] = field(default_factory=dict)
+
+class RunSummary:
+    """Compact view of a finished run that the RunManager keeps in memory after the full run was archived."""
+    __slots__ = ("id", "model", "status", "progress", "created_at", "finished_at", "failed_papers", "cost")
+
+    def __init__(self, id: str, model: str, status: RunStatus, progress: float, created_at: datetime, finished_at: datetime, failed_papers: int = 0, cost: float = 0.0):
+        self.id = id
+        self.model = model
+        self.status = status
+        self.progress = progress
+        self.created_at = created_at
+        self.finished_at = finished_at
+        self.failed_papers = failed_papers
+        self.cost = cost
+
+    @classmethod
+    def from_run(cls, run: Run, finished_at: datetime) -> "RunSummary":
+        return cls(run.id, run.model, RunStatus(run.status), run.progress, run.created_at, finished_at, len(run.failed_files), run.usage.cost)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
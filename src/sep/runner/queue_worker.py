@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+import traceback
+from typing import Callable
+from sep.env_manager import JOB_QUEUE, load_valid_models
+from sep.core.api_request.usage import Usage
+from sep.core.paper2llm.run_writer import RunWriter, get_paper_name
+from sep.logger import setup_logger
+from sep.runner.job_queue import JobQueue, JOB_DONE, JOB_FAILED, OPEN_STATES
+from sep.runner.models import Run, RunStatus
+from sep.runner.worker import finish_status
+from sep.runner import events
+
+log = setup_logger(__name__)
+
+# Used when the job_queue section of the config.yaml has no poll_interval entry
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+def run_paper_queued(run: Run, delay=0, temp=1.0, single_process=False, pdf_reader=False, max_concurrency=1, stop_event: threading.Event = None, writer: RunWriter = None, resume=False, on_progress: Callable[[Run], None] = None, priority=0, use_cache=True, samples=1, queue_path: str = None, poll_interval: float = None):
+    """
+    Adds all files of the run as jobs to the durable job queue, where they are processed by the worker
+    processes of the pool (sep-worker). The outcome of the jobs is polled from the queue and reported
+    like in run_paper, failed papers are recorded in run.failed_files and the usage the workers report is
+    summed up in run.usage. Setting the stop_event cancels
+    the open jobs, workers abort them with their next heartbeat.
+    The number of papers in flight is set by the size of the worker pool, so delay and max_concurrency
+    have no effect. Jobs with a higher priority are leased first.
+    """
+    event_bus = events.get_event_bus()
+
+    def _report():
+        if on_progress is not None:
+            on_progress(run)
+        event_bus.publish(run.id, events.PROGRESS, status=run.status.value, progress=run.progress)
+
+    run.status = RunStatus.RUNNING
+    run.failed_files = {}
+    run.usage = Usage()
+    stop_event = stop_event or threading.Event()
+    if writer is None:
+        writer = RunWriter.create(run.model, temp)
+    run.result_path = writer.save_folder
+    poll_interval = poll_interval if poll_interval is not None else JOB_QUEUE.get("poll_interval", DEFAULT_POLL_INTERVAL)
+
+    queue = None
+    try:
+        if single_process:
+            raise ValueError("The --process_all argument is not supported anymore")
+        if run.model not in load_valid_models():
+            raise ValueError(f"Error: Invalid model '{run.model}' specified.")
+        queue = JobQueue(queue_path) if queue_path else JobQueue()
+
+        files = run.files
+        if resume:
+            processed = writer.get_processed_papers()
+            files = [file for file in run.files if get_paper_name(file) not in processed]
+            log.info(f"Resuming run {run.id}: {len(run.files) - len(files)} of {len(run.files)} papers already processed.")
+
+        skipped = len(run.files) - len(files)
+        if run.files:
+            run.progress = skipped / len(run.files)
+
+        # the workers may run in another directory or on another machine sharing the filesystem
+        params = {
+            "prompt": run.prompt,
+            "model": run.model,
+            "temp": temp,
+            "pdf_reader": pdf_reader,
+            "use_cache": use_cache,
+            "samples": samples,
+            "resume": resume,
+            "result_path": os.path.abspath(writer.save_folder) + os.sep,
+        }
+        # the jobs reference absolute paths, failures are reported under the paths of the run
+        paths = {os.path.abspath(file): file for file in files}
+        queue.enqueue(run.id, list(paths), params, priority)
+        # the latency of a paper is the time from enqueueing its job to seeing its outcome in the queue
+        start = time.monotonic()
+        run.message = f"{len(files)} papers queued for the worker pool."
+        _report()
+
+        reported = set()
+        while True:
+            jobs = queue.get_jobs(run.id)
+            for path, (status, error, usage) in jobs.items():
+                if path in reported or status in OPEN_STATES:
+                    continue
+                reported.add(path)
+                file = paths.get(path, path)
+                if status == JOB_DONE:
+                    run.usage = run.usage + Usage.from_dict(usage)
+                    event_bus.publish(run.id, events.PAPER_FINISHED, file=file, latency=time.monotonic() - start)
+                elif status == JOB_FAILED:
+                    run.failed_files[file] = error
+                    event_bus.publish(run.id, events.PAPER_FAILED, file=file, latency=time.monotonic() - start, error=error)
+
+            open_jobs = sum(1 for status, _, _ in jobs.values() if status in OPEN_STATES)
+            if run.files:
+                progress = (skipped + len(jobs) - open_jobs) / len(run.files)
+                if progress != run.progress:
+                    run.progress = progress
+                    _report()
+            if open_jobs == 0:
+                break
+
+            if stop_event.wait(poll_interval):
+                queue.cancel_run(run.id)
+                queue.purge_run(run.id)
+                run.status = RunStatus.CANCELLED
+                run.message = None
+                log.warning(f"Run {run.id} cancelled, its open jobs were removed from the queue.")
+                return
+
+        run.message = None
+        run.status = finish_status(run, len(files))
+        queue.purge_run(run.id)
+    except Exception:
+        run.status = RunStatus.FAILED
+        run.message = traceback.format_exc()
+        log.error(f"Error in run {run.id}: {run.message}")
+    finally:
+        if queue is not None:
+            queue.close()
+        _report()
+        event_bus.publish(run.id, events.RUN_FINISHED, status=run.status.value, progress=run.progress, message=run.message)
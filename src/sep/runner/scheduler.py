@@ -0,0 +1,179 @@
+"""
+Central job scheduler for all runs of the process.
+
+Runs enqueue paper-level tasks, a single pool of worker threads dispatches them. A task is only
+started if its run, its provider and its model are below their concurrency limits. Runs with a
+higher priority go first, runs with the same priority take turns (round robin), so one large run
+can not starve the others.
+"""
+
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable
+from sep.env_manager import SCHEDULER
+from sep.core.utils.get_provider import get_provider_name
+from sep.logger import setup_logger
+
+log = setup_logger(__name__)
+
+# Used when the config.yaml has no scheduler section
+DEFAULT_MAX_WORKERS = 16
+
+
+@dataclass
+class _Task:
+    model: str
+    provider: str
+    fn: Callable
+    args: tuple
+    kwargs: dict
+    future: Future = field(default_factory=Future)
+
+
+@dataclass
+class _RunQueue:
+    priority: int
+    max_concurrency: int
+    tasks: deque = field(default_factory=deque)
+    active: int = 0
+
+
+class Scheduler:
+    """Dispatches the tasks of all runs on one shared pool of worker threads."""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, provider_limits: dict[str, int] = None, model_limits: dict[str, int] = None):
+        self.max_workers = max_workers
+        self.provider_limits = provider_limits or {}
+        self.model_limits = model_limits or {}
+
+        self._condition = threading.Condition()
+        self._runs: dict[str, _RunQueue] = {}
+        self._order: deque[str] = deque()
+        self._active_providers = Counter()
+        self._active_models = Counter()
+
+        for i in range(max_workers):
+            threading.Thread(target=self._work, name=f"scheduler-{i}", daemon=True).start()
+
+    def register_run(self, run_id: str, priority: int = 0, max_concurrency: int = 1):
+        """Registers a run with its priority and the maximum number of its tasks that may run at the same time."""
+        with self._condition:
+            self._runs[run_id] = _RunQueue(priority=priority, max_concurrency=max(1, max_concurrency))
+            self._order.append(run_id)
+
+    def submit(self, run_id: str, model: str, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Enqueues a task of the given run. The run must be registered.
+
+        Returns:
+            Future: Resolves with the return value of fn(*args, **kwargs).
+        """
+        task = _Task(model=model, provider=get_provider_name(model), fn=fn, args=args, kwargs=kwargs)
+        with self._condition:
+            if run_id not in self._runs:
+                raise KeyError(f"Run {run_id} is not registered at the scheduler.")
+            self._runs[run_id].tasks.append(task)
+            self._condition.notify_all()
+        return task.future
+
+    def cancel_run(self, run_id: str) -> int:
+        """
+        Cancels all queued tasks of the run. Tasks that are already running are not affected.
+
+        Returns:
+            int: Number of cancelled tasks.
+        """
+        with self._condition:
+            queue = self._runs.get(run_id)
+            if queue is None:
+                return 0
+            cancelled = 0
+            while queue.tasks:
+                future = queue.tasks.popleft().future
+                if future.cancel():
+                    # wakes up callers waiting in as_completed() / wait()
+                    future.set_running_or_notify_cancel()
+                    cancelled += 1
+            return cancelled
+
+    def unregister_run(self, run_id: str):
+        """Removes the run and cancels its queued tasks."""
+        self.cancel_run(run_id)
+        with self._condition:
+            self._runs.pop(run_id, None)
+            if run_id in self._order:
+                self._order.remove(run_id)
+
+    def _has_capacity(self, task: _Task) -> bool:
+        provider_limit = self.provider_limits.get(task.provider)
+        if provider_limit is not None and self._active_providers[task.provider] >= provider_limit:
+            return False
+        model_limit = self.model_limits.get(task.model)
+        if model_limit is not None and self._active_models[task.model] >= model_limit:
+            return False
+        return True
+
+    def _next_task(self) -> tuple[str, _Task] | None:
+        """Picks the next task that may be started (caller must hold the lock)."""
+        candidates = sorted(enumerate(self._order), key=lambda item: (-self._runs[item[1]].priority, item[0]))
+        for _, run_id in candidates:
+            queue = self._runs[run_id]
+            if queue.active >= queue.max_concurrency:
+                continue
+            for task in queue.tasks:
+                if self._has_capacity(task):
+                    queue.tasks.remove(task)
+                    # the run goes to the end of the line, so runs with the same priority take turns
+                    self._order.remove(run_id)
+                    self._order.append(run_id)
+                    return run_id, task
+        return None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                next_task = self._next_task()
+                while next_task is None:
+                    self._condition.wait()
+                    next_task = self._next_task()
+
+                run_id, task = next_task
+                if not task.future.set_running_or_notify_cancel():
+                    continue
+                self._runs[run_id].active += 1
+                self._active_providers[task.provider] += 1
+                self._active_models[task.model] += 1
+
+            try:
+                result = task.fn(*task.args, **task.kwargs)
+            except BaseException as e:
+                task.future.set_exception(e)
+            else:
+                task.future.set_result(result)
+            finally:
+                with self._condition:
+                    if run_id in self._runs:
+                        self._runs[run_id].active -= 1
+                    self._active_providers[task.provider] -= 1
+                    self._active_models[task.model] -= 1
+                    self._condition.notify_all()
+
+
+_scheduler: Scheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """Returns the shared scheduler of the process, configured by the scheduler section of the config.yaml."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler(
+                max_workers=SCHEDULER.get("max_workers", DEFAULT_MAX_WORKERS),
+                provider_limits=SCHEDULER.get("provider_limits"),
+                model_limits=SCHEDULER.get("model_limits"),
+            )
+            log.info(f"Started scheduler with {_scheduler.max_workers} workers.")
+        return _scheduler
@@ -0,0 +1,147 @@
+"""
+Durable run registry of the RunManager.
+
+All runs are stored in a SQLite database in the result folder, indexed by status, model and
+creation date, so the run list survives server restarts and can be filtered and paginated
+without keeping every run in memory.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from sep.env_manager import RUN_STORE_PATH
+from sep.core.api_request.usage import Usage
+from sep.runner.models import Run, RunStatus
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    model TEXT NOT NULL,
+    files TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL,
+    message TEXT,
+    result_path TEXT,
+    failed_files TEXT NOT NULL DEFAULT '{}',
+    usage TEXT NOT NULL DEFAULT '{}',
+    batch_id TEXT,
+    batch_files TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_runs_status ON runs (status);
+CREATE INDEX IF NOT EXISTS idx_runs_model ON runs (model);
+CREATE INDEX IF NOT EXISTS idx_runs_created_at ON runs (created_at);
+"""
+
+_COLUMNS = ["id", "prompt", "model", "files", "created_at", "status", "progress", "message", "result_path", "failed_files", "usage", "batch_id", "batch_files"]
+
+# Columns added after the first version of the schema, added to older databases on startup
+_MIGRATIONS = {
+    "failed_files": "ALTER TABLE runs ADD COLUMN failed_files TEXT NOT NULL DEFAULT '{}'",
+    "usage": "ALTER TABLE runs ADD COLUMN usage TEXT NOT NULL DEFAULT '{}'",
+    "batch_id": "ALTER TABLE runs ADD COLUMN batch_id TEXT",
+    "batch_files": "ALTER TABLE runs ADD COLUMN batch_files TEXT NOT NULL DEFAULT '{}'",
+}
+
+
+class RunStore:
+    """SQLite backed store for runs. A single connection is shared by all threads and guarded by a lock."""
+
+    def __init__(self, path: str = RUN_STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Adds columns that are missing in databases created by an older version."""
+        existing = {row[1] for row in self._connection.execute("PRAGMA table_info(runs)")}
+        with self._connection:
+            for column, statement in _MIGRATIONS.items():
+                if column not in existing:
+                    self._connection.execute(statement)
+
+    def save(self, run: Run):
+        """Inserts the run or updates the stored version of it."""
+        row = _run_to_row(run)
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        with self._lock, self._connection:
+            self._connection.execute(f"INSERT OR REPLACE INTO runs ({', '.join(_COLUMNS)}) VALUES ({placeholders})", row)
+
+    def get(self, run_id: str) -> Run | None:
+        """Returns the run with the given ID or None if it is not stored."""
+        with self._lock:
+            row = self._connection.execute(f"SELECT {', '.join(_COLUMNS)} FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return _row_to_run(row) if row else None
+
+    def list(self, status: RunStatus = None, model: str = None, limit: int = 50, offset: int = 0) -> list[Run]:
+        """Returns the newest runs first, optionally filtered by status and model."""
+        conditions = []
+        params = []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(RunStatus(status).value)
+        if model is not None:
+            conditions.append("model = ?")
+            params.append(model)
+
+        query = f"SELECT {', '.join(_COLUMNS)} FROM runs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        return [_row_to_run(row) for row in rows]
+
+    def mark_interrupted(self) -> int:
+        """
+        Marks all runs that were still pending or running as failed.
+        Used on startup, since their worker threads did not survive the restart.
+
+        Returns:
+            int: Number of interrupted runs.
+        """
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "UPDATE runs SET status = ?, message = ? WHERE status IN (?, ?)",
+                (RunStatus.FAILED.value, "Interrupted by a server restart.", RunStatus.PENDING.value, RunStatus.RUNNING.value))
+        return cursor.rowcount
+
+
+def _run_to_row(run: Run) -> tuple:
+    return (
+        run.id,
+        run.prompt,
+        run.model,
+        json.dumps(run.files),
+        run.created_at.isoformat(),
+        RunStatus(run.status).value,
+        run.progress,
+        run.message,
+        run.result_path,
+        json.dumps(run.failed_files),
+        json.dumps(run.usage.to_dict()),
+        run.batch_id,
+        json.dumps(run.batch_files),
+    )
+
+
+def _row_to_run(row: tuple) -> Run:
+    data = dict(zip(_COLUMNS, row))
+    data["files"] = json.loads(data["files"])
+    data["failed_files"] = json.loads(data["failed_files"])
+    data["usage"] = Usage.from_dict(json.loads(data["usage"]))
+    data["batch_files"] = json.loads(data["batch_files"])
+    data["created_at"] = datetime.fromisoformat(data["created_at"])
+    data["status"] = RunStatus(data["status"])
+    return Run(**data)
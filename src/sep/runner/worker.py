@@ -1,31 +1,129 @@
 import threading
 import time
 import traceback
+from typing import Callable
+from concurrent.futures import as_completed, wait
 from sep.core.paper2llm.process_paper import process_paper
+from sep.core.api_request.cancellation import RequestCancelled
+from sep.core.paper2llm.run_writer import RunWriter, get_paper_name
 from sep.logger import setup_logger
 from sep.runner.models import Run, RunStatus
+from sep.runner.scheduler import Scheduler, get_scheduler
+from sep.runner import events
 
 log = setup_logger(__name__)
 
-def run_paper(run: Run, delay=15, temp=1.0, single_process=False, pdf_reader=False, stop_event: threading.Event = None):
+def run_paper(run: Run, delay=0, temp=1.0, single_process=False, pdf_reader=False, max_concurrency=1, stop_event: threading.Event = None, writer: RunWriter = None, resume=False, on_progress: Callable[[Run], None] = None, priority=0, scheduler: Scheduler = None, use_cache=True, samples=1):
+    """
+    Processes all files of the run as paper-level tasks on the shared scheduler.
+    At most max_concurrency papers of the run are processed at the same time, runs with a higher
+    priority are dispatched first. All results are written into the run folder of the given writer. Requests are throttled by the
+    provider rate limiter, the delay is only an optional extra pause per worker.
+    In resume mode, only papers without a raw output in the run folder are scheduled.
+    A paper that still fails after the retries of the request layer is recorded in run.failed_files,
+    the run goes on with the remaining papers and only fails if no paper succeeded.
+    The optional on_progress callback is called whenever the status or progress of the run changes.
+    Per-paper events are published on the shared event bus. The token usage and cost of the run are summed up in run.usage.
+    With use_cache set to False, the response cache is bypassed. With samples > 1, every paper is answered
+    that many times and the majority vote is saved (see process_paper).
+    """
+    event_bus = events.get_event_bus()
+
+    def _report():
+        run.usage = writer.get_usage()
+        if on_progress is not None:
+            on_progress(run)
+        event_bus.publish(run.id, events.PROGRESS, status=run.status.value, progress=run.progress)
+
     run.status = RunStatus.RUNNING
-    try:
-        for file in run.files:
-            if stop_event and stop_event.is_set():
-                run.status = RunStatus.CANCELLED
-                log.warning(f"Run {run.id} cancelled.")
-                return
-
-            last_output, save_folder = process_paper(
-                run.prompt, run.model, file, delay, temp, single_process, pdf_reader, same_run=True
+    run.failed_files = {}
+    if writer is None:
+        writer = RunWriter.create(run.model, temp)
+    run.result_path = writer.save_folder
+
+    files = run.files
+    if resume:
+        processed = writer.get_processed_papers()
+        files = [file for file in run.files if get_paper_name(file) not in processed]
+        log.info(f"Resuming run {run.id}: {len(run.files) - len(files)} of {len(run.files)} papers already processed.")
+
+    progress_lock = threading.Lock()
+    completed = len(run.files) - len(files)
+    if run.files:
+        run.progress = completed / len(run.files)
+    _report()
+
+    def _process(file: str) -> bool:
+        nonlocal completed
+        if stop_event and stop_event.is_set():
+            return False
+
+        event_bus.publish(run.id, events.PAPER_STARTED, file=file)
+        start = time.monotonic()
+        try:
+            process_paper(
+                run.prompt, run.model, file, delay, temp, single_process, pdf_reader, writer=writer, resume=resume, stop_event=stop_event, use_cache=use_cache, samples=samples
             )
-            run.progress += 1 / len(run.files)
-            run.result_path = save_folder
-            if delay > 0:
+        except RequestCancelled:
+            log.info(f"Aborted {file} of run {run.id}.")
+            return False
+        except Exception as e:
+            log.error(f"Processing {file} of run {run.id} failed: {traceback.format_exc()}")
+            event_bus.publish(run.id, events.PAPER_FAILED, file=file, latency=time.monotonic() - start, error=str(e))
+            with progress_lock:
+                run.failed_files[file] = f"{type(e).__name__}: {e}"
+                completed += 1
+                run.progress = completed / len(run.files)
+                _report()
+            return False
+        event_bus.publish(run.id, events.PAPER_FINISHED, file=file, latency=time.monotonic() - start)
+
+        with progress_lock:
+            completed += 1
+            run.progress = completed / len(run.files)
+            _report()
+        if delay > 0:
+            if stop_event:
+                stop_event.wait(delay)
+            else:
                 time.sleep(delay)
+        return True
+
+    scheduler = scheduler or get_scheduler()
+    scheduler.register_run(run.id, priority, max_concurrency)
+    futures = []
+    try:
+        futures = [scheduler.submit(run.id, run.model, _process, file) for file in files]
+        for future in as_completed(futures):
+            if not future.cancelled():
+                future.result()
+
+        if stop_event and stop_event.is_set() and completed < len(run.files):
+            run.status = RunStatus.CANCELLED
+            log.warning(f"Run {run.id} cancelled.")
+            return
 
-        run.status = RunStatus.FINISHED
+        run.status = finish_status(run, len(files))
     except Exception as e:
         run.status = RunStatus.FAILED
         run.message = traceback.format_exc()
-        log.error(f"Error in run {run.id}: {run.message}")
\ No newline at end of file
+        log.error(f"Error in run {run.id}: {run.message}")
+    finally:
+        scheduler.cancel_run(run.id)
+        wait(futures)
+        scheduler.unregister_run(run.id)
+        _report()
+        event_bus.publish(run.id, events.RUN_FINISHED, status=run.status.value, progress=run.progress, message=run.message)
+
+
+def finish_status(run: Run, scheduled: int) -> RunStatus:
+    """
+    Returns the final status of a run whose papers were all processed and notes the failed papers in its message.
+    The run only fails if every scheduled paper failed.
+    """
+    if not run.failed_files:
+        return RunStatus.FINISHED
+
+    run.message = f"{len(run.failed_files)} of {scheduled} papers failed: {', '.join(run.failed_files)}"
+    log.warning(f"Run {run.id}: {run.message}")
+    return RunStatus.FAILED if len(run.failed_files) == scheduled else RunStatus.FINISHED
@@ -0,0 +1,190 @@
+"""
+Worker processes of queue mode (sep-worker).
+
+A worker leases paper jobs from the durable job queue, processes them with process_paper and
+reports the outcome back to the queue. While a paper is processed, its lease is renewed with
+heartbeats; if the lease is lost (the run was cancelled or the job was handed to another worker)
+the request is aborted. Several worker processes, also on other machines that share the
+filesystem, can work on the same queue, so the throughput is not limited by a single process.
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+import uuid
+from sep.env_manager import JOB_QUEUE, JOB_QUEUE_PATH
+from sep.core.api_request.cancellation import CHECK_INTERVAL, RequestCancelled
+from sep.core.paper2llm.process_paper import process_paper
+from sep.core.paper2llm.run_writer import RunWriter
+from sep.logger import setup_logger
+from sep.runner.job_queue import Job, JobQueue
+
+log = setup_logger(__name__)
+
+# Used when the job_queue section of the config.yaml has no entry
+DEFAULT_HEARTBEAT_INTERVAL = 30.0
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_SHUTDOWN_TIMEOUT = 30.0
+
+
+class QueueWorker:
+    """Processes jobs of the queue in one or more threads of the current process."""
+
+    def __init__(self, queue_path: str = JOB_QUEUE_PATH, threads: int = 1, worker_id: str = None, heartbeat_interval: float = None, poll_interval: float = None):
+        self.queue_path = queue_path
+        self.threads = threads
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.heartbeat_interval = heartbeat_interval if heartbeat_interval is not None else JOB_QUEUE.get("heartbeat_interval", DEFAULT_HEARTBEAT_INTERVAL)
+        self.poll_interval = poll_interval if poll_interval is not None else JOB_QUEUE.get("poll_interval", DEFAULT_POLL_INTERVAL)
+        self.shutdown = threading.Event()
+        self.processed = 0
+        self._lock = threading.Lock()
+
+    def run(self, exit_when_idle: bool = False):
+        """
+        Processes jobs until shutdown is set. In-flight papers are aborted then and put back into the queue.
+        With exit_when_idle, every thread stops as soon as it finds the queue empty.
+        """
+        log.info(f"Worker {self.worker_id} started with {self.threads} thread(s) on {self.queue_path}.")
+        threads = [threading.Thread(target=self._loop, args=(exit_when_idle,), name=f"queue-worker-{i}", daemon=True) for i in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        log.info(f"Worker {self.worker_id} stopped after {self.processed} papers.")
+
+    def _loop(self, exit_when_idle: bool):
+        # SQLite connections can not be shared between threads
+        queue = JobQueue(self.queue_path)
+        try:
+            while not self.shutdown.is_set():
+                job = queue.lease(self.worker_id)
+                if job is not None:
+                    self._process(queue, job)
+                    continue
+                if exit_when_idle:
+                    return
+                self.shutdown.wait(self.poll_interval)
+        finally:
+            queue.close()
+
+    def _process(self, queue: JobQueue, job: Job):
+        params = job.params
+        stop_event = threading.Event()
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, stop_event, done), name=f"heartbeat-{job.id}", daemon=True)
+        heartbeat.start()
+
+        log.info(f"Worker {self.worker_id} processes {job.file} of run {job.run_id} (attempt {job.attempts}).")
+        writer = RunWriter(params["result_path"])
+        try:
+            process_paper(
+                params["prompt"], params["model"], job.file, temp=params["temp"], pdf_reader=params["pdf_reader"],
+                writer=writer, resume=params["resume"], stop_event=stop_event, use_cache=params["use_cache"],
+                samples=params.get("samples", 1))
+        except RequestCancelled:
+            if self.shutdown.is_set():
+                queue.release(job)
+                log.info(f"Put {job.file} of run {job.run_id} back into the queue.")
+            else:
+                log.info(f"Aborted {job.file} of run {job.run_id}, the job was cancelled.")
+        except Exception as e:
+            log.error(f"Processing {job.file} of run {job.run_id} failed: {traceback.format_exc()}")
+            queue.fail(job, f"{type(e).__name__}: {e}")
+        else:
+            if not queue.complete(job, writer.get_usage().to_dict()):
+                log.warning(f"Worker {self.worker_id} lost the lease of {job.file} of run {job.run_id} before it was done.")
+            with self._lock:
+                self.processed += 1
+        finally:
+            done.set()
+            heartbeat.join()
+
+    def _heartbeat(self, job: Job, stop_event: threading.Event, done: threading.Event):
+        """Renews the lease of the job until it is done, sets the stop_event if the lease is lost or the worker shuts down."""
+        queue = JobQueue(self.queue_path)
+        last_beat = time.monotonic()
+        try:
+            while not done.wait(CHECK_INTERVAL):
+                if self.shutdown.is_set():
+                    stop_event.set()
+                    return
+                if time.monotonic() - last_beat >= self.heartbeat_interval:
+                    last_beat = time.monotonic()
+                    if not queue.heartbeat(job):
+                        stop_event.set()
+                        return
+        finally:
+            queue.close()
+
+
+def _run_worker(queue_path: str, threads: int, exit_when_idle: bool, stop=None):
+    """Entry point of a worker process. Setting the stop event (of the parent process) shuts the worker down like a signal."""
+    worker = QueueWorker(queue_path, threads)
+    _handle_signals(worker.shutdown)
+    if stop is not None:
+        def _wait_for_stop():
+            stop.wait()
+            worker.shutdown.set()
+        threading.Thread(target=_wait_for_stop, name="worker-stop", daemon=True).start()
+    worker.run(exit_when_idle)
+
+
+def _handle_signals(shutdown: threading.Event):
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: shutdown.set())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Processes the papers of queue mode runs from the job queue.")
+    parser.add_argument("--queue", default=JOB_QUEUE_PATH, help="Path of the job queue database (shared with the API server).")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes.")
+    parser.add_argument("--threads", type=int, default=1, help="Number of papers processed in parallel per process.")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Stop as soon as the queue is empty.")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _run_worker(args.queue, args.threads, args.exit_when_idle)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    processes = [context.Process(target=_run_worker, args=(args.queue, args.threads, args.exit_when_idle, stop), name=f"sep-worker-{i}") for i in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    # the handlers only record the signal: setting an Event from a handler deadlocks while the main thread waits on it
+    signals = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda number, _: signals.append(number))
+    while any(process.is_alive() for process in processes):
+        if signals:
+            _stop_processes(processes, stop, JOB_QUEUE.get("shutdown_timeout", DEFAULT_SHUTDOWN_TIMEOUT))
+            break
+        time.sleep(CHECK_INTERVAL)
+    for process in processes:
+        process.join()
+
+
+def _stop_processes(processes: list, stop, timeout: float):
+    """
+    Shuts the worker processes down: they abort their papers and put the leased jobs back into the queue.
+    Processes that are still alive after the timeout are terminated, their jobs are leased again once the leases expire.
+    """
+    stop.set()
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        process.join(max(0.0, deadline - time.monotonic()))
+    for process in processes:
+        if process.is_alive():
+            log.warning(f"Worker process {process.name} did not stop within {timeout} seconds, terminating it.")
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+from sep.core.paper2llm.run_writer import RunWriter
+from sep.runner import async_worker
+from sep.runner.async_worker import run_paper_async
+from sep.runner.models import Run, RunStatus
+
+def create_papers(tmp_path, count):
+    files = []
+    for i in range(count):
+        file = tmp_path / f"{i:04d}.pdf"
+        file.write_bytes(b"%PDF-1.4")
+        files.append(str(file))
+    return files
+
+def test_run_paper_async_processes_all_papers(tmp_path):
+    files = create_papers(tmp_path, 5)
+    writer = RunWriter.create("test", 1.0, str(tmp_path) + "/")
+    run = Run(id="async", prompt="Test Prompt", model="test", files=files)
+
+    asyncio.run(run_paper_async(run, max_concurrency=3, writer=writer))
+
+    assert run.status == RunStatus.FINISHED
+    assert run.progress == 1.0
+    assert writer.get_processed_papers() == {"0000", "0001", "0002", "0003", "0004"}
+
+def test_limits_are_kept_per_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(async_worker, "SCHEDULER", {"provider_limits": {"test": 1}})
+    files = create_papers(tmp_path, 3)
+    # every asyncio.run creates a new event loop, as a restarted shared loop does
+    for i in range(2):
+        run = Run(id=f"limited-{i}", prompt="Test Prompt", model="test", files=files)
+        asyncio.run(run_paper_async(run, max_concurrency=3, writer=RunWriter.create("test", 1.0, str(tmp_path / str(i)) + "/")))
+        assert run.status == RunStatus.FINISHED
+
+def test_run_paper_async_fails_on_exception(tmp_path):
+    files = create_papers(tmp_path, 2)
+    run = Run(id="failing", prompt="Test Prompt", model="test-exception", files=files)
+
+    asyncio.run(run_paper_async(run, writer=RunWriter.create("test-exception", 1.0, str(tmp_path) + "/")))
+
+    assert run.status == RunStatus.FAILED
+    assert set(run.failed_files) == set(files)
+    assert "Test Exception thrown" in run.failed_files[files[0]]
+
+def test_stop_event_cancels_in_flight_requests(tmp_path):
+    files = create_papers(tmp_path, 3)
+    run = Run(id="slow", prompt="Test Prompt", model="test-slow", files=files)
+    stop_event = threading.Event()
+
+    async def stop_later():
+        await asyncio.sleep(0.1)
+        stop_event.set()
+
+    async def main():
+        writer = RunWriter.create("test-slow", 1.0, str(tmp_path) + "/")
+        await asyncio.wait_for(asyncio.gather(run_paper_async(run, max_concurrency=3, stop_event=stop_event, writer=writer), stop_later()), timeout=5)
+
+    asyncio.run(main())
+    assert run.status == RunStatus.CANCELLED
+    assert run.progress == 0.0
@@ -0,0 +1,98 @@
+import pytest
+from fastapi.testclient import TestClient
+from openai import OpenAI
+from sep.core.api_request import batch_server
+from sep.core.api_request.batch import BatchRequest, OpenAIBatchBackend
+from sep.cli.cli import _format_event
+from sep.core.paper2llm.run_writer import RunWriter
+from sep.runner.batch_worker import run_paper_batch
+from sep.runner.models import Run, RunStatus
+from sep.runner import events
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Batch backend that talks to the local batch server in-process."""
+    monkeypatch.setattr(batch_server, "PROCESSING_DELAY", 0.05)
+    client = OpenAI(api_key="local", base_url="http://testserver/v1", http_client=TestClient(batch_server.app))
+    return OpenAIBatchBackend(client)
+
+def create_papers(tmp_path, count):
+    files = []
+    for i in range(count):
+        file = tmp_path / f"{i:04d}.pdf"
+        file.write_bytes(b"%PDF-1.4")
+        files.append(str(file))
+    return files
+
+def test_batch_run_saves_all_outputs(tmp_path, backend):
+    files = create_papers(tmp_path, 3)
+    writer = RunWriter.create("test", 1.0, str(tmp_path) + "/")
+    run = Run(id="batch", prompt="Test Prompt", model="test", files=files + [str(tmp_path / "missing.pdf")])
+
+    run_paper_batch(run, writer=writer, backend=backend, poll_interval=0.05)
+
+    assert run.status == RunStatus.FINISHED
+    assert run.progress == 1.0
+    assert writer.get_processed_papers() == {"0000", "0001", "0002"}
+    assert list(run.failed_files) == [str(tmp_path / "missing.pdf")]
+    assert run.usage.prompt_tokens > 0 and run.usage.completion_tokens > 0
+
+def test_batch_errors_are_recorded_per_paper(tmp_path, backend):
+    files = create_papers(tmp_path, 2)
+    run = Run(id="failing", prompt="Test Prompt", model="test-exception", files=files)
+
+    run_paper_batch(run, writer=RunWriter.create("test-exception", 1.0, str(tmp_path) + "/"), backend=backend, poll_interval=0.05)
+
+    assert run.status == RunStatus.FAILED
+    assert run.failed_files == {file: "server_error: Test Exception thrown" for file in files}
+
+def test_batch_resume_only_submits_missing_papers(tmp_path, backend):
+    files = create_papers(tmp_path, 3)
+    writer = RunWriter.create("test", 1.0, str(tmp_path) + "/")
+    run_paper_batch(Run(id="first", prompt="Test Prompt", model="test", files=files[:1]), writer=writer, backend=backend, poll_interval=0.05)
+
+    run = Run(id="resumed", prompt="Test Prompt", model="test", files=files)
+    run_paper_batch(run, writer=writer, resume=True, backend=backend, poll_interval=0.05)
+
+    assert run.status == RunStatus.FINISHED
+    assert run.message is None
+    assert writer.get_processed_papers() == {"0000", "0001", "0002"}
+
+def test_resumed_run_collects_the_submitted_batch(tmp_path, backend, monkeypatch):
+    files = create_papers(tmp_path, 3)
+    writer = RunWriter.create("test", 1.0, str(tmp_path) + "/")
+    # the first paper was saved before the interruption, the batch of the interrupted run covers all of them
+    run_paper_batch(Run(id="first", prompt="Test Prompt", model="test", files=files[:1]), writer=writer, backend=backend, poll_interval=0.05)
+    requests = [BatchRequest(custom_id=str(i), file_path=file, prompt="Test Prompt", model="test", temperature=1.0) for i, file in enumerate(files)]
+    batch_id = backend.submit(requests)
+
+    submitted = []
+    monkeypatch.setattr(backend, "submit", lambda requests: submitted.append(requests))
+    run = Run(id="resumed", prompt="Test Prompt", model="test", files=files, batch_id=batch_id, batch_files={request.custom_id: request.file_path for request in requests})
+    run_paper_batch(run, writer=writer, resume=True, backend=backend, poll_interval=0.05)
+
+    assert submitted == []
+    assert run.status == RunStatus.FINISHED
+    assert run.batch_id == batch_id and run.batch_files == {}
+    assert writer.get_processed_papers() == {"0000", "0001", "0002"}
+
+class RecordingEventBus:
+    def __init__(self):
+        self.events = []
+
+    def publish(self, run_id, event_type, **data):
+        self.events.append({"type": event_type, "run_id": run_id, **data})
+
+def test_batch_run_events_can_be_watched(tmp_path, backend, monkeypatch):
+    event_bus = RecordingEventBus()
+    monkeypatch.setattr(events, "get_event_bus", lambda: event_bus)
+    files = create_papers(tmp_path, 2)
+    run = Run(id="watched", prompt="Test Prompt", model="test", files=files)
+
+    run_paper_batch(run, writer=RunWriter.create("test", 1.0, str(tmp_path) + "/"), backend=backend, poll_interval=0.05)
+
+    finished = [event for event in event_bus.events if event["type"] == events.PAPER_FINISHED]
+    assert [event["file"] for event in finished] == files
+    assert all(event["latency"] > 0 for event in finished)
+    assert [_format_event(event) for event in finished] == [f"✅ {event['file']} ({event['latency']:.1f}s)" for event in finished]
+    assert _format_event({"type": events.PAPER_FAILED, "file": "0000.pdf", "error": "server_error"}) == "❌ 0000.pdf: server_error"
@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sep.core.api_request import client_registry, custom_api, deepseek
+from sep.core.api_request.cancellation import RequestCancelled, closing_responses, run_cancellable, track_response
+from sep.core.api_request.client_registry import ClientRegistry
+
+class FakeResponse:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+OLLAMA_LINE = json.dumps({"message": {"content": "1;yes;quote\n"}, "done": False}).encode() + b"\n"
+OPENAI_EVENT = b"data: " + json.dumps({"id": "1", "object": "chat.completion.chunk", "created": 0, "model": "deepseek-chat",
+                                      "choices": [{"index": 0, "delta": {"content": "1;yes;quote\n"}, "finish_reason": None}]}).encode() + b"\n\n"
+
+class StreamingServer(ThreadingHTTPServer):
+    """Answers after header_delay seconds and then streams a chunk every 50 ms until the client disconnects."""
+
+    def __init__(self, header_delay):
+        super().__init__(("127.0.0.1", 0), StreamingHandler)
+        self.header_delay = header_delay
+        self.received = threading.Event()
+        self.disconnected = threading.Event()
+
+class StreamingHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.set()
+        time.sleep(self.server.header_delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if self.path.endswith("/chat/completions") else "application/x-ndjson")
+        self.end_headers()
+        try:
+            for _ in range(200):
+                self.wfile.write(OPENAI_EVENT if self.path.endswith("/chat/completions") else OLLAMA_LINE)
+                self.wfile.flush()
+                time.sleep(0.05)
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.disconnected.set()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server(request):
+    server = StreamingServer(getattr(request, "param", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def custom(server, monkeypatch):
+    monkeypatch.setattr(client_registry, "_registry", ClientRegistry({}))
+    monkeypatch.setattr(custom_api, "get_paper_text", lambda filename: "paper")
+    settings = {"CUSTOM_API_URL": f"http://127.0.0.1:{server.server_port}/api/chat", "CUSTOM_API_KEY": "key"}
+    monkeypatch.setattr(custom_api, "env", settings.get)
+
+@pytest.fixture
+def openai_compatible(server, monkeypatch):
+    monkeypatch.setattr(client_registry, "_registry", ClientRegistry({}))
+    monkeypatch.setattr(deepseek, "get_paper_text", lambda filename: "paper")
+    monkeypatch.setattr(deepseek, "_get_client_options", lambda model: {"api_key": "key", "base_url": f"http://127.0.0.1:{server.server_port}/v1"})
+
+def stop_after(seconds):
+    stop_event = threading.Event()
+    threading.Timer(seconds, stop_event.set).start()
+    return stop_event
+
+def stop_when(event):
+    stop_event = threading.Event()
+    threading.Thread(target=lambda: event.wait(5) and stop_event.set(), daemon=True).start()
+    return stop_event
+
+def test_stopped_run_closes_the_responses_of_its_request():
+    stop_event = threading.Event()
+    early, late = FakeResponse(), FakeResponse()
+    arrived = threading.Event()
+
+    def request():
+        track_response(early)
+        stop_event.set()
+        arrived.wait(5)
+        track_response(late)
+
+    with pytest.raises(RequestCancelled):
+        run_cancellable(request, stop_event=stop_event)
+    assert early.closed and not late.closed
+    # a response that arrives after the run was stopped is closed at once
+    arrived.set()
+    deadline = time.monotonic() + 5
+    while not late.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert late.closed
+
+def test_responses_outside_a_scope_are_not_tracked():
+    response = FakeResponse()
+    track_response(response)
+    with closing_responses():
+        pass
+    assert not response.closed
+
+def test_stopping_the_run_aborts_the_streamed_request(server, custom):
+    start = time.monotonic()
+    with pytest.raises(RequestCancelled):
+        custom_api.process_text_with_custom_api("prompt", "0005.pdf", "deepseek-r1", 0.0, stop_event=stop_after(0.3))
+    assert time.monotonic() - start < 2
+    assert server.disconnected.wait(5)
+
+@pytest.mark.parametrize("server", [0.5], indirect=True)
+def test_response_arriving_after_the_stop_is_closed(server, custom):
+    # the run is stopped while the server still prepares the answer (before the first token)
+    with pytest.raises(RequestCancelled):
+        custom_api.process_text_with_custom_api("prompt", "0005.pdf", "deepseek-r1", 0.0, stop_event=stop_when(server.received))
+    assert server.disconnected.wait(5)
+
+@pytest.mark.parametrize("server", [0.5], indirect=True)
+def test_pooled_httpx_response_arriving_after_the_stop_is_closed(server, openai_compatible):
+    with pytest.raises(RequestCancelled):
+        deepseek.process_text_with_openai("prompt", "0005.pdf", "deepseek-chat", 0.0, stop_event=stop_when(server.received))
+    assert server.disconnected.wait(5)
+
+def test_stopping_the_run_aborts_the_pooled_openai_stream(server, openai_compatible):
+    with pytest.raises(RequestCancelled):
+        deepseek.process_text_with_openai("prompt", "0005.pdf", "deepseek-chat", 0.0, stop_event=stop_after(0.3))
+    assert server.disconnected.wait(5)
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from sep.core.api_request import client_registry
+from sep.core.api_request.client_registry import ClientRegistry, get_openai_client, get_request_timeout
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+def test_clients_are_built_once_per_key():
+    registry = ClientRegistry({})
+    built = []
+
+    def factory():
+        built.append(FakeClient())
+        return built[-1]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get(("openai", "openai", None, "key"), factory))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1 and all(result is built[0] for result in results)
+    assert registry.get(("openai", "deepseek", "https://api.deepseek.com", "key"), factory) is not built[0]
+
+    registry.close()
+    assert all(client.closed for client in built)
+
+def test_forked_process_builds_new_clients():
+    registry = ClientRegistry({})
+    first = registry.get(("requests", "custom", None, None), FakeClient)
+    # the registry sees another process id, as it does after a fork
+    registry._pid = -1
+    assert registry.get(("requests", "custom", None, None), FakeClient) is not first
+
+def test_async_clients_are_kept_per_event_loop():
+    registry = ClientRegistry({})
+
+    async def get_twice():
+        return registry.get_async(("httpx", "custom", None, None), FakeClient), registry.get_async(("httpx", "custom", None, None), FakeClient)
+
+    first, second = asyncio.run(get_twice())
+    other, _ = asyncio.run(get_twice())
+    assert first is second
+    assert other is not first
+
+def test_provider_entries_override_the_defaults():
+    registry = ClientRegistry({"max_connections": 50, "custom": {"read_timeout": 1800}})
+    assert registry.get_settings("openai")["max_connections"] == 50
+    assert registry.get_settings("custom")["max_connections"] == 50
+    assert registry.get_settings("custom")["read_timeout"] == 1800
+    assert registry.get_settings("openai")["read_timeout"] == client_registry.DEFAULT_SETTINGS["read_timeout"]
+
+def test_openai_clients_share_the_pool(monkeypatch):
+    monkeypatch.setattr(client_registry, "_registry", ClientRegistry({"read_timeout": 42, "connect_timeout": 3}))
+    client = get_openai_client("openai", "sk-test")
+    assert get_openai_client("openai", "sk-test") is client
+    assert get_openai_client("openai", "sk-other") is not client
+    assert client.timeout.read == 42 and client.timeout.connect == 3
+    assert get_request_timeout("openai") == (3, 42)
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+import pytest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from google.genai import errors as genai_errors
+from sep.core.api_request import gemini
+from sep.core.utils.upload_registry import UploadRegistry
+
+MODEL = "gemini-2.5-pro"
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeFiles:
+    def __init__(self, clock, delay=0.0):
+        self.clock = clock
+        self.delay = delay
+        self.uploads = []
+        self.deleted = set()
+        self.lookups = 0
+
+    def upload(self, file):
+        time.sleep(self.delay)
+        name = f"files/{len(self.uploads)}"
+        self.uploads.append(file)
+        return SimpleNamespace(
+            name=name, uri=f"https://gemini/{name}", display_name=file, mime_type="application/pdf",
+            expiration_time=datetime.fromtimestamp(self.clock() + 48 * 3600, timezone.utc))
+
+    def get(self, name):
+        self.lookups += 1
+        if name in self.deleted:
+            raise genai_errors.ClientError(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+        return SimpleNamespace(name=name, state=SimpleNamespace(name="ACTIVE"))
+
+class FakeAsyncFiles:
+    def __init__(self, files):
+        self.files = files
+
+    async def upload(self, file):
+        return self.files.upload(file)
+
+    async def get(self, name):
+        return self.files.get(name)
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def files(clock, monkeypatch):
+    files = FakeFiles(clock)
+    client = SimpleNamespace(files=files, aio=SimpleNamespace(files=FakeAsyncFiles(files)))
+    monkeypatch.setattr(gemini, "get_client", lambda: client)
+    return files
+
+@pytest.fixture
+def registry(tmp_path, clock):
+    return UploadRegistry(str(tmp_path / "uploads.sqlite3"), clock=clock)
+
+def create_paper(tmp_path, name, content=b"%PDF-1.4 study"):
+    file = tmp_path / name
+    file.write_bytes(content)
+    return str(file)
+
+def test_uploads_are_indexed_by_content_and_survive_restarts(tmp_path, files, registry, clock):
+    first = gemini.get_or_upload_file(create_paper(tmp_path, "0005.pdf"), MODEL, registry=registry)
+    copy = gemini.get_or_upload_file(create_paper(tmp_path, "copy-of-0005.pdf"), MODEL, registry=registry)
+    other = gemini.get_or_upload_file(create_paper(tmp_path, "0013.pdf", b"%PDF-1.4 other"), MODEL, registry=registry)
+
+    assert copy.uri == first.uri
+    assert other.uri != first.uri
+    assert len(files.uploads) == 2
+    assert first.expires_at == pytest.approx(clock.now + 48 * 3600)
+
+    restarted = UploadRegistry(registry.path, clock=clock)
+    assert gemini.get_or_upload_file(str(tmp_path / "0005.pdf"), MODEL, registry=restarted).uri == first.uri
+    assert len(files.uploads) == 2
+
+def test_expiring_uploads_are_replaced(tmp_path, files, registry, clock):
+    paper = create_paper(tmp_path, "0005.pdf")
+    first = gemini.get_or_upload_file(paper, MODEL, registry=registry)
+
+    clock.now += 47 * 3600 - 1
+    assert gemini.get_or_upload_file(paper, MODEL, registry=registry).uri == first.uri
+    clock.now += 2
+    assert gemini.get_or_upload_file(paper, MODEL, registry=registry).uri != first.uri
+    assert len(files.uploads) == 2
+
+def test_old_uploads_are_revalidated(tmp_path, files, registry, clock):
+    paper = create_paper(tmp_path, "0005.pdf")
+    first = gemini.get_or_upload_file(paper, MODEL, registry=registry)
+
+    clock.now += 3600
+    assert gemini.get_or_upload_file(paper, MODEL, registry=registry).uri == first.uri
+    assert files.lookups == 1
+    # verified again just now, no lookup needed
+    gemini.get_or_upload_file(paper, MODEL, registry=registry)
+    assert files.lookups == 1
+
+    clock.now += 3600
+    files.deleted.add(first.name)
+    assert gemini.get_or_upload_file(paper, MODEL, registry=registry).uri != first.uri
+    assert len(files.uploads) == 2
+
+def test_concurrent_requests_upload_once(tmp_path, files, registry):
+    files.delay = 0.1
+    paper = create_paper(tmp_path, "0005.pdf")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gemini.get_or_upload_file(paper, MODEL, registry=registry))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(files.uploads) == 1
+    assert {upload.uri for upload in results} == {"https://gemini/files/0"}
+
+def test_async_uploads_share_the_registry(tmp_path, files, registry):
+    paper = create_paper(tmp_path, "0005.pdf")
+
+    async def main():
+        return await asyncio.gather(*(gemini.get_or_upload_file_async(paper, MODEL, registry=registry) for _ in range(3)))
+
+    uploads = asyncio.run(main())
+    assert len(files.uploads) == 1
+    assert gemini.get_or_upload_file(paper, MODEL, registry=registry).uri == uploads[0].uri
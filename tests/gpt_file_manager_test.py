@@ -0,0 +1,110 @@
+import json
+import multiprocessing
+import threading
+import time
+import pytest
+from types import SimpleNamespace
+from sep.core.utils import gpt_file_manager
+from sep.core.utils.upload_registry import UploadRegistry
+
+class FakeFiles:
+    def __init__(self, delay=0.0, fail=0):
+        self.delay = delay
+        self.fail = fail
+        self.uploads = []
+        self._lock = threading.Lock()
+
+    def create(self, file, purpose):
+        time.sleep(self.delay)
+        with self._lock:
+            if self.fail:
+                self.fail -= 1
+                raise ConnectionError("upload failed")
+            self.uploads.append(file.name)
+            return SimpleNamespace(id=f"file-{len(self.uploads)}")
+
+@pytest.fixture
+def client():
+    return SimpleNamespace(files=FakeFiles())
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(gpt_file_manager, "uploaded_files", str(tmp_path / "uploaded_gpt_files.json"))
+    return UploadRegistry(str(tmp_path / "uploads.sqlite3"))
+
+def create_paper(tmp_path, name, content=b"%PDF-1.4 study"):
+    file = tmp_path / name
+    file.write_bytes(content)
+    return str(file)
+
+def test_uploads_are_indexed_by_content(tmp_path, client, registry):
+    first = gpt_file_manager.get_file(create_paper(tmp_path, "0005.pdf"), client, registry)
+    assert gpt_file_manager.get_file(create_paper(tmp_path, "renamed.pdf"), client, registry) == first
+    assert gpt_file_manager.get_file(create_paper(tmp_path, "0013.pdf", b"%PDF-1.4 other"), client, registry) != first
+    assert len(client.files.uploads) == 2
+
+    assert gpt_file_manager.get_file_by_name("0005", registry) == first
+    assert gpt_file_manager.get_file_by_name("0666.pdf", registry) is None
+
+def test_entries_of_the_json_registry_are_imported(tmp_path, client, registry):
+    with open(gpt_file_manager.uploaded_files, "w") as f:
+        json.dump([{"file_name": "0005", "file_id": "file-legacy"}], f)
+
+    assert gpt_file_manager.get_file(create_paper(tmp_path, "0005.pdf"), client, registry) == "file-legacy"
+    # adopted under the hash of the PDF: a renamed copy is found as well
+    assert gpt_file_manager.get_file(create_paper(tmp_path, "copy.pdf"), client, registry) == "file-legacy"
+    assert client.files.uploads == []
+
+def test_deprecated_json_helpers_use_the_upload_registry(tmp_path, client, registry):
+    with pytest.deprecated_call():
+        gpt_file_manager.add_file_to_json("0005", "file-added", registry)
+    with pytest.deprecated_call():
+        assert gpt_file_manager.get_file_from_json("0005", registry) == "file-added"
+    assert gpt_file_manager.get_file(create_paper(tmp_path, "0005.pdf"), client, registry) == "file-added"
+    assert client.files.uploads == []
+
+def test_concurrent_threads_upload_once(tmp_path, registry):
+    client = SimpleNamespace(files=FakeFiles(delay=0.2))
+    paper = create_paper(tmp_path, "0005.pdf")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gpt_file_manager.get_file(paper, client, registry))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["file-1"] * 4
+    assert len(client.files.uploads) == 1
+
+def test_failed_upload_releases_the_claim(tmp_path, registry):
+    client = SimpleNamespace(files=FakeFiles(fail=1))
+    paper = create_paper(tmp_path, "0005.pdf")
+    with pytest.raises(ConnectionError):
+        gpt_file_manager.get_file(paper, client, registry)
+    assert gpt_file_manager.get_file(paper, client, registry) == "file-1"
+
+def _upload_in_process(registry_path, paper, uploads_path):
+    class Files:
+        def create(self, file, purpose):
+            time.sleep(0.3)
+            with open(uploads_path, "a") as f:
+                f.write("upload\n")
+            return SimpleNamespace(id="file-shared")
+
+    registry = UploadRegistry(registry_path)
+    gpt_file_manager.get_file(paper, SimpleNamespace(files=Files()), registry)
+
+def test_processes_sharing_the_registry_upload_once(tmp_path):
+    # the worker processes import the JSON registry of the config, so the paper must not be in it
+    paper = create_paper(tmp_path, "not-uploaded-yet.pdf")
+    uploads_path = str(tmp_path / "uploads.log")
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_upload_in_process, args=(str(tmp_path / "uploads.sqlite3"), paper, uploads_path)) for _ in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+
+    assert all(process.exitcode == 0 for process in processes)
+    with open(uploads_path) as f:
+        assert f.read().count("upload") == 1
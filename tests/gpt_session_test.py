@@ -0,0 +1,221 @@
+import threading
+import httpx
+import openai
+import pytest
+from types import SimpleNamespace
+from sep.core.api_request import gpt
+from sep.core.api_request import gpt_session
+from sep.core.api_request.gpt_session import AssistantSession
+from sep.core.services.paper_cache import get_paper_hash
+from sep.core.utils import gpt_file_manager
+from sep.core.utils.upload_registry import UploadRegistry
+
+OPTIONS = {"vector_store_days": 7, "expiry_margin": 3600, "revalidate_interval": 3600, "index_timeout": 5}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeVectorStores:
+    def __init__(self, clock, polls=0):
+        self.clock = clock
+        self.polls = polls
+        self.created = []
+        self.deleted = set()
+        self.retrieved = 0
+        self._remaining = {}
+        # vector store ID -> last time it was used by a run (the expiry is anchored to it)
+        self.last_active = {}
+        self._lock = threading.Lock()
+
+    def create(self, name, file_ids, expires_after):
+        with self._lock:
+            vector_store_id = f"vs_{len(self.created)}"
+            self.created.append((name, file_ids, expires_after))
+            self._remaining[vector_store_id] = self.polls
+            self.last_active[vector_store_id] = self.clock()
+        return self._get(vector_store_id)
+
+    def retrieve(self, vector_store_id):
+        self.retrieved += 1
+        if vector_store_id in self.deleted:
+            raise openai.NotFoundError("not found", response=httpx.Response(404, request=httpx.Request("GET", "https://api.openai.com")), body=None)
+        with self._lock:
+            self._remaining[vector_store_id] = max(0, self._remaining[vector_store_id] - 1)
+        return self._get(vector_store_id)
+
+    def _get(self, vector_store_id):
+        status = "in_progress" if self._remaining[vector_store_id] else "completed"
+        return SimpleNamespace(id=vector_store_id, status=status, file_counts=SimpleNamespace(failed=0), expires_at=self.last_active[vector_store_id] + 7 * 24 * 3600)
+
+class FakeFiles:
+    def __init__(self):
+        self.uploads = []
+
+    def create(self, file, purpose):
+        self.uploads.append(file.name)
+        return SimpleNamespace(id=f"file-{len(self.uploads)}")
+
+class FakeAssistants:
+    def __init__(self):
+        self.retrieved = 0
+
+    def retrieve(self, assistant_id):
+        self.retrieved += 1
+        return SimpleNamespace(id=assistant_id)
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def client(clock, monkeypatch):
+    monkeypatch.setattr(gpt_session, "INDEX_POLL_INTERVAL", 0.01)
+    return SimpleNamespace(files=FakeFiles(), vector_stores=FakeVectorStores(clock), beta=SimpleNamespace(assistants=FakeAssistants()))
+
+@pytest.fixture
+def registry(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(gpt_file_manager, "uploaded_files", str(tmp_path / "uploaded_gpt_files.json"))
+    return UploadRegistry(str(tmp_path / "uploads.sqlite3"), clock=clock)
+
+def create_paper(tmp_path, name, content=b"%PDF-1.4 study"):
+    file = tmp_path / name
+    file.write_bytes(content)
+    return str(file)
+
+def test_assistant_is_retrieved_once(client, registry):
+    session = AssistantSession(lambda: client, "asst_1", registry, OPTIONS)
+    assert session.get_assistant().id == "asst_1"
+    assert session.get_assistant().id == "asst_1"
+    assert client.beta.assistants.retrieved == 1
+
+def test_vector_store_is_created_once_per_paper(tmp_path, client, registry):
+    session = AssistantSession(lambda: client, "asst_1", registry, OPTIONS)
+    paper = create_paper(tmp_path, "0005.pdf")
+    vector_store_id = session.get_vector_store(paper)
+
+    assert session.get_vector_store(paper) == vector_store_id
+    # another session (e.g. after a restart) with the same registry re-uses the vector store
+    assert AssistantSession(lambda: client, "asst_1", registry, OPTIONS).get_vector_store(create_paper(tmp_path, "renamed.pdf")) == vector_store_id
+    assert session.get_vector_store(create_paper(tmp_path, "0013.pdf", b"%PDF-1.4 other")) != vector_store_id
+
+    assert len(client.vector_stores.created) == 2
+    assert client.files.uploads == [paper, str(tmp_path / "0013.pdf")]
+    assert client.vector_stores.created[0][2] == {"anchor": "last_active_at", "days": 7}
+
+def test_creation_waits_for_the_indexing(tmp_path, client, registry):
+    client.vector_stores.polls = 3
+    session = AssistantSession(lambda: client, "asst_1", registry, OPTIONS)
+    session.get_vector_store(create_paper(tmp_path, "0005.pdf"))
+    assert client.vector_stores.retrieved == 3
+
+def test_concurrent_requests_create_one_vector_store(tmp_path, client, registry):
+    client.vector_stores.polls = 5
+    session = AssistantSession(lambda: client, "asst_1", registry, OPTIONS)
+    paper = create_paper(tmp_path, "0005.pdf")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(session.get_vector_store(paper))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(results)) == 1 and len(results) == 4
+    assert len(client.vector_stores.created) == 1
+
+def test_expiring_vector_store_is_replaced(tmp_path, client, registry, clock):
+    session = AssistantSession(lambda: client, "asst_1", registry, OPTIONS)
+    paper = create_paper(tmp_path, "0005.pdf")
+    first = session.get_vector_store(paper)
+
+    clock.now += 7 * 24 * 3600 - 60
+    assert session.get_vector_store(paper) != first
+    assert len(client.vector_stores.created) == 2
+    # the PDF itself is not uploaded again
+    assert len(client.files.uploads) == 1
+
+def test_vector_store_in_use_is_kept_past_its_first_expiry(tmp_path, client, registry, clock):
+    session = AssistantSession(lambda: client, "asst_1", registry, OPTIONS)
+    paper = create_paper(tmp_path, "0005.pdf")
+    first = session.get_vector_store(paper)
+
+    # the vector store was used by runs, so its expiry moved
+    clock.now += 7 * 24 * 3600 - 60
+    client.vector_stores.last_active[first] = clock.now - 3600
+    assert session.get_vector_store(paper) == first
+    assert len(client.vector_stores.created) == 1
+    assert registry.get(gpt_session.PROVIDER, get_paper_hash(paper)).expires_at == clock.now - 3600 + 7 * 24 * 3600
+
+def test_deleted_vector_store_is_replaced_on_revalidation(tmp_path, client, registry, clock):
+    session = AssistantSession(lambda: client, "asst_1", registry, OPTIONS)
+    paper = create_paper(tmp_path, "0005.pdf")
+    first = session.get_vector_store(paper)
+    client.vector_stores.deleted.add(first)
+
+    # within the revalidate interval the registry is trusted
+    assert session.get_vector_store(paper) == first
+    clock.now += 3601
+    assert session.get_vector_store(paper) != first
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        pass
+
+def run_with(monkeypatch, client, pdf_input):
+    monkeypatch.setattr(gpt, "get_client", lambda: client)
+    monkeypatch.setattr(gpt, "OPENAI_ASSISTANT", {"pdf_input": pdf_input})
+
+def test_file_search_runs_on_the_vector_store(tmp_path, client, registry, monkeypatch):
+    session = AssistantSession(lambda: client, "asst_1", registry, OPTIONS)
+    runs = []
+
+    def create_and_run(assistant_id, thread, tools, temperature):
+        runs.append((assistant_id, thread, tools, temperature))
+        return SimpleNamespace(id="run_1", thread_id="thread_1", status="completed", usage=None, last_error=None)
+
+    message = SimpleNamespace(content=[SimpleNamespace(text=SimpleNamespace(value="1;yes;quote"))])
+    client.beta.threads = SimpleNamespace(create_and_run=create_and_run, messages=SimpleNamespace(list=lambda thread_id: [message]))
+    run_with(monkeypatch, client, "file_search")
+    monkeypatch.setattr(gpt, "_session", session)
+
+    paper = create_paper(tmp_path, "0005.pdf")
+    for _ in range(2):
+        assert gpt.process_pdf_with_openai("prompt", paper, "gpt-4o", 0.5).text == "1;yes;quote"
+
+    vector_store_id = session.get_vector_store(paper)
+    assert runs[0] == ("asst_1", {"messages": [{"role": "user", "content": "prompt"}], "tool_resources": {"file_search": {"vector_store_ids": [vector_store_id]}}}, [{"type": "file_search"}], 0.5)
+    assert len(runs) == 2
+    assert client.beta.assistants.retrieved == 1
+    assert len(client.vector_stores.created) == 1
+
+def test_direct_input_sends_the_pdf_to_the_model(tmp_path, client, monkeypatch):
+    requests = []
+
+    def create(**kwargs):
+        requests.append(kwargs)
+        # the output is streamed, the chunks of the samples arrive interleaved
+        samples = range(kwargs.get("n", 1))
+        chunks = [SimpleNamespace(usage=None, choices=[SimpleNamespace(index=i, delta=SimpleNamespace(content=text))]) for text in ("1;yes;", "x") for i in samples]
+        chunks += [SimpleNamespace(usage=None, choices=[SimpleNamespace(index=i, delta=SimpleNamespace(content=str(i)))]) for i in samples]
+        return FakeStream(chunks)
+
+    client.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+    run_with(monkeypatch, client, "direct")
+
+    response = gpt.process_pdf_with_openai("prompt", create_paper(tmp_path, "0005.pdf"), "gpt-4o", 0.5, samples=3)
+    assert response.samples == ["1;yes;x0", "1;yes;x1", "1;yes;x2"]
+    assert requests[0]["model"] == "gpt-4o" and requests[0]["n"] == 3 and requests[0]["stream"]
+    content = requests[0]["messages"][0]["content"]
+    assert content[0]["file"]["filename"] == "0005.pdf"
+    assert content[0]["file"]["file_data"].startswith("data:application/pdf;base64,")
+    assert content[1] == {"type": "text", "text": "prompt"}
+    assert client.vector_stores.created == []
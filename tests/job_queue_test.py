@@ -0,0 +1,157 @@
+import os
+import subprocess
+import sys
+import threading
+from sep.core.paper2llm.run_writer import RunWriter
+from sep.runner.job_queue import JobQueue, JOB_DONE, JOB_FAILED, JOB_QUEUED
+from sep.runner.models import Run, RunStatus
+from sep.runner.queue_worker import run_paper_queued
+from sep.runner.worker_pool import QueueWorker
+from sep.runner import events
+
+class RecordingEventBus:
+    def __init__(self):
+        self.events = []
+
+    def publish(self, run_id, event_type, **data):
+        self.events.append({"type": event_type, "run_id": run_id, **data})
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def create_papers(tmp_path, count):
+    files = []
+    for i in range(count):
+        file = tmp_path / f"{i:04d}.pdf"
+        file.write_bytes(b"%PDF-1.4")
+        files.append(str(file))
+    return files
+
+PARAMS = {"prompt": "Test Prompt", "model": "test", "temp": 1.0, "pdf_reader": False, "use_cache": True, "resume": False}
+
+def test_jobs_are_leased_once_by_priority(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    queue = JobQueue(path)
+    queue.enqueue("low", [f"low-{i}" for i in range(20)], PARAMS)
+    queue.enqueue("high", ["high-0"], PARAMS, priority=5)
+
+    assert queue.lease("w0").file == "high-0"
+
+    leased = []
+    def _lease():
+        worker_queue = JobQueue(path)
+        while (job := worker_queue.lease(threading.current_thread().name)) is not None:
+            leased.append(job.file)
+        worker_queue.close()
+
+    threads = [threading.Thread(target=_lease) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(leased) == sorted(f"low-{i}" for i in range(20))
+
+def test_expired_leases_are_handed_out_again(tmp_path):
+    clock = FakeClock()
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_timeout=60, max_attempts=2, clock=clock)
+    queue.enqueue("run", ["0001.pdf"], PARAMS)
+
+    crashed = queue.lease("crashed")
+    clock.now += 30
+    assert queue.heartbeat(crashed)
+    clock.now += 59
+    assert queue.lease("other") is None
+
+    clock.now += 2
+    taken_over = queue.lease("other")
+    assert taken_over.attempts == 2
+    assert not queue.heartbeat(crashed)
+    assert not queue.complete(crashed)
+
+    clock.now += 61
+    assert queue.lease("third") is None
+    status, error, _ = queue.get_jobs("run")["0001.pdf"]
+    assert status == JOB_FAILED and error.startswith("LeaseExpired")
+
+def test_cancelled_jobs_lose_their_lease(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    queue.enqueue("run", ["0001.pdf", "0002.pdf"], PARAMS)
+    job = queue.lease("worker")
+
+    assert queue.cancel_run("run") == 2
+    assert not queue.heartbeat(job)
+    assert queue.lease("worker") is None
+
+def test_released_jobs_keep_their_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    queue.enqueue("run", ["0001.pdf"], PARAMS)
+    queue.release(queue.lease("worker"))
+
+    assert queue.get_jobs("run")["0001.pdf"][0] == JOB_QUEUED
+    assert queue.lease("worker").attempts == 1
+
+def test_queued_run_is_processed_by_workers(tmp_path, monkeypatch):
+    event_bus = RecordingEventBus()
+    monkeypatch.setattr(events, "get_event_bus", lambda: event_bus)
+    path = str(tmp_path / "jobs.sqlite3")
+    files = create_papers(tmp_path, 4)
+    missing = str(tmp_path / "missing.pdf")
+    writer = RunWriter.create("test", 1.0, str(tmp_path) + "/")
+    run = Run(id="queued", prompt="Test Prompt", model="test", files=files + [missing])
+
+    worker = QueueWorker(path, threads=2, poll_interval=0.05)
+    worker_thread = threading.Thread(target=worker.run)
+    worker_thread.start()
+    try:
+        run_paper_queued(run, writer=writer, queue_path=path, poll_interval=0.05)
+    finally:
+        worker.shutdown.set()
+        worker_thread.join()
+
+    assert run.status == RunStatus.FINISHED
+    assert run.progress == 1.0
+    assert writer.get_processed_papers() == {"0000", "0001", "0002", "0003"}
+    assert list(run.failed_files) == [missing]
+    assert JobQueue(path).get_jobs("queued") == {}
+    paper_events = [event for event in event_bus.events if event["type"] in (events.PAPER_FINISHED, events.PAPER_FAILED)]
+    assert len(paper_events) == 5 and all(event["latency"] >= 0 for event in paper_events)
+
+def test_stopping_a_queued_run_cancels_its_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    run = Run(id="slow", prompt="Test Prompt", model="test-slow", files=create_papers(tmp_path, 2))
+    stop_event = threading.Event()
+
+    worker = QueueWorker(path, threads=2, heartbeat_interval=0.1, poll_interval=0.05)
+    worker_thread = threading.Thread(target=worker.run)
+    worker_thread.start()
+    timer = threading.Timer(0.5, stop_event.set)
+    timer.start()
+    try:
+        run_paper_queued(run, writer=RunWriter.create("test-slow", 1.0, str(tmp_path) + "/"), stop_event=stop_event, queue_path=path, poll_interval=0.05)
+        assert run.status == RunStatus.CANCELLED
+        assert JobQueue(path).get_jobs("slow") == {}
+        assert worker.processed == 0
+    finally:
+        worker.shutdown.set()
+        worker_thread.join()
+
+def test_worker_processes_share_the_queue(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    files = create_papers(tmp_path, 6)
+    writer = RunWriter.create("test", 1.0, str(tmp_path) + "/")
+    queue = JobQueue(path)
+    queue.enqueue("processes", files, {**PARAMS, "result_path": writer.save_folder})
+
+    env = {**os.environ, "API_GEMINI": "x", "API_GPT": "x", "PYTHONPATH": os.pathsep.join(sys.path)}
+    subprocess.run(
+        [sys.executable, "-m", "sep.runner.worker_pool", "--queue", path, "--processes", "2", "--threads", "2", "--exit-when-idle"],
+        env=env, check=True, timeout=120)
+
+    jobs = queue.get_jobs("processes").values()
+    assert {status for status, _, _ in jobs} == {JOB_DONE}
+    assert all(usage["completion_tokens"] > 0 for _, _, usage in jobs)
+    assert writer.get_processed_papers() == {f"{i:04d}" for i in range(6)}
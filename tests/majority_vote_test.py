@@ -0,0 +1,75 @@
+import json
+import os
+import pytest
+from sep.core.api_request import request_manager
+from sep.core.api_request.usage import ModelResponse
+from sep.core.evaluation.majority_vote import format_vote, majority_vote
+from sep.core.evaluation.parse_csv_answers import parse_csv_string_to_json
+from sep.core.paper2llm.process_paper import process_paper
+from sep.core.paper2llm.run_writer import RunWriter
+
+def get_answer(vote, number):
+    return next(answer for answer in vote if answer["number"] == number)
+
+def test_most_frequent_answer_wins():
+    outputs = [
+        '1;Yes;"first quote"\n2;No;"a"\n',
+        '1;no;"second quote"\n2;No;"b"\n',
+        '1;Yes;"third quote"\n2;Yes;"c"\n',
+    ]
+    vote = majority_vote(outputs)
+
+    first = get_answer(vote, "1")
+    assert (first["answer"], first["quote"]) == ("Yes", "first quote")
+    assert first["agreement"] == pytest.approx(2 / 3)
+    assert get_answer(vote, "2")["answer"] == "No"
+
+def test_ties_go_to_the_first_answer_and_unparsable_outputs_do_not_vote():
+    vote = majority_vote(['1;No;"a"\n', '1;Yes;"b"\n', None, ""])
+    assert get_answer(vote, "1")["answer"] == "No"
+    assert get_answer(vote, "1")["agreement"] == 0.5
+
+def test_formatted_vote_is_parsed_like_a_model_answer():
+    vote = majority_vote(['1;Yes;"a quote; with a semicolon"\n7a;No;"b"\n'] * 2)
+    parsed = {answer["number"]: answer for answer in parse_csv_string_to_json(format_vote(vote))}
+
+    assert parsed["1"]["answer"] == "Yes"
+    assert parsed["1"]["quote"] == "a quote; with a semicolon"
+    assert parsed["7a"]["answer"] == "No"
+
+def test_samples_are_saved_with_the_majority_vote(tmp_path):
+    pdf = tmp_path / "0005.pdf"
+    pdf.write_bytes(b"%PDF-1.4 study")
+    writer = RunWriter(str(tmp_path / "run") + "/")
+
+    single = request_manager.run_prompt_response("Prompt", str(pdf), "test", False, 1.0)
+    output, _ = process_paper("Prompt", "test", str(pdf), writer=writer, samples=3)
+
+    with open(tmp_path / "run" / os.listdir(tmp_path / "run")[0]) as f:
+        saved = json.load(f)
+    assert len(saved["Samples"]) == 3
+    assert saved["Raw_Data"] == output == format_vote(saved["Majority_Vote"])
+    assert "majority vote of 3 samples" in saved["Process_Mode"]
+    # the test model samples like a provider with multi-sampling: the prompt is billed once
+    assert saved["Usage"]["prompt_tokens"] == single.usage.prompt_tokens
+    assert saved["Usage"]["completion_tokens"] == 3 * single.usage.completion_tokens
+
+def test_providers_without_multi_sampling_are_asked_once_per_sample(tmp_path, monkeypatch):
+    calls = []
+    def fake_dispatch(prompt, file_path, model, pdf_reader, temperature, stop_event=None, samples=1):
+        calls.append(samples)
+        return ModelResponse(f'1;{"Yes" if len(calls) < 3 else "No"};"q"\n')
+
+    monkeypatch.setattr(request_manager, "supports_multi_sampling", lambda model, pdf_reader: False)
+    monkeypatch.setattr(request_manager, "_dispatch_prompt", fake_dispatch)
+    response = request_manager.run_prompt_response("Prompt", None, "test", False, 1.0, samples=3)
+
+    assert calls == [1, 1, 1]
+    assert len(response.samples) == 3
+    assert get_answer(majority_vote(response.samples), "1")["answer"] == "Yes"
+
+def test_invalid_number_of_samples_is_rejected(tmp_path):
+    pdf = tmp_path / "0005.pdf"
+    pdf.write_bytes(b"%PDF-1.4 study")
+    with pytest.raises(ValueError):
+        process_paper("Prompt", "test", str(pdf), writer=RunWriter(str(tmp_path) + "/"), samples=0)
@@ -0,0 +1,49 @@
+import pytest
+from sep.core.services.metrics import Counter, Histogram, MetricsRegistry, STAGE_DURATION, observe_stage
+
+def test_counter_render():
+    counter = Counter("sep_test_total", "Test counter.", ("model", "status"))
+    counter.inc(model="gpt-4o", status="success")
+    counter.inc(2, model="gpt-4o", status="success")
+    counter.inc(model='say "hi"', status="error")
+
+    assert counter.get(model="gpt-4o", status="success") == 3
+    assert counter.render().splitlines() == [
+        "# HELP sep_test_total Test counter.",
+        "# TYPE sep_test_total counter",
+        'sep_test_total{model="gpt-4o",status="success"} 3.0',
+        'sep_test_total{model="say \\"hi\\"",status="error"} 1.0',
+    ]
+
+def test_counter_requires_all_labels():
+    counter = Counter("sep_test_total", "Test counter.", ("model", "status"))
+    with pytest.raises(ValueError):
+        counter.inc(model="gpt-4o")
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("sep_test_seconds", "Test histogram.", ("model",), buckets=(1, 5))
+    for value in (0.5, 2, 10):
+        histogram.observe(value, model="test")
+
+    lines = histogram.render().splitlines()[2:]
+    assert lines == [
+        'sep_test_seconds_bucket{model="test",le="1"} 1',
+        'sep_test_seconds_bucket{model="test",le="5"} 2',
+        'sep_test_seconds_bucket{model="test",le="+Inf"} 3',
+        'sep_test_seconds_sum{model="test"} 12.5',
+        'sep_test_seconds_count{model="test"} 3',
+    ]
+
+def test_registry_rejects_duplicate_names():
+    registry = MetricsRegistry()
+    registry.register(Counter("sep_test_total", "Test counter."))
+    with pytest.raises(ValueError):
+        registry.register(Counter("sep_test_total", "Test counter."))
+
+def test_observe_stage_also_measures_failures():
+    before = STAGE_DURATION.get_count(provider="test", model="test-exception", stage="upload")
+    with pytest.raises(RuntimeError):
+        with observe_stage("upload", "test-exception"):
+            raise RuntimeError("upload failed")
+
+    assert STAGE_DURATION.get_count(provider="test", model="test-exception", stage="upload") == before + 1
@@ -0,0 +1,61 @@
+import threading
+import time
+from sep.core.services.paper_cache import PaperCache
+
+def create_paper(tmp_path, name, content=b"%PDF-1.4 test"):
+    file = tmp_path / name
+    file.write_bytes(content)
+    return str(file)
+
+class CountingExtractor:
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def __call__(self, file_path):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return f"text of {file_path}"
+
+def test_text_is_extracted_once_for_concurrent_callers(tmp_path):
+    extract = CountingExtractor(delay=0.1)
+    cache = PaperCache(extract=extract)
+    file = create_paper(tmp_path, "0005.pdf")
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_text(file))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert extract.calls == 1
+    assert results == [f"text of {file}"] * 5
+
+def test_hash_depends_on_content(tmp_path):
+    cache = PaperCache()
+    first = create_paper(tmp_path, "0005.pdf", b"first")
+    second = create_paper(tmp_path, "0013.pdf", b"first")
+    assert cache.get_hash(first) == cache.get_hash(second)
+
+    # a changed file is prepared again
+    create_paper(tmp_path, "0013.pdf", b"second content")
+    assert cache.get_hash(first) != cache.get_hash(second)
+
+def test_least_recently_used_papers_are_dropped(tmp_path):
+    extract = CountingExtractor()
+    cache = PaperCache(max_entries=2, extract=extract)
+    files = [create_paper(tmp_path, f"{i:04d}.pdf") for i in range(3)]
+
+    cache.get_text(files[0])
+    cache.get_text(files[1])
+    cache.get_text(files[0])
+    cache.get_text(files[2])
+    assert extract.calls == 3
+
+    cache.get_text(files[0])
+    assert extract.calls == 3
+    cache.get_text(files[1])
+    assert extract.calls == 4
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+import pytest
+from types import SimpleNamespace
+from sep.core.api_request import providers
+from sep.core.api_request import request_manager
+from sep.core.api_request.providers import BUILTIN_PLUGINS, ProviderFunctions, ProviderPlugin, ProviderRegistry
+from sep.core.api_request.usage import ModelResponse
+
+@pytest.fixture
+def registry():
+    return ProviderRegistry(BUILTIN_PLUGINS)
+
+def test_models_are_matched_by_the_longest_pattern(registry):
+    assert registry.match("gemini-2.5-pro").name == "gemini"
+    assert registry.match("GPT-4o").name == "openai"
+    assert registry.match("o1-preview").name == "openai"
+    assert registry.match("deepseek-chat").name == "deepseek"
+    assert registry.match("deepseek-r1:14b").name == "custom"
+    assert registry.match("test-slow").name == "test"
+    with pytest.raises(ValueError, match="Unsupported model"):
+        registry.match("llama-3")
+
+def test_input_modes(registry):
+    assert registry.get_functions("gpt-4o", True).process.endswith("deepseek:process_text_with_openai")
+    assert registry.get_functions("gpt-4o", False).process.endswith("gpt:process_pdf_with_openai")
+    with pytest.raises(ValueError, match="with a PDF reader"):
+        registry.get_functions("gemini-2.5-pro", True)
+    with pytest.raises(ValueError, match="without a PDF reader"):
+        registry.get_functions("o1-preview", False)
+    assert registry.get_functions("test", False).supports_multi_sampling()
+    assert not registry.get_functions("deepseek-chat", True).supports_multi_sampling()
+
+def test_importing_the_request_manager_does_not_load_the_sdks():
+    code = "import sys, sep.core.api_request.request_manager; print('openai' in sys.modules, 'google.genai' in sys.modules)"
+    env = {**os.environ, "PYTHONPATH": "src"}
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    assert result.stdout.split() == ["False", "False"]
+
+def test_plugins_of_the_entry_points_are_registered(registry, monkeypatch):
+    plugin = ProviderPlugin("local", ("llama*",), text=ProviderFunctions("local:process", "local:process_async"))
+    entry_points = [
+        SimpleNamespace(name="local", value="local_plugin:plugins", load=lambda: (lambda: [plugin])),
+        SimpleNamespace(name="broken", value="broken:plugin", load=lambda: (_ for _ in ()).throw(ImportError("missing"))),
+    ]
+    monkeypatch.setattr(providers, "entry_points", lambda group: entry_points)
+
+    registry.load_entry_points()
+    assert registry.match("llama-3").name == "local"
+    assert plugin in registry.plugins
+
+def test_requests_are_sent_to_a_registered_plugin(registry, monkeypatch):
+    calls = []
+
+    def process(prompt, file_path, model, temperature, stop_event=None):
+        calls.append(model)
+        return ModelResponse(f"answer of {model}")
+
+    registry.register(ProviderPlugin("test", ("test-plugin*",), pdf=ProviderFunctions(process, process)))
+    monkeypatch.setattr(request_manager, "get_provider_registry", lambda: registry)
+
+    assert request_manager.run_prompt("prompt", None, "test-plugin", False, 0.5, use_cache=False) == "answer of test-plugin"
+    assert calls == ["test-plugin"]
@@ -0,0 +1,79 @@
+import pytest
+from sep.core.api_request import rate_limiter as rl
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+def test_token_bucket_refills_per_minute():
+    clock = FakeClock()
+    bucket = rl.TokenBucket(60, clock)
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+    clock.sleep(30)
+    bucket.refill()
+    assert bucket.tokens == pytest.approx(30)
+
+def test_acquire_waits_for_request_budget():
+    clock = FakeClock()
+    limiter = rl.ProviderRateLimiter("gemini", rpm=2, clock=clock, sleep=clock.sleep)
+
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.now == 0
+
+    limiter.acquire()
+    assert clock.now == pytest.approx(30, abs=1)
+
+def test_acquire_waits_for_token_budget():
+    clock = FakeClock()
+    limiter = rl.ProviderRateLimiter("openai", rpm=100, tpm=1000, clock=clock, sleep=clock.sleep)
+
+    limiter.acquire(tokens=1000)
+    limiter.acquire(tokens=500)
+    assert clock.now == pytest.approx(30, abs=1)
+
+def test_throttling_backs_off_and_recovers():
+    clock = FakeClock()
+    limiter = rl.ProviderRateLimiter("gemini", rpm=60, clock=clock, sleep=clock.sleep)
+
+    with pytest.raises(FakeRateLimitError):
+        with limiter.limit():
+            raise FakeRateLimitError()
+    assert limiter.factor == 0.5
+    assert limiter.cooldown_until == rl.DEFAULT_COOLDOWN
+
+    limiter.acquire()
+    assert clock.now >= rl.DEFAULT_COOLDOWN
+
+    for _ in range(20):
+        with limiter.limit():
+            pass
+    assert limiter.factor == 1.0
+
+def test_other_errors_do_not_back_off():
+    limiter = rl.ProviderRateLimiter("gemini", rpm=60)
+
+    with pytest.raises(ValueError):
+        with limiter.limit():
+            raise ValueError("not a rate limit")
+    assert limiter.factor == 1.0
+
+def test_is_rate_limit_error():
+    class GeminiError(Exception):
+        code = 429
+        status = "RESOURCE_EXHAUSTED"
+
+    assert rl.is_rate_limit_error(FakeRateLimitError())
+    assert rl.is_rate_limit_error(GeminiError())
+    assert not rl.is_rate_limit_error(ValueError())
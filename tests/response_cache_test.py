@@ -0,0 +1,102 @@
+import json
+import os
+import pytest
+from sep.core.api_request import request_manager, response_cache
+from sep.core.api_request.response_cache import ResponseCache, make_cache_key
+from sep.core.paper2llm.process_paper import process_paper
+from sep.core.paper2llm.run_writer import RunWriter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def pdf(tmp_path):
+    file = tmp_path / "0005.pdf"
+    file.write_bytes(b"%PDF-1.4 study")
+    return str(file)
+
+def test_key_depends_on_all_inputs(pdf, tmp_path):
+    key = make_cache_key("gpt-4o", 0.0, "Prompt", pdf, False)
+    assert key == make_cache_key("gpt-4o", 0.0, "Prompt", pdf, False)
+
+    other_pdf = tmp_path / "0013.pdf"
+    other_pdf.write_bytes(b"%PDF-1.4 other study")
+    assert key != make_cache_key("gpt-4o", 0.0, "Prompt", str(other_pdf), False)
+    assert key != make_cache_key("gpt-4o", 0.5, "Prompt", pdf, False)
+    assert key != make_cache_key("gpt-4o-mini", 0.0, "Prompt", pdf, False)
+    assert key != make_cache_key("gpt-4o", 0.0, "Other Prompt", pdf, False)
+    assert key != make_cache_key("gpt-4o", 0.0, "Prompt", pdf, True)
+
+def test_entries_expire_after_ttl(tmp_path):
+    clock = FakeClock()
+    cache = ResponseCache(str(tmp_path / "cache"), ttl=60, clock=clock)
+    cache.put("abc", "1;yes;quote")
+
+    clock.now += 59
+    assert cache.get("abc") == "1;yes;quote"
+    clock.now += 2
+    assert cache.get("abc") is None
+    assert cache.size() == 0
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    clock = FakeClock()
+    cache = ResponseCache(str(tmp_path / "cache"), ttl=None, max_bytes=10_000, clock=clock)
+    for key in ("a1", "b1", "c1"):
+        clock.now += 1
+        cache.put(key, "x" * 3000)
+
+    clock.now += 1
+    assert cache.get("a1") is not None
+    clock.now += 1
+    cache.put("d1", "x" * 3000)
+
+    assert cache.get("b1") is None
+    assert all(cache.get(key) is not None for key in ("a1", "c1", "d1"))
+    assert cache.size() <= 10_000
+
+def test_index_is_rebuilt_from_disk(tmp_path):
+    ResponseCache(str(tmp_path / "cache")).put("abc", "1;yes;quote")
+    assert ResponseCache(str(tmp_path / "cache")).get("abc") == "1;yes;quote"
+
+def test_entries_of_other_processes_are_found(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache"))
+    assert cache.get("abc") is None
+    # another process stores the entry after the index of this cache was loaded
+    ResponseCache(str(tmp_path / "cache")).put("abc", "1;yes;quote")
+    assert cache.get("abc") == "1;yes;quote"
+    assert cache.size() > 0
+
+def test_process_paper_marks_cached_outputs(pdf, tmp_path, monkeypatch):
+    monkeypatch.setattr(request_manager, "get_response_cache", lambda: ResponseCache(str(tmp_path / "cache")))
+    monkeypatch.setattr(response_cache, "UNCACHED_PROVIDERS", set())
+    writer = RunWriter(str(tmp_path / "run") + "/")
+
+    first, _ = process_paper("Prompt", "test", pdf, temp=0, writer=writer)
+    second, _ = process_paper("Prompt", "test", pdf, temp=0, writer=RunWriter(str(tmp_path / "run2") + "/"))
+    bypassed, _ = process_paper("Prompt", "test", pdf, temp=0, writer=RunWriter(str(tmp_path / "run3") + "/"), use_cache=False)
+
+    assert second == first
+    cached_flags = []
+    for folder in ("run", "run2", "run3"):
+        [raw_file] = os.listdir(tmp_path / folder)
+        with open(tmp_path / folder / raw_file) as f:
+            cached_flags.append(json.load(f)["Cached"])
+    assert cached_flags == [False, True, False]
+
+def test_sampled_requests_are_not_served_from_cache(pdf, tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "cache"))
+    monkeypatch.setattr(request_manager, "get_response_cache", lambda: cache)
+    monkeypatch.setattr(response_cache, "UNCACHED_PROVIDERS", set())
+
+    responses = [request_manager.run_prompt_response("Prompt", pdf, "test", False, 0.7, stream=False) for _ in range(2)]
+    assert [response.cached for response in responses] == [False, False]
+    assert cache.get(make_cache_key("test", 0.7, "Prompt", pdf, False)) is None
+
+    # max_temperature null caches every temperature
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE", {"max_temperature": None})
+    responses = [request_manager.run_prompt_response("Prompt", pdf, "test", False, 0.7, stream=False) for _ in range(2)]
+    assert [response.cached for response in responses] == [False, True]
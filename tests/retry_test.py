@@ -0,0 +1,95 @@
+import pytest
+from sep.core.api_request.retry import CircuitBreaker, RetryPolicy, call_with_retry, is_retryable_error
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+def flaky(failures, error):
+    """Returns a function that raises the error the given number of times, then returns 'ok'."""
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return "ok"
+
+    return call, calls
+
+NO_DELAY = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+
+def test_is_retryable_error():
+    assert is_retryable_error(TimeoutError())
+    assert is_retryable_error(StatusError(503))
+    assert is_retryable_error(StatusError(429))
+    assert not is_retryable_error(StatusError(400))
+    assert not is_retryable_error(ValueError("Unsupported model"))
+
+def test_retries_transient_errors():
+    call, calls = flaky(2, StatusError(500))
+    assert call_with_retry(call, CircuitBreaker("test"), NO_DELAY) == "ok"
+    assert len(calls) == 3
+
+def test_gives_up_after_max_attempts():
+    call, calls = flaky(5, StatusError(502))
+    with pytest.raises(StatusError):
+        call_with_retry(call, CircuitBreaker("test"), NO_DELAY)
+    assert len(calls) == 3
+
+def test_does_not_retry_permanent_errors():
+    call, calls = flaky(1, ValueError("invalid"))
+    with pytest.raises(ValueError):
+        call_with_retry(call, CircuitBreaker("test"), NO_DELAY)
+    assert len(calls) == 1
+
+def test_backoff_grows_and_respects_retry_after():
+    policy = RetryPolicy(max_attempts=5, base_delay=1, max_delay=10)
+    assert all(0 <= policy.get_delay(1) <= 1 for _ in range(20))
+    assert all(0 <= policy.get_delay(4) <= 8 for _ in range(20))
+    assert all(policy.get_delay(10) <= 10 for _ in range(20))
+    assert policy.get_delay(1, retry_after=30) == 30
+
+def test_circuit_breaker_opens_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker._try_enter() == 60
+
+    clock.now = 61
+    assert breaker._try_enter() == 0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # only one trial request at a time
+    assert breaker._try_enter() > 0
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 122
+    assert breaker._try_enter() == 0
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker._try_enter() == 0
+
+def test_rate_limit_errors_do_not_open_the_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=2)
+    call, calls = flaky(2, StatusError(429))
+    assert call_with_retry(call, breaker, NO_DELAY) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    call, calls = flaky(2, StatusError(503))
+    with pytest.raises(StatusError):
+        call_with_retry(call, breaker, RetryPolicy(max_attempts=2, base_delay=0, max_delay=0))
+    assert breaker.state == CircuitBreaker.OPEN
@@ -0,0 +1,125 @@
+import threading
+import time
+import pytest
+from types import SimpleNamespace
+from datetime import datetime
+from sep.core.paper2llm.run_writer import RunWriter
+from sep.runner import manager as manager_module
+from sep.runner.manager import RunManager
+from sep.runner.models import Run, RunStatus
+from sep.runner.store import RunStore
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def create_papers(tmp_path, count):
+    files = []
+    for i in range(count):
+        file = tmp_path / f"{i:04d}.pdf"
+        file.write_bytes(b"%PDF-1.4")
+        files.append(str(file))
+    return files
+
+def wait_until_done(manager, timeout=5):
+    deadline = time.monotonic() + timeout
+    while (manager.threads or manager.tasks) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not manager.threads and not manager.tasks
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def manager(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(manager_module.RunWriter, "create", classmethod(lambda cls, model, temp: RunWriter(str(tmp_path / f"{model}-temp{temp}") + "/")))
+    manager = RunManager(RunStore(str(tmp_path / "runs.sqlite3")), finished_run_ttl=60, max_summaries=2, cleanup_interval=0, clock=clock)
+    yield manager
+    manager.close()
+
+def test_bookkeeping_is_removed_when_run_is_done(tmp_path, manager):
+    run = manager.start_run("Test Prompt", "test", create_papers(tmp_path, 2))
+    wait_until_done(manager)
+
+    assert run.status == RunStatus.FINISHED
+    assert manager.stop_events == {}
+    assert manager.get_run(run.id) is run
+    assert manager.store.get(run.id).status == RunStatus.FINISHED
+
+def test_finished_runs_are_archived_after_ttl(tmp_path, manager, clock):
+    run = manager.start_run("Test Prompt", "test", create_papers(tmp_path, 1))
+    wait_until_done(manager)
+
+    clock.now = 59
+    assert manager.evict_finished() == 0
+    assert run.id in manager.runs
+
+    clock.now = 60
+    assert manager.evict_finished() == 1
+    assert run.id not in manager.runs
+
+    summary = manager.get_summary(run.id)
+    assert summary.status == RunStatus.FINISHED
+    assert summary.progress == 1.0
+    assert isinstance(summary.finished_at, datetime)
+    # the full run is read from the store after it was archived
+    stored = manager.get_run(run.id)
+    assert stored is not run
+    assert stored.prompt == "Test Prompt"
+
+def test_summaries_are_capped(manager, clock):
+    for i in range(3):
+        run = Run(id=f"run-{i}", prompt="Test Prompt", model="test", files=[], status=RunStatus.FINISHED)
+        manager.runs[run.id] = run
+        manager._on_finished(run.id)
+        clock.now += 1
+        manager.evict_finished(max_age=0)
+
+    assert [summary.id for summary in manager.list_summaries()] == ["run-2", "run-1"]
+    assert manager.get_summary("run-0") is None
+    assert manager.get_run("run-0").status == RunStatus.FINISHED
+
+def test_summary_has_no_instance_dict(manager, clock):
+    run = Run(id="a", prompt="Test Prompt" * 1000, model="test", files=["0005.pdf"] * 100, status=RunStatus.FINISHED)
+    manager.runs[run.id] = run
+    manager._on_finished(run.id)
+    manager.evict_finished(max_age=0)
+
+    summary = manager.get_summary("a")
+    assert not hasattr(summary, "__dict__")
+    assert summary.to_dict()["id"] == "a"
+
+def test_fanout_starts_one_run_per_configuration(tmp_path, manager):
+    files = create_papers(tmp_path, 2)
+    runs = manager.start_fanout("Test Prompt", [("test", 0.0), ("test", 1.0)], files, max_concurrency=2)
+    wait_until_done(manager)
+
+    assert [run.model for run in runs] == ["test", "test"]
+    assert all(run.status == RunStatus.FINISHED for run in runs)
+    assert runs[0].result_path != runs[1].result_path
+    for run in runs:
+        assert RunWriter(run.result_path).get_processed_papers() == {"0000", "0001"}
+
+def test_fanout_rejects_invalid_configurations(manager):
+    with pytest.raises(ValueError):
+        manager.start_fanout("Test Prompt", [], ["0005.pdf"])
+    with pytest.raises(ValueError):
+        manager.start_fanout("Test Prompt", [("test", 1.0), ("test", 1.0)], ["0005.pdf"])
+    with pytest.raises(ValueError):
+        manager.start_fanout("Test Prompt", [("test", 1.0), ("unknown-model", 1.0)], ["0005.pdf"])
+    assert manager.runs == {}
+
+def test_stop_run_only_cancels_scheduled_runs(manager, monkeypatch):
+    cancelled = []
+    monkeypatch.setattr(manager_module, "get_scheduler", lambda: SimpleNamespace(cancel_run=cancelled.append))
+    manager.stop_events = {"batch": threading.Event(), "threaded": threading.Event()}
+    manager.scheduled.add("threaded")
+
+    manager.stop_run("batch")
+    manager.stop_run("threaded")
+    assert cancelled == ["threaded"]
+    assert all(stop_event.is_set() for stop_event in manager.stop_events.values())
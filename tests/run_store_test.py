@@ -0,0 +1,75 @@
+import sqlite3
+import pytest
+from datetime import datetime, timedelta
+from sep.core.api_request.usage import Usage
+from sep.runner.models import Run, RunStatus
+from sep.runner.store import RunStore
+
+def create_run(run_id, model="test", status=RunStatus.FINISHED, minutes=0):
+    return Run(
+        id=run_id,
+        prompt="Test Prompt",
+        model=model,
+        files=["0005.pdf", "0013.pdf"],
+        created_at=datetime(2025, 1, 1) + timedelta(minutes=minutes),
+        status=status,
+    )
+
+@pytest.fixture
+def store(tmp_path):
+    return RunStore(str(tmp_path / "runs.sqlite3"))
+
+def test_save_and_get(store):
+    run = create_run("a")
+    store.save(run)
+
+    run.progress = 0.5
+    run.result_path = "data/output/runs/main/test/"
+    run.failed_files = {"0013.pdf": "Response status-code: 503"}
+    run.usage = Usage(prompt_tokens=12000, completion_tokens=800, cached_tokens=1000, cost=0.0355)
+    run.batch_id = "batch_1"
+    run.batch_files = {"0": "0005.pdf", "1": "0013.pdf"}
+    store.save(run)
+
+    loaded = store.get("a")
+    assert loaded == run
+    assert store.get("missing") is None
+
+def test_list_filters_and_paginates(store):
+    store.save(create_run("a", minutes=1))
+    store.save(create_run("b", model="gemini-2.5-pro", minutes=2))
+    store.save(create_run("c", status=RunStatus.FAILED, minutes=3))
+
+    assert [run.id for run in store.list()] == ["c", "b", "a"]
+    assert [run.id for run in store.list(limit=2, offset=1)] == ["b", "a"]
+    assert [run.id for run in store.list(status=RunStatus.FINISHED)] == ["b", "a"]
+    assert [run.id for run in store.list(model="gemini-2.5-pro")] == ["b"]
+
+def test_mark_interrupted(store):
+    store.save(create_run("a", status=RunStatus.RUNNING))
+    store.save(create_run("b", status=RunStatus.PENDING))
+    store.save(create_run("c"))
+
+    assert store.mark_interrupted() == 2
+    assert store.get("a").status == RunStatus.FAILED
+    assert store.get("c").status == RunStatus.FINISHED
+
+def test_runs_survive_reopening(tmp_path):
+    path = str(tmp_path / "runs.sqlite3")
+    RunStore(path).save(create_run("a"))
+
+    assert RunStore(path).get("a").model == "test"
+
+def test_adds_missing_columns_to_old_databases(tmp_path):
+    path = str(tmp_path / "runs.sqlite3")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE runs (id TEXT PRIMARY KEY, prompt TEXT NOT NULL, model TEXT NOT NULL, files TEXT NOT NULL, "
+                       "created_at TEXT NOT NULL, status TEXT NOT NULL, progress REAL NOT NULL, message TEXT, result_path TEXT)")
+    connection.commit()
+    connection.close()
+
+    store = RunStore(path)
+    store.save(create_run("a"))
+    assert store.get("a").failed_files == {}
+    assert store.get("a").usage == Usage()
+    assert store.get("a").batch_id is None and store.get("a").batch_files == {}
@@ -0,0 +1,39 @@
+import pytest
+from sep.core.paper2llm.run_writer import RunWriter, get_paper_name
+
+def save_paper(writer, pdf_name):
+    writer.save(
+        raw_data="1;yes;quote",
+        pdf_name=pdf_name,
+        model_name="test",
+        temp=1.0,
+        pdf_reader=False,
+        pdf_reader_version="-",
+        process_mode="process full pdf in single request",
+        prompt="Test Prompt")
+
+def test_create_uses_new_folder_per_run(tmp_path):
+    base_folder = str(tmp_path) + "/"
+    writer1 = RunWriter.create("test", 1.0, base_folder)
+    writer2 = RunWriter.create("test", 1.0, base_folder)
+
+    assert writer1.save_folder != writer2.save_folder
+    assert writer1.save_folder.startswith(base_folder + "test-temp1.0-")
+
+def test_get_processed_papers(tmp_path):
+    writer = RunWriter.create("test", 1.0, str(tmp_path) + "/")
+    save_paper(writer, "0005.pdf")
+    save_paper(writer, "0013.pdf")
+    with open(writer.save_folder + "notes.txt", "w") as f:
+        f.write("not a raw output")
+
+    assert writer.get_processed_papers() == {"0005", "0013"}
+    assert writer.has_output("papers/0005.pdf")
+    assert not writer.has_output("papers/0019.pdf")
+
+def test_get_processed_papers_without_folder(tmp_path):
+    writer = RunWriter(str(tmp_path / "missing") + "/")
+    assert writer.get_processed_papers() == set()
+
+def test_get_paper_name():
+    assert get_paper_name("data/input/pdfs/main/0005.pdf") == "0005"
@@ -0,0 +1,92 @@
+import threading
+import time
+import pytest
+from concurrent.futures import wait
+from sep.runner.scheduler import Scheduler
+
+def start_blocker(scheduler, run_id):
+    """Occupies a worker until the returned event is set."""
+    started = threading.Event()
+    release = threading.Event()
+
+    def block():
+        started.set()
+        return release.wait()
+
+    future = scheduler.submit(run_id, "test", block)
+    started.wait(timeout=5)
+    return release, future
+
+class ConcurrencyProbe:
+    """Records the highest number of tasks that were running at the same time."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def task(self, value=None):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        return value
+
+def test_submit_returns_result():
+    scheduler = Scheduler(max_workers=2)
+    scheduler.register_run("run")
+
+    future = scheduler.submit("run", "test", lambda a, b: a + b, 1, b=2)
+    assert future.result(timeout=5) == 3
+
+def test_submit_requires_registered_run():
+    scheduler = Scheduler(max_workers=1)
+    with pytest.raises(KeyError):
+        scheduler.submit("unknown", "test", print)
+
+def test_run_and_provider_limits():
+    run_probe = ConcurrencyProbe()
+    provider_probe = ConcurrencyProbe()
+    scheduler = Scheduler(max_workers=8, provider_limits={"gemini": 2})
+    scheduler.register_run("a", max_concurrency=3)
+    scheduler.register_run("b", max_concurrency=8)
+    scheduler.register_run("c", max_concurrency=8)
+
+    futures = [scheduler.submit("a", "test", run_probe.task) for _ in range(10)]
+    futures += [scheduler.submit(run_id, "gemini-2.5-pro", provider_probe.task) for run_id in "bc" for _ in range(5)]
+    wait(futures, timeout=10)
+
+    assert all(future.done() for future in futures)
+    assert run_probe.max_active == 3
+    assert provider_probe.max_active == 2
+
+def test_priority_and_fair_share():
+    scheduler = Scheduler(max_workers=1)
+    order = []
+
+    scheduler.register_run("blocker")
+    blocker, _ = start_blocker(scheduler, "blocker")
+
+    for run_id, priority in (("low", 0), ("fair", 0), ("high", 1)):
+        scheduler.register_run(run_id, priority=priority)
+    futures = [scheduler.submit(run_id, "test", order.append, run_id) for run_id in ("low", "low", "fair", "fair", "high")]
+
+    blocker.set()
+    wait(futures, timeout=5)
+    assert order == ["high", "low", "fair", "low", "fair"]
+
+def test_cancel_run_cancels_queued_tasks():
+    scheduler = Scheduler(max_workers=1)
+    scheduler.register_run("run")
+    blocker, running = start_blocker(scheduler, "run")
+    queued = [scheduler.submit("run", "test", print) for _ in range(3)]
+
+    assert scheduler.cancel_run("run") == 3
+    assert all(future.cancelled() for future in queued)
+    done, _ = wait(queued, timeout=1)
+    assert len(done) == 3
+
+    blocker.set()
+    assert running.result(timeout=5) is True
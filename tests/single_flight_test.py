@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+import pytest
+from sep.core.api_request import mock_api, request_manager, response_cache
+from sep.core.api_request.cancellation import RequestCancelled
+from sep.core.api_request.single_flight import AsyncSingleFlight, SingleFlight
+from sep.core.services.metrics import REQUESTS
+
+def run_threads(count, target):
+    results, errors = [], []
+
+    def _run():
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+def test_concurrent_calls_share_one_call():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "output"
+
+    threads, results, errors = run_threads(4, lambda: flights.do("key", fn))
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(results) == [("output", False)] + [("output", True)] * 3
+    assert not errors
+    assert flights.in_flight() == 0
+
+def test_error_is_passed_to_all_waiters():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait(5)
+        raise ValueError("invalid request")
+
+    threads, results, errors = run_threads(3, lambda: flights.do("key", fn))
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert not results
+    assert len(errors) == 3 and all(isinstance(e, ValueError) for e in errors)
+
+def test_waiter_sends_request_again_if_sender_is_cancelled():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def cancelled():
+        calls.append("cancelled")
+        release.wait(5)
+        raise RequestCancelled()
+
+    def fn():
+        calls.append("fn")
+        return "output"
+
+    leader = threading.Thread(target=lambda: pytest.raises(RequestCancelled, flights.do, "key", cancelled))
+    leader.start()
+    time.sleep(0.1)
+    threads, results, errors = run_threads(1, lambda: flights.do("key", fn))
+    time.sleep(0.1)
+    release.set()
+    leader.join()
+    threads[0].join()
+
+    assert calls == ["cancelled", "fn"]
+    assert results == [("output", False)]
+
+def test_cancelled_waiter_does_not_abort_the_others():
+    async def main():
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.2)
+            return "output"
+
+        first = asyncio.create_task(flights.do("key", fn))
+        second = asyncio.create_task(flights.do("key", fn))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        result = await second
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return calls, result, flights.in_flight()
+
+    calls, result, in_flight = asyncio.run(main())
+    assert calls == [1]
+    assert result == ("output", True)
+    assert in_flight == 0
+
+def test_request_is_cancelled_without_waiters():
+    async def main():
+        flights = AsyncSingleFlight()
+        finished = []
+
+        async def fn():
+            await asyncio.sleep(0.2)
+            finished.append(1)
+
+        waiter = asyncio.create_task(flights.do("key", fn))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await asyncio.sleep(0.3)
+        return finished, flights.in_flight()
+
+    assert asyncio.run(main()) == ([], 0)
+
+def test_identical_prompts_are_sent_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "UNCACHED_PROVIDERS", set())
+    monkeypatch.setattr(request_manager, "get_response_cache", lambda: None)
+    monkeypatch.setattr(mock_api, "SLOW_RESPONSE_TIME", 0.3)
+    pdf = tmp_path / "0005.pdf"
+    pdf.write_bytes(b"%PDF-1.4 study")
+
+    async def main():
+        return await asyncio.gather(
+            *(request_manager.run_prompt_async("Prompt", str(pdf), "test-slow", False, 0.0) for _ in range(3)),
+            request_manager.run_prompt_async("Prompt", str(pdf), "test-slow", False, 0.0, use_cache=False))
+
+    before = REQUESTS.get(provider="test", model="test-slow", status="success")
+    outputs = asyncio.run(main())
+    assert len(set(outputs[:3])) == 1
+    assert REQUESTS.get(provider="test", model="test-slow", status="success") - before == 2
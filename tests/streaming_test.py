@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+from sep.core.api_request import request_manager
+from sep.core.api_request.mock_api import get_test_text
+from sep.core.api_request.providers import ProviderFunctions, ProviderPlugin, ProviderRegistry
+from sep.core.api_request.streaming import StreamObserver, consume_chat_stream, STOP_COMPLETE, STOP_MAX_CHARS
+from sep.core.api_request.usage import ModelResponse
+from sep.core.evaluation.parse_csv_answers import IncrementalCsvParser, VALID_QUESTION_NUMBERS, parse_csv_string_to_json
+
+ANSWER = "".join(f'{number};yes;"quote {number}"\n' for number in VALID_QUESTION_NUMBERS)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def test_parser_returns_the_completed_lines():
+    parser = IncrementalCsvParser()
+    assert parser.feed("1;yes;some ") == []
+    assert parser.feed("quote\n2;n") == [{"number": "1", "answer": "yes", "quote": "some quote"}]
+    assert parser.feed("o;other\n") == [{"number": "2", "answer": "no", "quote": "other"}]
+    assert parser.feed("3;yes;no line break") == []
+    assert parser.close() == [{"number": "3", "answer": "yes", "quote": "no line break"}]
+    assert not parser.is_complete()
+
+def test_parser_keeps_line_breaks_in_quotes():
+    parser = IncrementalCsvParser(expected=["1", "2"])
+    assert parser.feed('1;yes;"first line\nsecond line"\n') == [{"number": "1", "answer": "yes", "quote": "first line\nsecond line"}]
+    parser.feed("2;no;quote\n")
+    assert parser.is_complete()
+
+def test_parser_matches_the_full_parser():
+    parser = IncrementalCsvParser()
+    for i in range(0, len(ANSWER), 7):
+        parser.feed(ANSWER[i:i + 7])
+    parser.close()
+    assert parser.is_complete()
+    assert list(parser.answers.values()) == parse_csv_string_to_json(ANSWER)
+
+def test_observer_stops_when_every_question_is_answered():
+    clock = FakeClock()
+    observer = StreamObserver(stop_when_complete=True, max_chars=0, clock=clock)
+    lines = ANSWER.splitlines(keepends=True)
+    clock.now += 0.5
+    assert all(observer.on_text(line) for line in lines[:-1])
+    clock.now += 2
+    assert not observer.on_text(lines[-1])
+
+    response = observer.finish(ModelResponse(ANSWER), "test")
+    assert (response.ttft, response.ttlt, response.stop_reason) == (0.5, 2.5, STOP_COMPLETE)
+
+def test_observer_caps_runaway_outputs():
+    observer = StreamObserver(stop_when_complete=True, max_chars=10)
+    assert observer.on_text("12345")
+    assert not observer.on_text("67890")
+    assert observer.stop_reason == STOP_MAX_CHARS
+
+class FakeStream:
+    def __init__(self, texts, usage):
+        self.chunks = [SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))]) for text in texts]
+        self.chunks.append(SimpleNamespace(usage=usage, choices=[]))
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+def test_chat_stream_is_closed_when_stopped():
+    usage = SimpleNamespace(prompt_tokens=10, completion_tokens=3, prompt_tokens_details=None)
+    stream = FakeStream(["a", "b", "c"], usage)
+    response = consume_chat_stream(stream, lambda text: True)
+    assert response.text == "abc" and response.usage.completion_tokens == 3 and stream.closed
+
+    stream = FakeStream(["a", "b", "c"], usage)
+    response = consume_chat_stream(stream, lambda text: text != "b")
+    assert response.text == "ab" and stream.read == 2 and stream.closed
+
+def test_run_prompt_streams_the_test_model():
+    response = request_manager.run_prompt_response("prompt", None, "test", False, 0.5, use_cache=False, stream=True)
+    assert response.text.splitlines()[:3] == get_test_text("test", 0.5).splitlines()[:3]
+    assert response.ttft is not None and response.ttlt >= response.ttft
+    assert response.stop_reason is None
+
+def test_run_prompt_stops_the_stream_once_complete(monkeypatch):
+    sent = []
+
+    def stream_answer(prompt, filename, model, temperature, on_text, stop_event=None):
+        for line in (ANSWER + "13;runaway;output\n" * 100).splitlines(keepends=True):
+            sent.append(line)
+            if not on_text(line):
+                break
+        return ModelResponse("".join(sent))
+
+    functions = ProviderFunctions("sep.core.api_request.mock_api:process_test_pipeline", "sep.core.api_request.mock_api:process_test_pipeline_async", stream_answer)
+    registry = ProviderRegistry([ProviderPlugin("test", ("test*",), pdf=functions)])
+    monkeypatch.setattr(request_manager, "get_provider_registry", lambda: registry)
+    response = request_manager.run_prompt_response("prompt", None, "test", False, 0.5, use_cache=False, stream=True)
+    assert response.text == ANSWER
+    assert response.stop_reason == STOP_COMPLETE
@@ -0,0 +1,54 @@
+import json
+import os
+import pytest
+from types import SimpleNamespace
+from sep.core.api_request import usage as usage_module
+from sep.core.api_request.usage import Usage, get_price, with_cost
+from sep.core.paper2llm.process_paper import process_paper
+from sep.core.paper2llm.run_writer import RunWriter
+
+PRICES = {
+    "gpt-4o": {"input": 2.5, "cached_input": 1.25, "output": 10},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.6},
+}
+
+@pytest.fixture(autouse=True)
+def prices(monkeypatch):
+    monkeypatch.setattr(usage_module, "PRICES", PRICES)
+
+def test_models_match_the_longest_price_entry():
+    assert get_price("gpt-4o-2024-08-06") == PRICES["gpt-4o"]
+    assert get_price("gpt-4o-mini") == PRICES["gpt-4o-mini"]
+    assert get_price("gemini-2.5-pro") is None
+
+def test_cost_bills_cached_tokens_at_their_own_price():
+    usage = with_cost("gpt-4o-2024-08-06", Usage(prompt_tokens=1_000_000, completion_tokens=100_000, cached_tokens=400_000))
+    assert usage.cost == pytest.approx(0.6 * 2.5 + 0.4 * 1.25 + 0.1 * 10)
+
+    # without a cached_input price, cached tokens cost the same as other input tokens
+    assert with_cost("gpt-4o-mini", Usage(prompt_tokens=1_000_000, cached_tokens=500_000)).cost == pytest.approx(0.15)
+    assert with_cost("gpt-4o", Usage(prompt_tokens=1_000_000), factor=0.5).cost == pytest.approx(1.25)
+    assert with_cost("unknown", Usage(prompt_tokens=1_000_000)).cost == 0.0
+
+def test_usage_is_read_from_the_sdk_responses():
+    openai_usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30, prompt_tokens_details=SimpleNamespace(cached_tokens=100))
+    assert Usage.from_openai(openai_usage) == Usage(120, 30, 100)
+    assert Usage.from_openai({"prompt_tokens": 120, "completion_tokens": 30}) == Usage(120, 30, 0)
+    assert Usage.from_openai(None) == Usage()
+
+    metadata = SimpleNamespace(prompt_token_count=200, candidates_token_count=40, thoughts_token_count=60, cached_content_token_count=None)
+    assert Usage.from_gemini(metadata) == Usage(200, 100, 0)
+
+def test_usage_is_saved_with_the_output(tmp_path):
+    writer = RunWriter(str(tmp_path / "run") + "/")
+    for name in ("0005.pdf", "0013.pdf"):
+        pdf = tmp_path / name
+        pdf.write_bytes(b"%PDF-1.4 study")
+        process_paper("Prompt " * 100, "test", str(pdf), writer=writer)
+
+    raw_file = sorted(os.listdir(tmp_path / "run"))[0]
+    with open(tmp_path / "run" / raw_file) as f:
+        saved = json.load(f)["Usage"]
+    assert saved["prompt_tokens"] == 175
+    assert saved["completion_tokens"] > 0
+    assert writer.get_usage().prompt_tokens == 350